@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class AnnostoreConfig(AppConfig):
+    name = "annostore"
+
+    def ready(self):
+        from annostore import signals  # noqa
@@ -0,0 +1,112 @@
+"""
+resolves the annostore config of an assignment.
+
+Annotation requests need the annostore (url, apikey, secret) and the course of
+the assignment they belong to; those rarely change, so they are cached in two
+tiers:
+
+    - process-local dict, for settings.ANNOSTORE_ASCONFIG_CACHE["local_ttl"] secs
+    - django cache, for settings.ANNOSTORE_ASCONFIG_CACHE["shared_ttl"] secs
+
+Saving or deleting an Assignment or LTICourse invalidates both tiers (see
+annostore/apps.py); the local tier in other processes can be stale for up to
+local_ttl.
+"""
+
+import collections
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from hx_lti_assignment.models import Assignment
+
+logger = logging.getLogger(__name__)
+
+AssignmentConfig = collections.namedtuple(
+    "AssignmentConfig",
+    ["annostore_url", "apikey", "secret", "course_id", "is_published"],
+)
+
+CACHE_DEFAULTS = {
+    "local_ttl": 10,
+    "shared_ttl": 300,
+    "alias": "default",
+}
+KEY_PREFIX = "hxat:asconfig"
+
+_lock = threading.Lock()
+_local = {}  # assignment_id -> (expires_at, config)
+
+
+def _cache_config():
+    config = dict(CACHE_DEFAULTS)
+    config.update(getattr(settings, "ANNOSTORE_ASCONFIG_CACHE", {}))
+    return config
+
+
+def _key(assignment_id):
+    return "{}:{}".format(KEY_PREFIX, assignment_id)
+
+
+def _from_db(assignment_id):
+    try:
+        assignment = Assignment.objects.select_related("course").get(
+            assignment_id=assignment_id
+        )
+    except Assignment.DoesNotExist:
+        return None
+    return AssignmentConfig(
+        annostore_url=assignment.annotation_database_url,
+        apikey=assignment.annotation_database_apikey,
+        secret=assignment.annotation_database_secret_token,
+        course_id=getattr(assignment.course, "course_id", None),
+        is_published=assignment.is_published,
+    )
+
+
+def get_assignment_config(assignment_id):
+    """returns AssignmentConfig for `assignment_id`, or None if not found."""
+    assignment_id = str(assignment_id)  # might come as uuid from the model
+    cache_config = _cache_config()
+    now = time.monotonic()
+
+    cached = _local.get(assignment_id)
+    if cached is not None and cached[0] > now:
+        return cached[1]
+
+    shared = caches[cache_config["alias"]]
+    config = shared.get(_key(assignment_id))
+    if config is None:
+        config = _from_db(assignment_id)
+        if config is None:
+            return None  # not cached, so a new assignment is found right away
+        shared.set(_key(assignment_id), config, cache_config["shared_ttl"])
+
+    with _lock:
+        _local[assignment_id] = (now + cache_config["local_ttl"], config)
+    return config
+
+
+def invalidate(*assignment_ids):
+    assignment_ids = [str(a) for a in assignment_ids]
+    cache_config = _cache_config()
+    with _lock:
+        for assignment_id in assignment_ids:
+            _local.pop(assignment_id, None)
+    caches[cache_config["alias"]].delete_many([_key(a) for a in assignment_ids])
+    logger.debug("asconfig invalidated for assignments: {}".format(assignment_ids))
+
+
+def clear_local():
+    with _lock:
+        _local.clear()
+
+
+@receiver(setting_changed)
+def _reset_on_setting_changed(sender, setting, **kwargs):
+    if setting == "ANNOSTORE_ASCONFIG_CACHE":
+        clear_local()
@@ -0,0 +1,223 @@
+"""
+circuit breaker and adaptive timeouts per annostore.
+
+When catchpy slows down or fails, every call to it waits for the full timeout
+and workers pile up. With settings.ANNOSTORE_BREAKER["enabled"], each
+annostore base url gets a breaker that keeps the outcome and latency of calls
+in the last `window` seconds:
+
+    - closed: calls go through; when there are at least `min_calls` in the
+      window and the error rate reaches `error_rate`, the breaker opens
+    - open: calls fail fast, without a request to catchpy, for `open_secs`
+    - half_open: one probe call goes through; if it succeeds the breaker
+      closes, otherwise it opens again
+
+Errors are timeouts, connection errors and 5xx responses. With
+`adaptive_timeout`, timeouts are `timeout_multiplier` times the p99 latency of
+successful calls for that operation, between `min_timeout` and the timeout
+from settings.ANNOSTORE_TIMEOUTS.
+
+Breakers are process-local, like the http pool.
+"""
+
+import logging
+import math
+import threading
+import time
+from collections import deque
+
+from annostore import pool
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from hxat import metrics
+
+logger = logging.getLogger(__name__)
+
+BREAKER_DEFAULTS = {
+    "enabled": False,
+    "window": 60,  # secs of calls considered
+    "min_calls": 20,  # calls in window before opening or adapting timeouts
+    "error_rate": 0.5,
+    "open_secs": 30,  # secs before a probe call is let through
+    "adaptive_timeout": True,
+    "timeout_multiplier": 3.0,
+    "min_timeout": 1.0,
+}
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+_lock = threading.Lock()
+_breakers = {}
+
+
+class CircuitOpenError(Exception):
+    """raised instead of calling an annostore while its breaker is open."""
+
+    def __init__(self, base_url):
+        super().__init__("circuit open for annostore({})".format(base_url))
+        self.base_url = base_url
+
+
+def breaker_config():
+    config = dict(BREAKER_DEFAULTS)
+    config.update(getattr(settings, "ANNOSTORE_BREAKER", {}))
+    return config
+
+
+def is_enabled():
+    return breaker_config()["enabled"]
+
+
+def _now():
+    return time.monotonic()
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    index = max(0, math.ceil(pct / 100.0 * len(ordered)) - 1)
+    return ordered[index]
+
+
+class CircuitBreaker(object):
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.state = CLOSED
+        self.opened_at = None
+        self.probe_started_at = None
+        self._calls = deque()  # (timestamp, operation, duration, ok)
+        self._lock = threading.Lock()
+
+    def _prune(self, now, window):
+        while self._calls and self._calls[0][0] < now - window:
+            self._calls.popleft()
+
+    def _transition(self, state, reason):
+        logger.warning(
+            "annostore breaker({}): {} -> {}: {}".format(
+                self.base_url, self.state, state, reason
+            )
+        )
+        metrics.incr("annostore_breaker_{}".format(state), annostore=self.base_url)
+        self.state = state
+
+    def allow(self):
+        """True if a call can go through; when open, False until probe time."""
+        config = breaker_config()
+        now = _now()
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and now - self.opened_at >= config["open_secs"]:
+                self._transition(HALF_OPEN, "probing")
+                self.probe_started_at = now
+                return True
+            if self.state == HALF_OPEN and (
+                now - self.probe_started_at >= config["open_secs"]
+            ):
+                # probe never reported back; let another one through
+                self.probe_started_at = now
+                return True
+        metrics.incr("annostore_breaker_rejected", annostore=self.base_url)
+        return False
+
+    def record(self, operation, duration, ok):
+        """reports the outcome of a call allowed by allow()."""
+        config = breaker_config()
+        now = _now()
+        with self._lock:
+            if self.state == HALF_OPEN:
+                if ok:
+                    self._calls.clear()  # start over with the recovered annostore
+                    self._transition(CLOSED, "probe ok")
+                else:
+                    self.opened_at = now
+                    self._transition(OPEN, "probe failed")
+                    return
+
+            self._calls.append((now, operation, duration, ok))
+            self._prune(now, config["window"])
+            if self.state != CLOSED or len(self._calls) < config["min_calls"]:
+                return
+            errors = len([c for c in self._calls if not c[3]])
+            error_rate = errors / len(self._calls)
+            if error_rate >= config["error_rate"]:
+                self.opened_at = now
+                self._transition(
+                    OPEN,
+                    "error rate {:.2f} in {} calls".format(
+                        error_rate, len(self._calls)
+                    ),
+                )
+
+    def p99(self, operation):
+        """p99 latency of successful `operation` calls in window, or None."""
+        config = breaker_config()
+        with self._lock:
+            self._prune(_now(), config["window"])
+            durations = [c[2] for c in self._calls if c[1] == operation and c[3]]
+        if len(durations) < config["min_calls"]:
+            return None
+        return _percentile(durations, 99)
+
+    def timeout(self, operation):
+        """timeout for `operation`; never over the one in settings."""
+        configured = pool.get_timeout(operation)
+        config = breaker_config()
+        if not (config["enabled"] and config["adaptive_timeout"]):
+            return configured
+        p99 = self.p99(operation)
+        if p99 is None:
+            return configured
+        adaptive = max(config["min_timeout"], p99 * config["timeout_multiplier"])
+        return min(configured, adaptive)
+
+    def stats(self):
+        config = breaker_config()
+        with self._lock:
+            self._prune(_now(), config["window"])
+            calls = list(self._calls)
+            state = self.state
+        errors = len([c for c in calls if not c[3]])
+        operations = sorted(set(c[1] for c in calls))
+        return {
+            "state": state,
+            "calls": len(calls),
+            "error_rate": (errors / len(calls)) if calls else None,
+            "p99": {op: self.p99(op) for op in operations},
+            "timeouts": {op: self.timeout(op) for op in operations},
+        }
+
+
+def get_breaker(base_url):
+    """returns the breaker for annostore at `base_url`."""
+    breaker = _breakers.get(base_url)
+    if breaker is None:
+        with _lock:
+            breaker = _breakers.setdefault(base_url, CircuitBreaker(base_url))
+    return breaker
+
+
+def is_failure(status_code):
+    return status_code >= 500
+
+
+def stats():
+    """breaker state per annostore base url."""
+    with _lock:
+        breakers = list(_breakers.values())
+    return {b.base_url: b.stats() for b in breakers}
+
+
+def reset():
+    """forgets all breakers; meant for tests."""
+    with _lock:
+        _breakers.clear()
+
+
+@receiver(setting_changed)
+def _reset_on_setting_changed(sender, setting, **kwargs):
+    if setting == "ANNOSTORE_BREAKER":
+        reset()
@@ -0,0 +1,63 @@
+"""
+ledger of grades the lms accepted.
+
+Participation grades are always 1.0; once the lms accepted it for a
+(resource_link_id, user_id, lis_result_sourcedid), sending it again does
+nothing but add traffic to the lms. With settings.GRADE_PASSBACK_LEDGER on,
+grade passback checks the ledger first and skips grades already sent.
+
+To send grades again (e.g. grades were reset in the lms), clear the ledger
+with `manage.py grade_passback clear-ledger`.
+"""
+
+import logging
+
+from annostore.models import GradePassbackLedger
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from hxat import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def is_enabled():
+    return getattr(settings, "GRADE_PASSBACK_LEDGER", False)
+
+
+def _key(resource_link_id, user_id, sourcedid, score):
+    return {
+        "resource_link_id": resource_link_id or "",
+        "user_id": str(user_id),
+        "lis_result_sourcedid": sourcedid,
+        "score": float(score),
+    }
+
+
+def already_sent(resource_link_id, user_id, sourcedid, score):
+    """True if the lms already accepted this grade."""
+    if not is_enabled():
+        return False
+    found = GradePassbackLedger.objects.filter(
+        **_key(resource_link_id, user_id, sourcedid, score)
+    ).exists()
+    metrics.incr("grade_ledger_hits" if found else "grade_ledger_misses")
+    return found
+
+
+def record(resource_link_id, user_id, sourcedid, score):
+    """notes that the lms accepted this grade."""
+    if not is_enabled():
+        return
+    try:
+        with transaction.atomic():
+            GradePassbackLedger.objects.create(
+                **_key(resource_link_id, user_id, sourcedid, score)
+            )
+    except IntegrityError:  # concurrent request got there first
+        pass
+
+
+def stats():
+    hits = metrics.total("grade_ledger_hits")
+    misses = metrics.total("grade_ledger_misses")
+    return {"hits": hits, "misses": misses}
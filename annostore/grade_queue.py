@@ -0,0 +1,224 @@
+"""
+background queue for lti grade passback.
+
+With settings.GRADE_PASSBACK_QUEUE["enabled"], Annostore.lti_grade_passback()
+only adds a row to the GradePassback table and the student gets the response
+right away; the `grade_passback` management command sends the grades to the
+lms, in batches, with a limited number of concurrent requests.
+
+A grade is queued once per (user, assignment, score, lis_result_sourcedid):
+creating annotations after the participation grade was sent does not send it
+again. Placements of the same assignment in the lms have their own
+lis_result_sourcedid, so each gets the grade. Failed sends
+are retried with exponential backoff, up to max_attempts.
+"""
+
+import logging
+import os
+import random
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from annostore import grade_ledger
+from annostore.models import GradePassback
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+from hxat import metrics
+from hxat.lti_validators import LTIRequestValidator
+from lti import ToolProvider
+
+logger = logging.getLogger(__name__)
+
+QUEUE_DEFAULTS = {
+    "enabled": False,
+    "concurrency": 4,  # concurrent requests to the lms
+    "batch_size": 50,
+    "max_attempts": 5,
+    "backoff": 30,  # secs before 1st retry; doubles every attempt
+    "lease": 300,  # secs before an in_progress row is considered abandoned
+}
+
+
+def queue_config():
+    config = dict(QUEUE_DEFAULTS)
+    config.update(getattr(settings, "GRADE_PASSBACK_QUEUE", {}))
+    return config
+
+
+def is_enabled():
+    return queue_config()["enabled"]
+
+
+def worker_id():
+    return "{}:{}:{}".format(socket.gethostname(), os.getpid(), threading.get_ident())
+
+
+def enqueue(user_id, assignment_id, score, context_id, launch_params):
+    """queues a grade; returns (job, created).
+
+    `created` is False when the same grade is already queued or was sent; a
+    grade that failed for good is queued again.
+    """
+    fields = {
+        "context_id": context_id,
+        "resource_link_id": launch_params.get("resource_link_id", ""),
+        "consumer_key": launch_params["oauth_consumer_key"],
+        "lis_outcome_service_url": launch_params["lis_outcome_service_url"],
+    }
+    key = {
+        "user_id": user_id,
+        "assignment_id": assignment_id,
+        "score": score,
+        "lis_result_sourcedid": launch_params["lis_result_sourcedid"],
+    }
+    try:
+        with transaction.atomic():
+            job = GradePassback.objects.create(
+                next_attempt_at=timezone.now(), **key, **fields
+            )
+    except IntegrityError:  # same grade already in queue
+        job = GradePassback.objects.get(**key)
+        if job.status != GradePassback.FAILED:
+            metrics.incr("grade_passback_deduped")
+            return (job, False)
+        rearmed = GradePassback.objects.filter(
+            pk=job.pk, status=GradePassback.FAILED
+        ).update(
+            status=GradePassback.PENDING,
+            attempts=0,
+            next_attempt_at=timezone.now(),
+            last_error="",
+            **fields,
+        )
+        job.refresh_from_db()
+        if not rearmed:
+            return (job, False)
+
+    metrics.incr("grade_passback_enqueued")
+    logger.info("grade queued: {}".format(job))
+    return (job, True)
+
+
+def claim(limit, worker=None):
+    """marks up to `limit` due jobs as in_progress by `worker`; returns them."""
+    worker = worker or worker_id()
+    config = queue_config()
+    now = timezone.now()
+    abandoned = now - timedelta(seconds=config["lease"])
+    due = GradePassback.objects.filter(
+        Q(status=GradePassback.PENDING, next_attempt_at__lte=now)
+        | Q(status=GradePassback.IN_PROGRESS, locked_at__lt=abandoned)
+    ).order_by("next_attempt_at")
+
+    claimed = []
+    for job in due[:limit]:
+        # a conditional update is atomic, so other workers cannot claim it too
+        updated = GradePassback.objects.filter(
+            pk=job.pk, status=job.status, locked_at=job.locked_at
+        ).update(status=GradePassback.IN_PROGRESS, locked_at=now, locked_by=worker)
+        if updated:
+            job.status = GradePassback.IN_PROGRESS
+            job.locked_at = now
+            job.locked_by = worker
+            claimed.append(job)
+    return claimed
+
+
+def send(job):
+    """posts the grade in `job` to the lms; returns error message or None.
+
+    Does not touch the database, so it can run in a worker thread.
+    """
+    try:
+        lti_secret = LTIRequestValidator.fetch_lti_secret(
+            client_key=job.consumer_key, context_id=job.context_id
+        )
+        tool_provider = ToolProvider(
+            consumer_key=job.consumer_key,
+            consumer_secret=lti_secret,
+            params={
+                "lis_outcome_service_url": job.lis_outcome_service_url,
+                "lis_result_sourcedid": job.lis_result_sourcedid,
+            },
+        )
+        outcome = tool_provider.post_replace_result(job.score)
+    except Exception as e:
+        return "exc({})".format(e)
+    if outcome.is_success():
+        return None
+    return "desc({})".format(outcome.description)
+
+
+def _finish(job, error):
+    config = queue_config()
+    job.attempts += 1
+    job.locked_at = None
+    job.locked_by = ""
+    if error is None:
+        job.status = GradePassback.DONE
+        job.last_error = ""
+        metrics.incr("grade_passback_sent")
+        logger.info("lti_grade successful: {}".format(job))
+        grade_ledger.record(
+            job.resource_link_id, job.user_id, job.lis_result_sourcedid, job.score
+        )
+    elif job.attempts >= config["max_attempts"]:
+        job.status = GradePassback.FAILED
+        job.last_error = error
+        metrics.incr("grade_passback_failed")
+        logger.error("lti_grade FAILED for good: {} {}".format(job, error))
+    else:
+        delay = config["backoff"] * (2 ** (job.attempts - 1))
+        delay = delay * random.uniform(0.8, 1.2)  # jitter
+        job.status = GradePassback.PENDING
+        job.next_attempt_at = timezone.now() + timedelta(seconds=delay)
+        job.last_error = error
+        metrics.incr("grade_passback_retried")
+        logger.warning(
+            "lti_grade ERROR, retry in {:.0f}s: {} {}".format(delay, job, error)
+        )
+    job.save()
+
+
+def process_batch(limit=None, concurrency=None, worker=None):
+    """claims and sends one batch of grades; returns number of jobs processed."""
+    config = queue_config()
+    limit = limit or config["batch_size"]
+    concurrency = concurrency or config["concurrency"]
+
+    jobs = claim(limit, worker=worker)
+    if not jobs:
+        return 0
+    # only the lms requests go to the threads; db updates stay in this thread
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        errors = list(executor.map(send, jobs))
+    for job, error in zip(jobs, errors):
+        _finish(job, error)
+    return len(jobs)
+
+
+def drain(max_jobs=None, concurrency=None, worker=None):
+    """processes due grades until none left, or `max_jobs`; returns total."""
+    config = queue_config()
+    total = 0
+    while max_jobs is None or total < max_jobs:
+        limit = config["batch_size"]
+        if max_jobs is not None:
+            limit = min(limit, max_jobs - total)
+        processed = process_batch(limit=limit, concurrency=concurrency, worker=worker)
+        if not processed:
+            break
+        total += processed
+    return total
+
+
+def counts():
+    """number of grades per status."""
+    result = {status: 0 for status, _ in GradePassback.STATUS_CHOICES}
+    for row in GradePassback.objects.values("status").annotate(n=Count("id")):
+        result[row["status"]] = row["n"]
+    return result
@@ -0,0 +1,110 @@
+import json
+import time
+
+from annostore import grade_queue
+from annostore.models import GradePassback, GradePassbackLedger
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "sends queued lti grades to the lms, or reports on the queue"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "action",
+            choices=["drain", "run", "inspect", "retry-failed", "clear-ledger"],
+            help=(
+                "drain: send due grades and exit; run: keep draining every "
+                "--interval secs; inspect: print queue counts and failures; "
+                "retry-failed: queue failed grades again; clear-ledger: forget "
+                "grades the lms accepted, so they are sent again"
+            ),
+        )
+        parser.add_argument(
+            "--max-jobs",
+            dest="max_jobs",
+            type=int,
+            default=None,
+            help="max grades to send per drain (default: all due)",
+        )
+        parser.add_argument(
+            "--concurrency",
+            dest="concurrency",
+            type=int,
+            default=None,
+            help="concurrent requests to the lms (default: from settings)",
+        )
+        parser.add_argument(
+            "--interval",
+            dest="interval",
+            type=float,
+            default=5.0,
+            help="secs between drains, for `run`",
+        )
+        parser.add_argument(
+            "--resource-link-id",
+            dest="resource_link_id",
+            default=None,
+            help="only clear ledger for this resource_link_id, for `clear-ledger`",
+        )
+
+    def handle(self, *args, **options):
+        action = options["action"]
+        if action == "inspect":
+            self.inspect()
+        elif action == "retry-failed":
+            for job in GradePassback.objects.filter(status=GradePassback.FAILED):
+                grade_queue.enqueue(
+                    job.user_id,
+                    job.assignment_id,
+                    job.score,
+                    job.context_id,
+                    {
+                        "oauth_consumer_key": job.consumer_key,
+                        "resource_link_id": job.resource_link_id,
+                        "lis_outcome_service_url": job.lis_outcome_service_url,
+                        "lis_result_sourcedid": job.lis_result_sourcedid,
+                    },
+                )
+            self.inspect()
+        elif action == "clear-ledger":
+            ledger = GradePassbackLedger.objects.all()
+            # sent grades also stay in the queue, and would dedupe the grade
+            sent = GradePassback.objects.filter(status=GradePassback.DONE)
+            if options["resource_link_id"]:
+                ledger = ledger.filter(resource_link_id=options["resource_link_id"])
+                sent = sent.filter(resource_link_id=options["resource_link_id"])
+            (deleted, _) = ledger.delete()
+            (dequeued, _) = sent.delete()
+            self.stdout.write(json.dumps({"deleted": deleted, "dequeued": dequeued}))
+        elif action == "drain":
+            total = grade_queue.drain(
+                max_jobs=options["max_jobs"], concurrency=options["concurrency"]
+            )
+            self.stdout.write(json.dumps({"processed": total}))
+        else:  # run
+            while True:
+                total = grade_queue.drain(
+                    max_jobs=options["max_jobs"], concurrency=options["concurrency"]
+                )
+                if total:
+                    self.stdout.write(json.dumps({"processed": total}))
+                time.sleep(options["interval"])
+
+    def inspect(self):
+        failed = GradePassback.objects.filter(status=GradePassback.FAILED)
+        result = {
+            "counts": grade_queue.counts(),
+            "failed": [
+                {
+                    "user_id": job.user_id,
+                    "assignment_id": job.assignment_id,
+                    "score": job.score,
+                    "attempts": job.attempts,
+                    "last_error": job.last_error,
+                    "updated_at": job.updated_at.isoformat(),
+                }
+                for job in failed.order_by("-updated_at")[:50]
+            ],
+        }
+        self.stdout.write(json.dumps(result, indent=4))
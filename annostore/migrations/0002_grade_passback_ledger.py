@@ -0,0 +1,44 @@
+# Generated by Django 4.2.30 on 2026-10-18 21:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("annostore", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="GradePassbackLedger",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("resource_link_id", models.CharField(max_length=255)),
+                ("user_id", models.CharField(max_length=255)),
+                ("lis_result_sourcedid", models.TextField()),
+                ("score", models.FloatField()),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="gradepassback",
+            name="resource_link_id",
+            field=models.CharField(blank=True, default="", max_length=255),
+        ),
+        migrations.AddConstraint(
+            model_name="gradepassbackledger",
+            constraint=models.UniqueConstraint(
+                fields=("resource_link_id", "user_id", "lis_result_sourcedid", "score"),
+                name="unique_grade_passback_ledger",
+            ),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.30 on 2026-10-18 21:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("annostore", "0002_grade_passback_ledger"),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name="gradepassback",
+            name="unique_grade_passback",
+        ),
+        migrations.AddConstraint(
+            model_name="gradepassback",
+            constraint=models.UniqueConstraint(
+                fields=("user_id", "assignment_id", "score", "lis_result_sourcedid"),
+                name="unique_grade_passback",
+            ),
+        ),
+    ]
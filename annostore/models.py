@@ -0,0 +1,78 @@
+from django.db import models
+
+
+class GradePassback(models.Model):
+    """lti grade to be sent back to the lms; see annostore/grade_queue.py
+
+    one row per (user, assignment, score, lis_result_sourcedid): once a score is
+    sent, sending it again for the same user and lms placement is a no-op.
+    """
+
+    PENDING = "pending"
+    IN_PROGRESS = "in_progress"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = (
+        (PENDING, "pending"),
+        (IN_PROGRESS, "in progress"),
+        (DONE, "done"),
+        (FAILED, "failed"),
+    )
+
+    user_id = models.CharField(max_length=255)
+    assignment_id = models.CharField(max_length=255)
+    score = models.FloatField()
+
+    # lti params to send the grade; lti secret is looked up when sending
+    context_id = models.CharField(max_length=255)
+    resource_link_id = models.CharField(max_length=255, blank=True, default="")
+    consumer_key = models.CharField(max_length=255)
+    lis_outcome_service_url = models.TextField()
+    lis_result_sourcedid = models.TextField()
+
+    status = models.CharField(
+        max_length=16, choices=STATUS_CHOICES, default=PENDING, db_index=True
+    )
+    attempts = models.IntegerField(default=0)
+    next_attempt_at = models.DateTimeField(db_index=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=255, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user_id", "assignment_id", "score", "lis_result_sourcedid"],
+                name="unique_grade_passback",
+            )
+        ]
+
+    def __str__(self):
+        return "grade({}) user({}) assignment({}) status({})".format(
+            self.score, self.user_id, self.assignment_id, self.status
+        )
+
+
+class GradePassbackLedger(models.Model):
+    """grades the lms accepted; see annostore/grade_ledger.py"""
+
+    resource_link_id = models.CharField(max_length=255)
+    user_id = models.CharField(max_length=255)
+    lis_result_sourcedid = models.TextField()
+    score = models.FloatField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["resource_link_id", "user_id", "lis_result_sourcedid", "score"],
+                name="unique_grade_passback_ledger",
+            )
+        ]
+
+    def __str__(self):
+        return "grade({}) user({}) resource_link({})".format(
+            self.score, self.user_id, self.resource_link_id
+        )
@@ -0,0 +1,154 @@
+"""
+pass-through of annostore search responses.
+
+When settings.ANNOSTORE_PASSTHROUGH is on, hxat does not parse and re-encode
+catchpy search results; the bytes from catchpy are streamed to the client as
+they arrive. Grading checks that need the search "total" scan only as much of
+the body as needed to find it, without decoding the rows; what was scanned is
+kept to be sent to the client.
+"""
+
+import json
+import logging
+import re
+
+from django.http import StreamingHttpResponse
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+# tokens that matter when skipping json values, outside and inside strings
+_STRUCTURAL = re.compile(rb'["{}\[\]]')
+_STRING_END = re.compile(rb'["\\]')
+_KEY_TOTAL = b'"total"'
+_COLON_NUMBER = re.compile(rb"\s*:\s*(-?\d+)[\s,}]")
+
+
+class TotalScanner(object):
+    """incremental scanner for the top-level "total" in a json object.
+
+    feed() it bytes as they come; it returns the total once found, None while
+    more bytes are needed. Nested objects and arrays (e.g. "rows") are skipped
+    without being decoded.
+    """
+
+    def __init__(self):
+        self.buf = b""
+        self.depth = 0
+        self.in_string = False
+        self.total = None
+
+    def feed(self, data):
+        if self.total is not None:
+            return self.total
+        buf = self.buf + data
+        pos = 0
+        while True:
+            if self.in_string:
+                m = _STRING_END.search(buf, pos)
+                if m is None:
+                    pos = len(buf)
+                    break
+                if m.group() == b"\\":
+                    if m.end() >= len(buf):
+                        pos = m.start()  # escaped char in next chunk
+                        break
+                    pos = m.end() + 1
+                    continue
+                self.in_string = False
+                pos = m.end()
+                continue
+
+            m = _STRUCTURAL.search(buf, pos)
+            if m is None:
+                pos = len(buf)
+                break
+            token = m.group()
+            if token == b'"':
+                if self.depth == 1 and _KEY_TOTAL.startswith(
+                    buf[m.start() : m.start() + len(_KEY_TOTAL)]
+                ):
+                    n = _COLON_NUMBER.match(buf, m.start() + len(_KEY_TOTAL))
+                    if n is not None:
+                        self.total = int(n.group(1))
+                        self.buf = b""
+                        return self.total
+                    if len(buf) - m.start() < 64:
+                        pos = m.start()  # might be the key, wait for more bytes
+                        break
+                self.in_string = True
+            elif token in (b"{", b"["):
+                self.depth += 1
+            else:
+                self.depth -= 1
+            pos = m.end()
+
+        self.buf = buf[pos:]  # unfinished token, if any
+        return None
+
+
+class PassthroughStream(object):
+    """iterator over the body of a catchpy `response` opened with stream=True.
+
+    peek_total() reads ahead only as far as needed to find the search total;
+    the bytes read ahead are replayed first when iterating.
+    """
+
+    def __init__(self, response, chunk_size=CHUNK_SIZE):
+        self.response = response
+        self._chunks = response.iter_content(chunk_size=chunk_size)
+        self._prefix = []
+        self._scanner = TotalScanner()
+        self.bytes_sent = 0
+
+    def peek_total(self):
+        if self._scanner.total is None:
+            for chunk in self._chunks:
+                self._prefix.append(chunk)
+                if self._scanner.feed(chunk) is not None:
+                    break
+            else:
+                # malformed or unexpected shape: let json tell what's wrong
+                body = b"".join(self._prefix)
+                self._scanner.total = int(json.loads(body)["total"])
+        return self._scanner.total
+
+    def __iter__(self):
+        while self._prefix:
+            chunk = self._prefix.pop(0)
+            self.bytes_sent += len(chunk)
+            yield chunk
+        for chunk in self._chunks:
+            self.bytes_sent += len(chunk)
+            yield chunk
+
+    def close(self):
+        # returns the connection to the pool
+        self.response.close()
+
+
+def streaming_response(response):
+    """StreamingHttpResponse that relays catchpy `response` unchanged."""
+    stream = PassthroughStream(response)
+    proxied = StreamingHttpResponse(
+        stream,
+        status=response.status_code,
+        content_type=response.headers.get("content-type", "application/json"),
+    )
+    # body from requests is already decoded, so length only holds when catchpy
+    # did not compress it
+    if "content-encoding" not in response.headers and (
+        "content-length" in response.headers
+    ):
+        proxied["Content-Length"] = response.headers["content-length"]
+    proxied.annostore_stream = stream
+    return proxied
+
+
+def response_total(response):
+    """search total from a catchpy search response, streamed or not."""
+    stream = getattr(response, "annostore_stream", None)
+    if stream is not None:
+        return stream.peek_total()
+    return int(json.loads(response.content)["total"])
@@ -0,0 +1,200 @@
+"""
+process-wide pool of http sessions to annostores.
+
+Each annostore base url (the default from settings, plus any per-assignment
+override) gets its own `requests.Session` that is shared by all requests
+handled by the worker process. Sessions keep connections alive, so proxied
+annotation calls to catchpy skip the tcp/tls handshake after the first call.
+
+The async proxy path uses `httpx.AsyncClient` instead, one per annostore and
+event loop, configured from the same settings.
+
+Configured via settings.ANNOSTORE_HTTP_POOL and settings.ANNOSTORE_TIMEOUTS.
+"""
+
+import asyncio
+import logging
+import threading
+import weakref
+
+import httpx
+import requests
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from hxat import metrics
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+# only these methods are retried after the request was sent; connect errors are
+# retried for all methods. DELETE is left out: if catchpy deleted the annotation
+# behind a 502, the retry would get a 404 and hxat would report an error.
+RETRY_METHODS = frozenset(["GET", "HEAD", "PUT", "OPTIONS"])
+
+POOL_DEFAULTS = {
+    "pool_connections": 4,  # distinct hosts cached per session
+    "pool_maxsize": 10,  # keep-alive connections per host
+    "pool_block": False,  # if True, wait for a free connection when pool is full
+    "keep_alive": True,
+    "max_retries": 2,
+    "backoff_factor": 0.2,
+    "status_forcelist": (502, 503, 504),
+}
+TIMEOUT_DEFAULTS = {
+    "default": 5.0,
+    "search": 10.0,
+}
+
+_lock = threading.Lock()
+_sessions = {}
+_async_clients = weakref.WeakKeyDictionary()  # event loop -> {base_url: client}
+
+
+class CountingHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter that keeps hit/miss/wait counters for its connection pool.
+
+    - hit: request reused a keep-alive connection
+    - miss: request had to open a new connection
+    - wait: all connections were busy when request was issued
+    """
+
+    def __init__(self, pool_key, *args, **kwargs):
+        self.pool_key = pool_key
+        self.in_flight = 0
+        self._in_flight_lock = threading.Lock()
+        super().__init__(*args, **kwargs)
+
+    def send(
+        self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None
+    ):
+        try:
+            conn = self.get_connection_with_tls_context(
+                request, verify, proxies=proxies, cert=cert
+            )
+            connections_before = conn.num_connections
+        except Exception:  # let send() report whatever is wrong with the url
+            conn = None
+
+        with self._in_flight_lock:
+            if self.in_flight >= self._pool_maxsize:
+                metrics.incr("annostore_pool_waits", annostore=self.pool_key)
+            self.in_flight += 1
+        try:
+            return super().send(
+                request,
+                stream=stream,
+                timeout=timeout,
+                verify=verify,
+                cert=cert,
+                proxies=proxies,
+            )
+        finally:
+            with self._in_flight_lock:
+                self.in_flight -= 1
+            if conn is not None:
+                # approximate when concurrent requests share the pool
+                if conn.num_connections > connections_before:
+                    metrics.incr("annostore_pool_misses", annostore=self.pool_key)
+                else:
+                    metrics.incr("annostore_pool_hits", annostore=self.pool_key)
+
+
+def _pool_config():
+    config = dict(POOL_DEFAULTS)
+    config.update(getattr(settings, "ANNOSTORE_HTTP_POOL", {}))
+    return config
+
+
+def _make_session(base_url):
+    config = _pool_config()
+    retries = Retry(
+        total=config["max_retries"],
+        backoff_factor=config["backoff_factor"],
+        status_forcelist=config["status_forcelist"],
+        allowed_methods=RETRY_METHODS,
+        raise_on_status=False,  # return the last response as is
+    )
+    adapter = CountingHTTPAdapter(
+        base_url,
+        pool_connections=config["pool_connections"],
+        pool_maxsize=config["pool_maxsize"],
+        pool_block=config["pool_block"],
+        max_retries=retries,
+    )
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    if not config["keep_alive"]:
+        session.headers["Connection"] = "close"
+    logger.info("new http session for annostore({}): {}".format(base_url, config))
+    return session
+
+
+def get_session(base_url):
+    """returns the shared session for annostore at `base_url`."""
+    session = _sessions.get(base_url)
+    if session is None:
+        with _lock:
+            session = _sessions.get(base_url)
+            if session is None:
+                session = _make_session(base_url)
+                _sessions[base_url] = session
+    return session
+
+
+def _make_async_client(base_url):
+    config = _pool_config()
+    limits = httpx.Limits(
+        # requests discards connections over pool_maxsize when not blocking
+        max_connections=config["pool_maxsize"] if config["pool_block"] else None,
+        max_keepalive_connections=(
+            config["pool_maxsize"] if config["keep_alive"] else 0
+        ),
+    )
+    # httpx only retries failed connects, which are safe for any method
+    transport = httpx.AsyncHTTPTransport(limits=limits, retries=config["max_retries"])
+    logger.info("new async http client for annostore({}): {}".format(base_url, config))
+    return httpx.AsyncClient(transport=transport)
+
+
+def get_async_client(base_url):
+    """returns the shared async client for annostore at `base_url`.
+
+    must be called from a coroutine; clients are not shared across event loops.
+    """
+    clients = _async_clients.setdefault(asyncio.get_running_loop(), {})
+    client = clients.get(base_url)
+    if client is None:
+        client = _make_async_client(base_url)
+        clients[base_url] = client
+    return client
+
+
+def get_timeout(operation):
+    """timeout, in seconds, for annostore `operation` (search, create, ...)."""
+    timeouts = dict(TIMEOUT_DEFAULTS)
+    timeouts.update(getattr(settings, "ANNOSTORE_TIMEOUTS", {}))
+    return timeouts.get(operation, timeouts["default"])
+
+
+def stats():
+    """pool counters per annostore base url."""
+    return metrics.snapshot(prefix="annostore_pool_")
+
+
+def close_all():
+    """closes all pooled sessions; next call to get_session() starts fresh."""
+    with _lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+        # async clients are bound to their event loop, just let them go
+        _async_clients.clear()
+
+
+@receiver(setting_changed)
+def _reset_on_setting_changed(sender, setting, **kwargs):
+    if setting == "ANNOSTORE_HTTP_POOL":
+        close_all()
@@ -0,0 +1,186 @@
+"""
+short-lived cache of annostore search results.
+
+Students that open the same assignment issue nearly identical searches; with
+settings.ANNOSTORE_SEARCH_CACHE_TTL > 0, search results from catchpy are kept
+in the django cache (settings.ANNOSTORE_SEARCH_CACHE_ALIAS) for that many
+seconds.
+
+Cache keys are made of the normalized querystring and the permission class of
+the caller: staff search with the admin token, so they share results; other
+users' results include their own private annotations and are only shared with
+themselves.
+
+Writes through hxat invalidate searches for the context, collection and target
+of the annotation. Instead of deleting keys, each scope has a generation
+counter that is part of the cache key, and writes bump the counters:
+
+    - search for context+collection+source_id uses counter for that target
+    - search for context+collection uses counter for the collection
+    - search for context uses counter for the context
+
+a write bumps all three counters that include the annotation.
+
+Each search is also kept, for settings.ANNOSTORE_SEARCH_CACHE_STALE_TTL
+seconds, under a key without generation. That stale copy is only served when
+the annostore is unavailable (see annostore/breaker.py).
+"""
+
+import hashlib
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from hxat import metrics
+
+logger = logging.getLogger(__name__)
+
+GENERATION_TTL = 24 * 60 * 60  # 1 day; must outlive cached searches
+KEY_PREFIX = "hxat:annostore:search"
+
+# params that do not change search results
+IGNORED_PARAMS = frozenset(["utm_source", "_"])
+
+
+def _ttl():
+    return int(getattr(settings, "ANNOSTORE_SEARCH_CACHE_TTL", 0))
+
+
+def _stale_ttl():
+    return int(getattr(settings, "ANNOSTORE_SEARCH_CACHE_STALE_TTL", 0))
+
+
+def _cache():
+    return caches[getattr(settings, "ANNOSTORE_SEARCH_CACHE_ALIAS", "default")]
+
+
+def _generation_key(context_id, collection_id=None, target_source_id=None):
+    return "{}:gen:{}:{}:{}".format(
+        KEY_PREFIX, context_id, collection_id or "*", target_source_id or "*"
+    )
+
+
+def _new_generation():
+    # in case a counter is evicted, starting from the clock avoids reusing an
+    # old generation and hitting stale searches
+    return int(time.time() * 1000)
+
+
+def _current_generation(cache, generation_key):
+    cache.add(generation_key, _new_generation(), GENERATION_TTL)
+    generation = cache.get(generation_key)
+    return generation if generation is not None else _new_generation()
+
+
+def permission_class(lti):
+    """results from catchpy depend on who is asking."""
+    if lti["is_staff"]:
+        return "admin"
+    return "user:{}".format(lti["hx_user_id"])
+
+
+class SearchCache(object):
+    """cache entry for the search in `params` (a QueryDict) by the caller in `lti`.
+
+    `key` is None when the cache is disabled or search cannot be cached.
+    """
+
+    def __init__(self, lti, params):
+        self.ttl = _ttl()
+        self.key = None
+        if self.ttl <= 0:
+            return
+
+        context_id = params.get("contextId", params.get("context_id", None))
+        if not context_id:
+            return
+        collection_id = params.get("collectionId", params.get("collection_id", None))
+        target_source_id = params.get("source_id", None) if collection_id else None
+
+        self.cache = _cache()
+        generation_key = _generation_key(context_id, collection_id, target_source_id)
+        generation = _current_generation(self.cache, generation_key)
+
+        normalized = sorted(
+            (k, v)
+            for k, values in params.lists()
+            for v in values
+            if k not in IGNORED_PARAMS
+        )
+        digest = hashlib.sha256(
+            repr((permission_class(lti), normalized)).encode("utf-8")
+        ).hexdigest()
+        self.key = "{}:{}:{}".format(KEY_PREFIX, generation, digest)
+        self.stale_key = "{}:stale:{}".format(KEY_PREFIX, digest)
+
+    def get(self):
+        """cached response or None."""
+        if self.key is None:
+            return None
+        cached = self.cache.get(self.key)
+        if cached is None:
+            metrics.incr("annostore_search_cache_misses")
+            return None
+        metrics.incr("annostore_search_cache_hits")
+        (status, content_type, content) = cached
+        return HttpResponse(content, status=status, content_type=content_type)
+
+    def set(self, response):
+        """caches a successful search `response`; streamed ones are left alone."""
+        if self.key is None or response.status_code != 200 or response.streaming:
+            return
+        cached = (response.status_code, response["content-type"], response.content)
+        self.cache.set(self.key, cached, self.ttl)
+        if _stale_ttl() > 0:
+            self.cache.set(self.stale_key, cached, _stale_ttl())
+
+    def get_stale(self):
+        """last cached response for this search, even if invalidated; or None."""
+        if self.key is None or _stale_ttl() <= 0:
+            return None
+        cached = self.cache.get(self.stale_key)
+        if cached is None:
+            return None
+        metrics.incr("annostore_search_cache_stale_hits")
+        (status, content_type, content) = cached
+        response = HttpResponse(content, status=status, content_type=content_type)
+        response["X-Hxat-Stale"] = "true"
+        return response
+
+
+def invalidate(context_id, collection_id, target_source_ids=()):
+    """drops cached searches that might include annotations in the given target(s)."""
+    if _ttl() <= 0 or not context_id:
+        return
+    keys = [_generation_key(context_id)]
+    if collection_id:
+        keys.append(_generation_key(context_id, collection_id))
+        keys.extend(
+            _generation_key(context_id, collection_id, target_source_id)
+            for target_source_id in set(target_source_ids)
+            if target_source_id
+        )
+
+    cache = _cache()
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:  # never set, or evicted
+            cache.set(key, _new_generation(), GENERATION_TTL)
+    metrics.incr("annostore_search_cache_invalidations")
+    logger.debug("search cache invalidated: {}".format(keys))
+
+
+def stats():
+    """hit/miss/invalidation counters and hit ratio for this process."""
+    hits = metrics.total("annostore_search_cache_hits")
+    misses = metrics.total("annostore_search_cache_misses")
+    return {
+        "hits": hits,
+        "misses": misses,
+        "invalidations": metrics.total("annostore_search_cache_invalidations"),
+        "stale_hits": metrics.total("annostore_search_cache_stale_hits"),
+        "hit_ratio": (hits / (hits + misses)) if (hits + misses) else None,
+    }
@@ -0,0 +1,34 @@
+"""
+invalidates cached assignment configs (annostore/asconfig.py) on changes.
+
+Invalidation waits for the transaction to commit; otherwise, a request could
+read the old row between invalidation and commit, and cache it again.
+"""
+
+from annostore import asconfig
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from hx_lti_assignment.models import Assignment
+from hx_lti_initializer.models import LTICourse
+
+
+def _invalidate_on_commit(*assignment_ids):
+    if assignment_ids:
+        transaction.on_commit(lambda: asconfig.invalidate(*assignment_ids))
+
+
+@receiver(post_save, sender=Assignment)
+@receiver(post_delete, sender=Assignment)
+def assignment_changed(sender, instance, **kwargs):
+    _invalidate_on_commit(instance.assignment_id)
+
+
+@receiver(post_save, sender=LTICourse)
+@receiver(pre_delete, sender=LTICourse)
+def course_changed(sender, instance, created=False, **kwargs):
+    if created:
+        return
+    # assignments keep the course_id; before delete, while they still point to it
+    assignment_ids = list(instance.assignments.values_list("assignment_id", flat=True))
+    _invalidate_on_commit(*assignment_ids)
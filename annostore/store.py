@@ -3,22 +3,66 @@ import json
 import logging
 import re
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 
 import channels.layers
-from asgiref.sync import async_to_sync
+from annostore import grade_ledger, grade_queue, search_cache
+from annostore.asconfig import get_assignment_config
+from annostore.passthrough import response_total
+from asgiref.sync import async_to_sync, sync_to_async
 from django.conf import settings
 from django.core.exceptions import BadRequest
 from django.http import Http404, JsonResponse
-from hx_lti_assignment.models import Assignment
+from hxat import timing
 from hxat.lti_validators import LTIRequestValidator
 from lti.contrib.django import DjangoToolProvider
 
 logger = logging.getLogger(__name__)
 
+BULK_DEFAULTS = {
+    "max_items": 100,
+    "concurrency": 4,  # concurrent requests to the annostore
+}
+
+# write action -> ws notification
+WRITE_NOTIFICATIONS = {
+    "create": "annotation_created",
+    "update": "annotation_updated",
+    "delete": "annotation_deleted",
+}
+METHOD_ACTIONS = {"POST": "create", "PUT": "update", "DELETE": "delete"}
+
+
+def bulk_config():
+    config = dict(BULK_DEFAULTS)
+    config.update(getattr(settings, "ANNOSTORE_BULK", {}))
+    return config
+
 
 class AnnostoreFactory(object):
     @classmethod
     def get_instance(cls, request, col_id=None):
+        asconfig = cls.get_asconfig(request, col_id)
+
+        # for now, we only support one backend
+        (module_name, class_name) = ("annostore.store_backend", "CatchpyBackend")
+        StoreClass = getattr(importlib.import_module(module_name), class_name)
+        store_instance = StoreClass(request, asconfig)
+        return store_instance
+
+    @classmethod
+    async def aget_instance(cls, request, col_id=None):
+        """async variant of get_instance(); returns an async store backend."""
+        asconfig = await sync_to_async(cls.get_asconfig)(request, col_id)
+
+        (module_name, class_name) = ("annostore.store_backend", "AsyncCatchpyBackend")
+        StoreClass = getattr(importlib.import_module(module_name), class_name)
+        store_instance = StoreClass(request, asconfig)
+        return store_instance
+
+    @classmethod
+    def get_asconfig(cls, request, col_id=None):
+        """returns (url, apikey, secret) of the annostore for this request."""
         if not hasattr(request, "LTI"):
             # needs session state in LTI object!
             msg = "cannot proceed: missing LTI dict in request"
@@ -49,29 +93,23 @@ class AnnostoreFactory(object):
         # at this point, should have a collection id from querystring or the session
         # otherwise, it's a multi-assign search, and the default asconfig holds
         if collection_id is not None:
-            try:
-                collection = Assignment.objects.get(assignment_id=collection_id)
-            except Assignment.DoesNotExist:
+            collection = get_assignment_config(collection_id)
+            if collection is None:
                 msg = "error fetching assignment({}): not found".format(collection_id)
                 logger.error(msg)
                 raise Http404(msg)
             else:  # assignment asconfig never null!
                 asconfig = (
-                    collection.annotation_database_url,
-                    collection.annotation_database_apikey,
-                    collection.annotation_database_secret_token,
+                    collection.annostore_url,
+                    collection.apikey,
+                    collection.secret,
                 )
         logger.info(
             "asconfig: {} - {} - {}".format(
                 request.LTI.get("hx_context_id", "na"), collection_id, asconfig
             )
         )
-
-        # for now, we only support one backend
-        (module_name, class_name) = ("annostore.store_backend", "CatchpyBackend")
-        StoreClass = getattr(importlib.import_module(module_name), class_name)
-        store_instance = StoreClass(request, asconfig)
-        return store_instance
+        return asconfig
 
 
 class Annostore(object):
@@ -101,90 +139,119 @@ class Annostore(object):
         self.logger.info("annostore method: {}".format(self.request.method))
 
         if self.method == "GET":  # reads not supported!
-            self.logger.info("search params: {}".format(self.request.GET))
-            context_id = self.request.GET.get(
-                "contextId", self.request.GET.get("context_id", None)
-            )
-            if not context_id:  # hxat does not do searches across courses
-                msg = "search param missing: context_id"
-                self.logger.error(msg)
-                raise BadRequest(msg)
-            collection_id = self.request.GET.get(
-                "collectionI", self.request.GET.get("collection_id", None)
-            )
-            if not collection_id:
-                self.logger.warning(
-                    "search across assignments for course({})".format(context_id)
-                )
-            self._verify_course(context_id, collection_id)
-            response = self.search()
-
-            # retroactive participation grade
-            is_graded = self.LTI["launch_params"].get("lis_outcome_service_url", False)
-            if is_graded and self.did_retro_participation(response):
-                self.lti_grade_passback(score=1)
+            cached = self._prepare_search()
+            response = cached.get()
+            if response is None:
+                response = self._fallback_search(cached, self.search())
+                cached.set(response)
+            self._after_search(response)
             return response
 
         # TODO: possible in the future that hxat does not have to understand
         # the annotation body? and behave as a dumb proxy?
-        elif self.method in ["POST", "PUT"]:
-            body = json.loads(str(self.request.body, "utf-8"))
-            try:
-                context_id = body["platform"]["context_id"]
-                collection_id = body["platform"]["collection_id"]
-            except KeyError:
-                msg = "anno({}) missing context_id and/or collection_id in request".format(
-                    annotation_id
+        elif self.method in METHOD_ACTIONS:
+            action = METHOD_ACTIONS[self.method]
+            self._verify_write(action, annotation_id)
+            response = self._write(action, annotation_id)
+            cleaned_annotation = self._after_write(action, response)
+            if cleaned_annotation is not None:  # ws notification
+                self.send_annotation_notification(
+                    WRITE_NOTIFICATIONS[action], cleaned_annotation
                 )
-                self.logger.error(msg)
-                raise BadRequest(msg)
+            return response
+        else:
+            return JsonResponse(status=405)  # method not allowed
 
-            self._verify_course(context_id, collection_id)
-            self._verify_user(body.get("user", body.get("creator", {})).get("id", ""))
+    # steps shared by the sync and async dispatchers; these might hit the database
+    # or the lms, so the async dispatcher runs them in the sync threadpool
 
-            if self.method == "POST":
-                response = self.create(annotation_id)
-                if response.status_code == 200:
-                    is_graded = self.LTI["launch_params"].get(
-                        "lis_outcome_service_url", False
-                    )
-                    if is_graded:  # participation grade
-                        self.lti_grade_passback(score=1)
-                    # ws notification
-                    cleaned_annotation = json.loads(response.content.decode())
-                    self.send_annotation_notification(
-                        "annotation_created", cleaned_annotation
-                    )
-                return response
-            else:  # request.method == "PUT"
-                response = self.update(annotation_id)
-                # ws notification
-                cleaned_annotation = json.loads(response.content.decode())
-                self.send_annotation_notification(
-                    "annotation_updated", cleaned_annotation
-                )
-                return response
-        elif self.method == "DELETE":
+    def _prepare_search(self):
+        """verifies search params; returns the search cache entry."""
+        self.logger.info("search params: {}".format(self.request.GET))
+        context_id = self.request.GET.get(
+            "contextId", self.request.GET.get("context_id", None)
+        )
+        if not context_id:  # hxat does not do searches across courses
+            msg = "search param missing: context_id"
+            self.logger.error(msg)
+            raise BadRequest(msg)
+        collection_id = self.request.GET.get(
+            "collectionI", self.request.GET.get("collection_id", None)
+        )
+        if not collection_id:
+            self.logger.warning(
+                "search across assignments for course({})".format(context_id)
+            )
+        self._verify_course(context_id, collection_id)
+        return search_cache.SearchCache(self.LTI, self.request.GET)
+
+    def _fallback_search(self, cached, response):
+        # annostore unavailable (circuit open), serve stale results if any
+        if response.status_code == 503:
+            return cached.get_stale() or response
+        return response
+
+    def _after_search(self, response):
+        # retroactive participation grade
+        is_graded = self.LTI["launch_params"].get("lis_outcome_service_url", False)
+        if is_graded and self.did_retro_participation(response):
+            self.lti_grade_passback(score=1)
+
+    def _verify_write(self, action, annotation_id):
+        """raises BadRequest if cannot verify course and user in request body."""
+        if action == "delete":
             # TODO: is there any way to verify_course? or verify_user????
             self.logger.info("delete annotation({})".format(annotation_id))
-            response = self.delete(annotation_id)
-            # ws notification
-            cleaned_annotation = json.loads(response.content.decode())
-            self.send_annotation_notification("annotation_deleted", cleaned_annotation)
-            return response
+            return
+        body = json.loads(str(self.request.body, "utf-8"))
+        try:
+            context_id = body["platform"]["context_id"]
+            collection_id = body["platform"]["collection_id"]
+        except KeyError:
+            msg = "anno({}) missing context_id and/or collection_id in request".format(
+                annotation_id
+            )
+            self.logger.error(msg)
+            raise BadRequest(msg)
+
+        self._verify_course(context_id, collection_id)
+        self._verify_user(body.get("user", body.get("creator", {})).get("id", ""))
+
+    def _write(self, action, annotation_id, data=None):
+        # returns a coroutine for async backends
+        if action == "create":
+            return self.create(annotation_id, data=data)
+        elif action == "update":
+            return self.update(annotation_id, data=data)
         else:
-            return JsonResponse(status=405)  # method not allowed
+            return self.delete(annotation_id)
+
+    def _after_write(self, action, response):
+        """grades and invalidates searches; returns annotation to notify or None."""
+        if action == "create" and response.status_code != 200:
+            return None
+        cleaned_annotation = json.loads(response.content.decode())
+        if response.status_code == 200:
+            if action == "create":
+                self._grade_participation()
+            self._invalidate_searches(cleaned_annotation)
+        return cleaned_annotation
+
+    def _grade_participation(self):
+        is_graded = self.LTI["launch_params"].get("lis_outcome_service_url", False)
+        if is_graded:
+            self.lti_grade_passback(score=1)
 
     def search(self):
         raise NotImplementedError
 
-    def create(self, annotation_id=None):
+    def create(self, annotation_id=None, data=None):
         raise NotImplementedError
 
     def read(self, annotation_id):
         raise NotImplementedError
 
-    def update(self, annotation_id):
+    def update(self, annotation_id, data=None):
         raise NotImplementedError
 
     def delete(self, annotation_id):
@@ -193,6 +260,158 @@ class Annostore(object):
     def transfer(self, source_collection_id):
         raise NotImplementedError
 
+    def bulk(self, items):
+        """creates, updates and deletes a list of annotations; returns per-item results.
+
+        `items` is a list of {"action": "create|update|delete", "id": <anno_id>,
+        "annotation": <webannotation>}. Course and user are verified once per
+        distinct (context, collection) and user; then requests to the annostore
+        run concurrently, up to settings.ANNOSTORE_BULK["concurrency"]. Items that
+        fail verification are not sent, and do not fail the whole request.
+        """
+        config = bulk_config()
+        if not isinstance(items, list):
+            raise BadRequest("bulk request must be a list of annotations")
+        if len(items) > config["max_items"]:
+            raise BadRequest(
+                "bulk request over max_items({})".format(config["max_items"])
+            )
+
+        results = [None] * len(items)
+        jobs = []  # (index, action, annotation_id, data)
+        verified = {}  # verification key -> BadRequest or None
+        for index, item in enumerate(items):
+            try:
+                (action, annotation_id, data) = self._bulk_check(item, verified)
+            except BadRequest as e:
+                results[index] = {
+                    "index": index,
+                    "action": item.get("action") if isinstance(item, dict) else None,
+                    "id": item.get("id") if isinstance(item, dict) else None,
+                    "status": 400,
+                    "error": str(e),
+                }
+            else:
+                jobs.append((index, action, annotation_id, data))
+
+        # only the annostore requests go to the threads
+        with ThreadPoolExecutor(max_workers=config["concurrency"]) as executor:
+            responses = list(executor.map(self._bulk_send, jobs))
+
+        written = []  # (action, cleaned_annotation)
+        for (index, action, annotation_id, _), response in zip(jobs, responses):
+            try:
+                content = json.loads(response.content.decode())
+            except ValueError:
+                content = response.content.decode("utf-8", "replace")
+            result = {
+                "index": index,
+                "action": action,
+                "id": annotation_id,
+                "status": response.status_code,
+            }
+            if response.status_code == 200:
+                result["annotation"] = content
+                written.append((action, content))
+            else:
+                result["error"] = content
+            results[index] = result
+        self.logger.info(
+            "bulk: items({}) sent({}) written({})".format(
+                len(items), len(jobs), len(written)
+            )
+        )
+        if not written:
+            return results
+
+        if any(action == "create" for action, _ in written):
+            self._grade_participation()
+
+        # one search invalidation per assignment, one notification per target
+        targets = {}
+        batches = {}
+        for action, annotation in written:
+            platform = annotation.get("platform", {})
+            key = (
+                platform.get("context_id", self.LTI["hx_context_id"]),
+                platform.get("collection_id", self.LTI.get("hx_collection_id")),
+            )
+            targets.setdefault(key, set()).add(platform.get("target_source_id"))
+            batches.setdefault(self._notification_group(annotation), []).append(
+                {"action": WRITE_NOTIFICATIONS[action], "message": annotation}
+            )
+        for (context_id, collection_id), target_source_ids in targets.items():
+            target_source_ids.add(self.LTI.get("hx_object_id"))
+            search_cache.invalidate(context_id, collection_id, target_source_ids)
+        for group, messages in batches.items():
+            self.send_annotation_notification_batch(group, messages)
+        return results
+
+    def _bulk_check(self, item, verified):
+        """returns (action, annotation_id, data) or raises BadRequest."""
+        if not isinstance(item, dict) or item.get("action") not in WRITE_NOTIFICATIONS:
+            raise BadRequest(
+                "bulk item action must be one of {}".format(sorted(WRITE_NOTIFICATIONS))
+            )
+        action = item["action"]
+        annotation = item.get("annotation", {})
+        annotation_id = item.get("id", annotation.get("id"))
+        if not annotation_id:
+            raise BadRequest("bulk item missing annotation id")
+        if action == "delete":
+            # same as single delete: catchpy checks permissions
+            return (action, annotation_id, None)
+
+        try:
+            context_id = annotation["platform"]["context_id"]
+            collection_id = annotation["platform"]["collection_id"]
+        except KeyError:
+            raise BadRequest(
+                "anno({}) missing context_id and/or collection_id in request".format(
+                    annotation_id
+                )
+            )
+        user_id = annotation.get("user", annotation.get("creator", {})).get("id", "")
+        self._verify_once(
+            verified,
+            ("course", context_id, collection_id),
+            self._verify_bulk_target,
+            context_id,
+            collection_id,
+        )
+        self._verify_once(verified, ("user", str(user_id)), self._verify_user, user_id)
+        return (action, annotation_id, json.dumps(annotation).encode("utf-8"))
+
+    def _verify_once(self, verified, key, verify, *args):
+        # bulk items share verification results for the same course and user
+        if key not in verified:
+            try:
+                verify(*args)
+                verified[key] = None
+            except BadRequest as e:
+                verified[key] = e
+        if verified[key] is not None:
+            raise verified[key]
+
+    def _verify_bulk_target(self, context_id, collection_id):
+        self._verify_course(context_id, collection_id)
+        # bulk writes go to the annostore of the assignment in session
+        collection = get_assignment_config(collection_id)
+        if collection.annostore_url != self.asconfig[0]:
+            raise BadRequest(
+                "assignment({}) uses another annostore".format(collection_id)
+            )
+
+    def _bulk_send(self, job):
+        (index, action, annotation_id, data) = job
+        try:
+            return self._write(action, annotation_id, data=data)
+        except Exception as e:
+            self.logger.error(
+                "bulk {}: anno({}) exc({})".format(action, annotation_id, e)
+            )
+            return JsonResponse({"error": "annostore request failed"}, status=502)
+
     def _verify_course(self, context_id, collection_id=None):
         """raises BadRequest if cannot verify course."""
         expected = self.LTI["hx_context_id"]
@@ -207,9 +426,8 @@ class Annostore(object):
         if not collection_id:
             return
 
-        try:
-            collection = Assignment.objects.get(assignment_id=collection_id)
-        except Assignment.DoesNotExist:
+        collection = get_assignment_config(collection_id)
+        if collection is None:
             msg = "Course verification failed: assignment({}) not found".format(
                 collection_id
             )
@@ -217,13 +435,13 @@ class Annostore(object):
             raise BadRequest(msg)
         else:
             is_course_inconsistent = False
-            if getattr(collection.course, "course_id", None):
-                if not collection.course.course_id == context_id:
+            if collection.course_id:
+                if not collection.course_id == context_id:
                     is_course_inconsistent = True
                     self.logger.error(
                         "Course verification failed: collection({}) expected course({}), found({})".format(
-                            collection.assignment_id,
-                            collection.course.course_id,
+                            collection_id,
+                            collection.course_id,
                             context_id,
                         )
                     )
@@ -286,6 +504,21 @@ class Annostore(object):
     def lti_grade_passback(self, score=1.0):
         if score < 0 or score > 1.0 or isinstance(score, str):
             return
+        params = self.LTI.get("launch_params", {})
+        if params.get("lis_result_sourcedid") and grade_ledger.already_sent(
+            params.get("resource_link_id"),
+            self.LTI["hx_user_id"],
+            params["lis_result_sourcedid"],
+            score,
+        ):
+            self.logger.info(
+                "lti_grade already sent. user({}) assignment({}) score({})".format(
+                    self.LTI["hx_user_id"], self.LTI["hx_collection_id"], score
+                )
+            )
+            return None
+        if grade_queue.is_enabled():
+            return self._enqueue_grade_passback(score)
         tool_provider = self._get_tool_provider()
         if not tool_provider.is_outcome_service():
             self.logger.info(
@@ -302,7 +535,8 @@ class Annostore(object):
             )
         )
         try:
-            outcome = tool_provider.post_replace_result(score)
+            with timing.span("passback"):
+                outcome = tool_provider.post_replace_result(score)
             self.logger.info(vars(outcome))
             if outcome.is_success():
                 self.logger.info(
@@ -313,6 +547,12 @@ class Annostore(object):
                         outcome.description,
                     )
                 )
+                grade_ledger.record(
+                    params.get("resource_link_id"),
+                    self.LTI["hx_user_id"],
+                    params.get("lis_result_sourcedid"),
+                    score,
+                )
             else:
                 self.logger.error(
                     "lti_grade ERROR. user({}) assignment({}) score({}) desc({})".format(
@@ -334,6 +574,26 @@ class Annostore(object):
         # should return anything?
         return None
 
+    def _enqueue_grade_passback(self, score):
+        params = self.LTI.get("launch_params", {})
+        if not (
+            params.get("lis_outcome_service_url") and params.get("lis_result_sourcedid")
+        ):
+            self.logger.info(
+                "LTI consumer not expecting grade for user({}) assignment({})".format(
+                    self.LTI["hx_user_id"], self.LTI["hx_collection_id"]
+                )
+            )
+            return None
+        grade_queue.enqueue(
+            user_id=self.LTI["hx_user_id"],
+            assignment_id=self.LTI["hx_collection_id"],
+            score=score,
+            context_id=self.LTI["hx_context_id"],
+            launch_params=params,
+        )
+        return None
+
     def did_retro_participation(self, response):
         # to give participation grades retroactively after instructor
         # forgets to turn it on initially
@@ -342,42 +602,143 @@ class Annostore(object):
         ) in self.request.GET.getlist(
             "userid[]", self.request.GET.getlist("userid", [])
         )  # includes logged user in search?
-        return retrieved_self and int(json.loads(response.content)["total"]) > 0
+        return retrieved_self and response_total(response) > 0
+
+    def _invalidate_searches(self, annotation):
+        # deletes only come with the annotation id, so take course, assignment and
+        # target from the annotation returned by the annostore
+        platform = annotation.get("platform", {})
+        search_cache.invalidate(
+            platform.get("context_id", self.LTI["hx_context_id"]),
+            platform.get("collection_id", self.LTI.get("hx_collection_id")),
+            [platform.get("target_source_id"), self.LTI.get("hx_object_id")],
+        )
 
-    def send_annotation_notification(self, message_type, annotation):
+    def _notification_group(self, annotation=None):
         # target_source_id from session guarantees it's a sequential integer id from
         # hxat db; image annotations have the uri as target_source_id in `platform`
-        pat = re.compile("[^a-zA-Z0-9-.]")
-        context_id = pat.sub("-", self.LTI["hx_context_id"])
-        collection_id = pat.sub("-", self.LTI["hx_collection_id"])
+        context_id = self.LTI["hx_context_id"]
+        collection_id = self.LTI["hx_collection_id"]
         target_source_id = self.LTI["hx_object_id"]
-
-        group = "{}--{}--{}".format(
+        pat = re.compile("[^a-zA-Z0-9-.]")
+        if annotation is not None:  # bulk writes might be for other targets
+            platform = annotation.get("platform", {})
+            context_id = platform.get("context_id", context_id)
+            collection_id = platform.get("collection_id", collection_id)
+            if platform.get("target_source_id"):
+                # uri targets are not valid in group names
+                target_source_id = pat.sub("-", str(platform["target_source_id"]))
+
+        context_id = pat.sub("-", context_id)
+        collection_id = pat.sub("-", collection_id)
+
+        return "{}--{}--{}".format(
             re.sub("[^a-zA-Z0-9-.]", "-", context_id), collection_id, target_source_id
         )
+
+    def _notify_error(self, message_type, group, annotation, e):
+        # while transitioning to websockets, it might be that a redis backend is not
+        # available and notifications are not really being used; to avoid clogging
+        # logs, just printing error; to print the error stack set env var
+        # "HXAT_NOTIFY_ERRORLOG=true"
+        msg = "##### unable to notify: action({}) group({}) id({}): {}".format(
+            message_type, group, annotation.get("id", "unknown_id"), e
+        )
+        self.logger.error(msg, exc_info=settings.HXAT_NOTIFY_ERRORLOG)
+
+    def send_annotation_notification(self, message_type, annotation):
+        group = self._notification_group()
         self.logger.info(
             "###### action({}) group({}) id({})".format(
                 message_type, group, annotation.get("id", "unknown_id")
             )
         )
         try:
-            async_to_sync(self.channel_layer.group_send)(
-                group,
-                {
-                    "type": "annotation_notification",
-                    "message": annotation,
-                    "action": message_type,
-                },
-            )
+            with timing.span("notify"):
+                async_to_sync(self.channel_layer.group_send)(
+                    group,
+                    {
+                        "type": "annotation_notification",
+                        "message": annotation,
+                        "action": message_type,
+                    },
+                )
+        except Exception as e:
+            self._notify_error(message_type, group, annotation, e)
+
+    def send_annotation_notification_batch(self, group, messages):
+        """one group_send with all `messages` for the same target."""
+        self.logger.info(
+            "###### action(batch) group({}) messages({})".format(group, len(messages))
+        )
+        try:
+            with timing.span("notify"):
+                async_to_sync(self.channel_layer.group_send)(
+                    group,
+                    {
+                        "type": "annotation_notification_batch",
+                        "messages": messages,
+                    },
+                )
         except Exception as e:
-            # while transitioning to websockets, it might be that a redis backend is not
-            # available and notifications are not really being used; to avoid clogging
-            # logs, just printing error; to print the error stack set env var
-            # "HXAT_NOTIFY_ERRORLOG=true"
-            msg = "##### unable to notify: action({}) group({}) id({}): {}".format(
-                message_type, group, annotation.get("id", "unknown_id"), e
+            self._notify_error("batch", group, {"id": "batch"}, e)
+
+
+class AsyncAnnostore(Annostore):
+    """Annostore for async views.
+
+    The calls to the backend (search, create, ...) and the ws notification are
+    awaited; checks that hit the database and the lti grade passback run in the
+    sync threadpool.
+    """
+
+    async def dispatcher(self, annotation_id=None):
+        self.logger.info("annostore method: {}".format(self.request.method))
+
+        if self.method == "GET":  # reads not supported!
+            cached = await sync_to_async(self._prepare_search)()
+            response = await sync_to_async(cached.get)()
+            if response is None:
+                response = await self.search()
+                response = await sync_to_async(self._fallback_search)(cached, response)
+                await sync_to_async(cached.set)(response)
+            await sync_to_async(self._after_search)(response)
+            return response
+
+        elif self.method in METHOD_ACTIONS:
+            action = METHOD_ACTIONS[self.method]
+            await sync_to_async(self._verify_write)(action, annotation_id)
+            response = await self._write(action, annotation_id)
+            cleaned_annotation = await sync_to_async(self._after_write)(
+                action, response
+            )
+            if cleaned_annotation is not None:  # ws notification
+                await self.send_annotation_notification(
+                    WRITE_NOTIFICATIONS[action], cleaned_annotation
+                )
+            return response
+        else:
+            return JsonResponse(status=405)  # method not allowed
+
+    async def send_annotation_notification(self, message_type, annotation):
+        group = self._notification_group()
+        self.logger.info(
+            "###### action({}) group({}) id({})".format(
+                message_type, group, annotation.get("id", "unknown_id")
             )
-            self.logger.error(msg, exc_info=settings.HXAT_NOTIFY_ERRORLOG)
+        )
+        try:
+            with timing.span("notify"):
+                await self.channel_layer.group_send(
+                    group,
+                    {
+                        "type": "annotation_notification",
+                        "message": annotation,
+                        "action": message_type,
+                    },
+                )
+        except Exception as e:
+            self._notify_error(message_type, group, annotation, e)
 
 
 """
@@ -1,10 +1,14 @@
 import logging
+import time
 
+import httpx
 import requests
-from annostore.store import Annostore
+from annostore import breaker, passthrough, pool
+from annostore.store import Annostore, AsyncAnnostore
 from django.conf import settings
 from django.http import HttpResponse, JsonResponse
 from hx_lti_initializer.utils import retrieve_token
+from hxat import timing
 
 logger = logging.getLogger(__name__)
 
@@ -12,7 +16,9 @@ logger = logging.getLogger(__name__)
 class CatchpyBackend(Annostore):
     def __init__(self, request, asconfig):
         super().__init__(request, asconfig)
-        self.timeout = 5.0  # timeout for most actions, other than search perhaps
+        # keep-alive session shared by all requests to this annostore
+        self.session = pool.get_session(self.asconfig[0])
+        self.breaker = breaker.get_breaker(self.asconfig[0])
         self.headers = {"content-type": "application/json"}
         self.headers["authorization"] = "token " + retrieve_token(
             userid=request.LTI["hx_user_id"],
@@ -28,6 +34,41 @@ class CatchpyBackend(Annostore):
     def _response_timeout(self):
         return JsonResponse({"error": "request timeout"}, status=500)
 
+    def _response_unavailable(self, operation):
+        # breaker is open: searches get an empty result, other calls an error
+        self.logger.warning(
+            "{}: annostore({}) unavailable, circuit open".format(
+                operation, self.asconfig[0]
+            )
+        )
+        if operation == "search":
+            data = {"total": 0, "size": 0, "limit": 0, "offset": 0, "rows": []}
+        else:
+            data = {"error": "annostore unavailable"}
+        response = JsonResponse(data, status=503)
+        response["Retry-After"] = str(breaker.breaker_config()["open_secs"])
+        return response
+
+    def _timeout(self, operation):
+        return self.breaker.timeout(operation)
+
+    def _request(self, operation, method, database_url, **kwargs):
+        """calls catchpy through the circuit breaker; raises CircuitOpenError."""
+        if not breaker.is_enabled():
+            with timing.span("catchpy"):
+                return self.session.request(method, database_url, **kwargs)
+        if not self.breaker.allow():
+            raise breaker.CircuitOpenError(self.asconfig[0])
+        started = time.monotonic()
+        ok = False
+        try:
+            with timing.span("catchpy"):
+                response = self.session.request(method, database_url, **kwargs)
+            ok = not breaker.is_failure(response.status_code)
+            return response
+        finally:
+            self.breaker.record(operation, time.monotonic() - started, ok)
+
     def _response_from_catchpy(self, response):
         if (
             response.headers.get("content-type", None)
@@ -41,6 +82,12 @@ class CatchpyBackend(Annostore):
                 content_type=response.headers.get("content-type", "text/plain"),
             )
 
+    def _is_passthrough(self, response):
+        return (
+            response.status_code == 200
+            and "application/json" in response.headers.get("content-type", "")
+        )
+
     def before_search(self):
         # Override the auth token when the user is a course administrator, so they can query annotations
         # that have set their read permissions to private (i.e. read: self-only).
@@ -60,13 +107,22 @@ class CatchpyBackend(Annostore):
         # add perms for admin access to private annotations
         self.before_search()
 
-        timeout = 10.0
+        timeout = self._timeout("search")
         params = self.request.GET.urlencode()
         database_url = self._get_database_url("/")
+        stream = settings.ANNOSTORE_PASSTHROUGH
         try:
-            response = requests.get(
-                database_url, headers=self.headers, params=params, timeout=timeout
+            response = self._request(
+                "search",
+                "GET",
+                database_url,
+                headers=self.headers,
+                params=params,
+                timeout=timeout,
+                stream=stream,
             )
+        except breaker.CircuitOpenError:
+            return self._response_unavailable("search")
         except requests.exceptions.Timeout as e:
             self.logger.error(
                 "search: url({}) headers({}) params({}) timeout({}) exc({})".format(
@@ -85,6 +141,8 @@ class CatchpyBackend(Annostore):
                 response.headers.get("content-length", 0),
             )
         )
+        if stream and self._is_passthrough(response):
+            return passthrough.streaming_response(response)
         return self._response_from_catchpy(response)
 
     # implemented for completion; hxat does not support READ requests!
@@ -96,9 +154,15 @@ class CatchpyBackend(Annostore):
             )
         )
         try:
-            response = requests.get(
-                database_url, headers=self.headers, timeout=self.timeout
+            response = self._request(
+                "read",
+                "GET",
+                database_url,
+                headers=self.headers,
+                timeout=self._timeout("read"),
             )
+        except breaker.CircuitOpenError:
+            return self._response_unavailable("read")
         except requests.exceptions.Timeout as e:
             self.logger.error(
                 "read: url({}) headers({}) exc({})".format(
@@ -113,18 +177,25 @@ class CatchpyBackend(Annostore):
         )
         return self._response_from_catchpy(response)
 
-    def create(self, annotation_id):
+    def create(self, annotation_id, data=None):
         database_url = self._get_database_url("/{}".format(annotation_id))
-        data = self.request.body
+        data = self.request.body if data is None else data
         self.logger.info(
             "create: url({}) headers({}) data({})".format(
                 database_url, self.headers, data
             )
         )
         try:
-            response = requests.post(
-                database_url, data=data, headers=self.headers, timeout=self.timeout
+            response = self._request(
+                "create",
+                "POST",
+                database_url,
+                data=data,
+                headers=self.headers,
+                timeout=self._timeout("create"),
             )
+        except breaker.CircuitOpenError:
+            return self._response_unavailable("create")
         except requests.exceptions.Timeout as e:
             self.logger.error(
                 "create: url({}) headers({}) data({}) exc({})".format(
@@ -139,18 +210,25 @@ class CatchpyBackend(Annostore):
         )
         return self._response_from_catchpy(response)
 
-    def update(self, annotation_id):
+    def update(self, annotation_id, data=None):
         database_url = self._get_database_url("/%s" % annotation_id)
-        data = self.request.body
+        data = self.request.body if data is None else data
         self.logger.info(
             "update: url({}) headers({}) data({})".format(
                 database_url, self.headers, data
             )
         )
         try:
-            response = requests.put(
-                database_url, data=data, headers=self.headers, timeout=self.timeout
+            response = self._request(
+                "update",
+                "PUT",
+                database_url,
+                data=data,
+                headers=self.headers,
+                timeout=self._timeout("update"),
             )
+        except breaker.CircuitOpenError:
+            return self._response_unavailable("update")
         except requests.exceptions.Timeout as e:
             self.logger.error(
                 "update: url({}) headers({}) data({}) exc({})".format(
@@ -173,9 +251,15 @@ class CatchpyBackend(Annostore):
             )
         )
         try:
-            response = requests.delete(
-                database_url, headers=self.headers, timeout=self.timeout
+            response = self._request(
+                "delete",
+                "DELETE",
+                database_url,
+                headers=self.headers,
+                timeout=self._timeout("delete"),
             )
+        except breaker.CircuitOpenError:
+            return self._response_unavailable("delete")
         except requests.exceptions.Timeout as e:
             self.logger.error(
                 "update: url({}) headers({}) exc({})".format(
@@ -214,12 +298,16 @@ class CatchpyBackend(Annostore):
             override=["CAN_COPY"],
         )
         try:
-            response = requests.post(
+            response = self._request(
+                "transfer",
+                "POST",
                 database_url,
                 json=transfer_params,
                 headers=self.headers,
-                timeout=self.timeout,
+                timeout=self._timeout("transfer"),
             )
+        except breaker.CircuitOpenError:
+            return self._response_unavailable("transfer")
         except requests.exceptions.Timeout as e:
             self.logger.error(
                 "copy: url({}) headers({}) data({}) exc({})".format(
@@ -235,4 +323,81 @@ class CatchpyBackend(Annostore):
         return self._response_from_catchpy(response)
 
 
+class AsyncCatchpyBackend(CatchpyBackend, AsyncAnnostore):
+    """CatchpyBackend for the async proxy view.
+
+    Requests to catchpy go through a shared httpx.AsyncClient, so waiting for
+    catchpy does not hold a worker thread. Search results are read whole, even
+    if settings.ANNOSTORE_PASSTHROUGH.
+    """
+
+    def __init__(self, request, asconfig):
+        super().__init__(request, asconfig)
+        self.client = pool.get_async_client(self.asconfig[0])
+
+    async def _send(self, operation, method, database_url, **kwargs):
+        timeout = self._timeout(operation)
+        use_breaker = breaker.is_enabled()
+        if use_breaker and not self.breaker.allow():
+            return self._response_unavailable(operation)
+        started = time.monotonic()
+        ok = False
+        try:
+            with timing.span("catchpy"):
+                response = await self.client.request(
+                    method,
+                    database_url,
+                    headers=self.headers,
+                    timeout=timeout,
+                    **kwargs,
+                )
+            ok = not breaker.is_failure(response.status_code)
+        except httpx.TimeoutException as e:
+            self.logger.error(
+                "{}: url({}) headers({}) timeout({}) exc({})".format(
+                    operation, database_url, self.headers, timeout, e
+                )
+            )
+            return self._response_timeout()
+        finally:
+            if use_breaker:
+                self.breaker.record(operation, time.monotonic() - started, ok)
+        self.logger.info(
+            "{}: url({}) headers({}) status({}) content_length({})".format(
+                operation,
+                database_url,
+                self.headers,
+                response.status_code,
+                response.headers.get("content-length", 0),
+            )
+        )
+        return self._response_from_catchpy(response)
+
+    async def search(self):
+        # add perms for admin access to private annotations
+        self.before_search()
+        params = self.request.GET.urlencode()
+        return await self._send(
+            "search", "GET", self._get_database_url("/"), params=params
+        )
+
+    async def read(self, annotation_id):
+        database_url = self._get_database_url("/{}".format(annotation_id))
+        return await self._send("read", "GET", database_url)
+
+    async def create(self, annotation_id, data=None):
+        database_url = self._get_database_url("/{}".format(annotation_id))
+        data = self.request.body if data is None else data
+        return await self._send("create", "POST", database_url, content=data)
+
+    async def update(self, annotation_id, data=None):
+        database_url = self._get_database_url("/{}".format(annotation_id))
+        data = self.request.body if data is None else data
+        return await self._send("update", "PUT", database_url, content=data)
+
+    async def delete(self, annotation_id):
+        database_url = self._get_database_url("/{}".format(annotation_id))
+        return await self._send("delete", "DELETE", database_url)
+
+
 ###################################################################################
@@ -1,11 +1,15 @@
 import json
 import logging
 
+from annostore import grade_ledger
+from annostore.passthrough import response_total
 from annostore.store import AnnostoreFactory
+from asgiref.sync import sync_to_async
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.middleware import AuthenticationMiddleware
 from django.contrib.sessions.middleware import SessionMiddleware
-from django.http import JsonResponse
+from django.core.exceptions import BadRequest
+from django.http import HttpResponseNotAllowed, JsonResponse
 from django.test import RequestFactory
 from django.urls import reverse
 from django.views.decorators.csrf import csrf_exempt
@@ -24,9 +28,63 @@ def api_root(request, annotation_id=None):
     return annostore.dispatcher(annotation_id)
 
 
+def _launch_snapshot(request):
+    """loads the session and returns a copy of the current lti launch."""
+    request.LTI.assert_valid()
+    return dict(request.session["LTI_LAUNCH"][request.LTI.resource_link_id])
+
+
+async def api_root_async(request, annotation_id=None):
+    """async variant of api_root; see settings.ANNOSTORE_ASYNC."""
+    # django 4.2 csrf_exempt and require_http_methods only wrap sync views
+    if request.method not in ["GET", "POST", "PUT", "DELETE"]:
+        return HttpResponseNotAllowed(["GET", "POST", "PUT", "DELETE"])
+
+    # session backends are sync; load the session once, off the event loop, so
+    # the store reads the lti launch from a plain dict
+    if hasattr(request, "LTI"):
+        request.LTI = await sync_to_async(_launch_snapshot)(request)
+    annostore = await AnnostoreFactory.aget_instance(request)
+    return await annostore.dispatcher(annotation_id)
+
+
+api_root_async.csrf_exempt = True
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def api_bulk(request):
+    """creates, updates and deletes a list of annotations in one request."""
+    try:
+        items = json.loads(str(request.body, "utf-8"))
+    except ValueError:
+        raise BadRequest("bulk request body is not json")
+    annostore = AnnostoreFactory.get_instance(request)
+    results = annostore.bulk(items)
+    succeeded = len([r for r in results if r["status"] == 200])
+    return JsonResponse(
+        data={
+            "total": len(results),
+            "succeeded": succeeded,
+            "failed": len(results) - succeeded,
+            "results": results,
+        }
+    )
+
+
 @require_http_methods("GET")
 def grade_me(request):
     """explicit request to send participation grades back to LMS"""
+    # no need to search for annotations if lms already has the grade
+    launch_params = request.LTI.get("launch_params", {})
+    if launch_params.get("lis_result_sourcedid") and grade_ledger.already_sent(
+        launch_params.get("resource_link_id"),
+        request.LTI["hx_user_id"],
+        launch_params["lis_result_sourcedid"],
+        1.0,
+    ):
+        return JsonResponse(data={"grade_request_sent": True})
+
     # have to fake a search request to pass to Annostore
     path = reverse("annotation_store:api_root_search")
     params = {
@@ -55,19 +113,20 @@ def grade_me(request):
 
     if response.status_code == 200:
         logger.info("Grade me search successful({})".format(response))
-        annotations = json.loads(response.content)
-        if annotations["total"] > 0:
+        total = response_total(response)
+        if total > 0:
             logger.info(
                 "check grade back({}):({}):({}):({}):total({})".format(
                     request.LTI["hx_user_id"],
                     request.LTI["hx_context_id"],
                     request.LTI["hx_collection_id"],
                     request.LTI["hx_object_id"],
-                    annotations["total"],
+                    total,
                 )
             )
             annostore.lti_grade_passback()
             request_sent = True
+    response.close()  # search might be streaming from annostore
     return JsonResponse(
         data={"grade_request_sent": request_sent},
     )
@@ -2,14 +2,18 @@
 These functions will be used for the initializer module, but may also be
 helpful elsewhere.
 """
+
+import collections
 import datetime
+import hashlib
 import logging
+import threading
 import time
 import urllib
 from zoneinfo import ZoneInfo
 
 import jwt
-import requests
+from annostore.pool import get_session
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.db import transaction
@@ -17,6 +21,7 @@ from django.urls import reverse
 
 # import Sample Target Object Model
 from hx_lti_assignment.models import Assignment
+from hxat import metrics
 from target_object_database.models import TargetObject
 
 from .models import LTICourse, LTIProfile
@@ -89,11 +94,15 @@ def save_session(request, resource_link_id, **kwargs):
             resource_link_id, k
         )
 
+    # the session is only marked modified, and written, for values that changed
+    launch = request.session["LTI_LAUNCH"][resource_link_id]
     for kwarg in kwargs:
         session_key, default_value = session_map[kwarg]
         session_value = kwargs.get(kwarg, default_value)
+        if session_key in launch and launch[session_key] == session_value:
+            continue
         logger.debug("save_session: %s=%s" % (session_key, session_value))
-        request.session["LTI_LAUNCH"][resource_link_id][session_key] = session_value
+        launch[session_key] = session_value
         request.session.modified = True
 
 
@@ -110,35 +119,79 @@ def get_lti_value(key, request):
     return value
 
 
-def retrieve_token(userid, apikey, secret, ttl=1, override=None):
-    """
-    generates a jwt for the backend of annotations.
+# tokens are reused while at least this fraction of their ttl is left
+TOKEN_CACHE_MIN_TTL_FRACTION = 0.5
 
-    default ttl = 1 sec
-    override must be a list of strings
-    """
-    apikey = apikey
-    secret = secret
+_token_cache = collections.OrderedDict()  # lru: key -> (token, expires_at)
+_token_cache_lock = threading.Lock()
+
+
+def _mint_token(userid, apikey, secret, ttl, override):
     # the following five lines of code allows you to include the
     # defaulttimezone in the iso format
     # noqa for more information: http://stackoverflow.com/questions/3401428/how-to-get-an-isoformat-datetime-string-including-the-default-timezone
+    issued_at = datetime.datetime.now(tz=ZoneInfo("UTC")).replace(microsecond=0)
 
-    def _now():
-        return (
-            datetime.datetime.now(tz=ZoneInfo("UTC"))
-            .replace(microsecond=0)
-            .isoformat()
-        )  # noqa
-
-    payload = {"consumerKey": apikey, "userId": userid, "issuedAt": _now(), "ttl": ttl}
+    payload = {
+        "consumerKey": apikey,
+        "userId": userid,
+        "issuedAt": issued_at.isoformat(),
+        "ttl": ttl,
+    }
     if override:
         payload["override"] = [str(x) for x in override]
     token = jwt.encode(payload, secret)
     if isinstance(token, bytes):
         token = token.decode()
+    return (token, issued_at.timestamp() + ttl)
+
+
+def retrieve_token(userid, apikey, secret, ttl=1, override=None):
+    """
+    generates a jwt for the backend of annotations.
+
+    default ttl = 1 sec
+    override must be a list of strings
+
+    tokens are kept in a lru cache of settings.RETRIEVE_TOKEN_CACHE_SIZE
+    entries, and handed back while they have enough of their ttl left.
+    """
+    cache_size = getattr(settings, "RETRIEVE_TOKEN_CACHE_SIZE", 0)
+    if cache_size <= 0:
+        return _mint_token(userid, apikey, secret, ttl, override)[0]
+
+    key = (
+        userid,
+        apikey,
+        hashlib.sha256(str(secret).encode("utf-8")).hexdigest(),
+        ttl,
+        tuple(str(x) for x in override) if override else (),
+    )
+    now = time.time()
+    with _token_cache_lock:
+        cached = _token_cache.get(key)
+        if cached is not None:
+            (token, expires_at) = cached
+            if expires_at - now >= ttl * TOKEN_CACHE_MIN_TTL_FRACTION:
+                _token_cache.move_to_end(key)
+                metrics.incr("jwt_token_cache_hits")
+                return token
+
+    metrics.incr("jwt_token_cache_misses")
+    (token, expires_at) = _mint_token(userid, apikey, secret, ttl, override)
+    with _token_cache_lock:
+        _token_cache[key] = (token, expires_at)
+        _token_cache.move_to_end(key)
+        while len(_token_cache) > cache_size:
+            _token_cache.popitem(last=False)
     return token
 
 
+def clear_token_cache():
+    with _token_cache_lock:
+        _token_cache.clear()
+
+
 def get_admin_ids(context_id):
     """
     Returns a set of the user ids of all users with an admin role
@@ -254,7 +307,7 @@ def _fetch_annotations_by_course(
 
     # make request
     request_start_time = time.perf_counter()
-    r = requests.get(request_url, headers=headers)
+    r = get_session(annotation_db_url).get(request_url, headers=headers)
     request_end_time = time.perf_counter()
     request_elapsed_time = request_end_time - request_start_time
 
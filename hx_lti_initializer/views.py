@@ -9,9 +9,10 @@ other information that will be rendered to the access/init screen to the user.
 from abstract_base_classes.target_object_database_api import TOD_Implementation
 from django.conf import settings
 from django.contrib import messages
-from django.contrib.auth import login
+from django.contrib.auth import SESSION_KEY, login
 from django.contrib.auth.decorators import login_required
 from django.core.exceptions import MultipleObjectsReturned, PermissionDenied
+from django.db.models import Exists, OuterRef
 from django.http import HttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.templatetags.static import static
@@ -730,10 +731,8 @@ def launch_lti(request):
             "Studio is not supported. Please publish and complete content configuration in the live environment."
         )
 
-    # saves in session what we have so far
-    save_session(
-        request,
-        resource_link_id,
+    # what goes in session; saved once, when the course is resolved
+    session_values = dict(
         user_id=user_id,
         user_name=display_name,
         user_scope=user_scope,
@@ -742,6 +741,13 @@ def launch_lti(request):
         context_id=context_id,
     )
 
+    # fetch or create the profile of staff, to be added to course admins
+    lti_profile = None
+    if is_staff:
+        lti_profile = get_lti_admin(
+            user_id, external_user_id, display_name, roles, user_scope
+        )
+
     # checks course to be accessed; in canvas course can be None, meaning index/dashboard
     logger.debug(
         "lti_launch: context_id({}) resource_link_id({})".format(
@@ -749,7 +755,7 @@ def launch_lti(request):
         )
     )
     try:
-        course_object = LTICourse.get_course_by_id(context_id)
+        course_object = get_lti_course(context_id, lti_profile)
     except LTICourse.DoesNotExist:
         if not is_staff:
             logger.debug(
@@ -757,6 +763,7 @@ def launch_lti(request):
                     context_id
                 )
             )
+            save_session(request, resource_link_id, **session_values)
             raise PlatformError(
                 'Course "{}" is not supported.'.format(
                     request.LTI["launch_params"].get("context_title", context_id)
@@ -774,20 +781,18 @@ def launch_lti(request):
         save_session(
             request,
             resource_link_id,
-            context_id=context_id,
             course_name=course_object.course_name,
             course_id=course_object.id,
+            **session_values,
         )
         # login user if is_staff
         if is_staff:
-            # fetch or create and add profile to course admins
-            lti_profile = get_lti_admin(
-                user_id, external_user_id, display_name, roles, user_scope
-            )
-            course_object.course_admins.add(lti_profile)
-            course_object.save()
+            # add profile to course admins, if not there yet
+            if not course_object.is_course_admin:
+                course_object.course_admins.add(lti_profile)
+                course_object.save()
             # admin user django login
-            login(request, lti_profile.user)
+            login_lti_admin(request, lti_profile)
 
         redirect_url = url2redirect_targetobject(
             request, resource_link_id, context_id, is_staff, user_id
@@ -795,11 +800,8 @@ def launch_lti(request):
         return redirect(redirect_url)
 
     # by now we know: user is staff and course does not exist. First access to the course!
-    lti_profile = get_lti_admin(
-        user_id, external_user_id, display_name, roles, user_scope
-    )
     # admin user django login
-    login(request, lti_profile.user)
+    login_lti_admin(request, lti_profile)
     course_object = create_lti_course(
         request, resource_link_id, context_id, lti_profile
     )
@@ -810,6 +812,7 @@ def launch_lti(request):
         resource_link_id,
         course_name=course_object.course_name,
         course_id=course_object.id,
+        **session_values,
     )
     url = "{}?resource_link_id={}&utm_source={}".format(
         reverse("hx_lti_initializer:course_admin_hub"),
@@ -819,9 +822,32 @@ def launch_lti(request):
     return redirect(url)
 
 
+def get_lti_course(context_id, lti_profile=None):
+    """course for context_id; with a profile, is_course_admin tells if it is admin."""
+    courses = LTICourse.objects.filter(course_id=context_id)
+    if lti_profile is not None:
+        courses = courses.annotate(
+            is_course_admin=Exists(
+                LTICourse.course_admins.through.objects.filter(
+                    lticourse=OuterRef("pk"), ltiprofile=lti_profile
+                )
+            )
+        )
+    return courses.get()
+
+
+def login_lti_admin(request, lti_profile):
+    """django login, unless the session is already logged in as this user."""
+    if request.session.get(SESSION_KEY) == str(lti_profile.user_id):
+        return
+    login(request, lti_profile.user)
+
+
 def url2redirect_targetobject(request, resource_link_id, context_id, is_staff, user_id):
     try:
-        config = LTIResourceLinkConfig.objects.get(resource_link_id=resource_link_id)
+        config = LTIResourceLinkConfig.objects.select_related(
+            "assignment_target__assignment"
+        ).get(resource_link_id=resource_link_id)
     except LTIResourceLinkConfig.DoesNotExist:  # no starting object for this course
         if not is_staff and "edx" == settings.PLATFORM:
             raise PlatformError(
@@ -861,7 +887,9 @@ def get_lti_admin(user_id, external_user_id, display_name, roles, user_scope):
     """fetch lti_profile or create. Assumes is_staff == True."""
     try:
         # admin already exists?
-        lti_profile = LTIProfile.objects.get(anon_id=user_id, scope=user_scope)
+        lti_profile = LTIProfile.objects.select_related("user").get(
+            anon_id=user_id, scope=user_scope
+        )
     except LTIProfile.DoesNotExist:
         logger.debug(
             "ltilaunch - creating LTIProfile({}, {}).".format(
@@ -0,0 +1,36 @@
+"""
+structured logging for hxat.
+
+JsonFormatter writes one json object per log record; fields passed as
+`extra={"fields": {...}}` are added to it, e.g.
+
+    logger.info("request", extra={"fields": {"status": 200, "duration_ms": 12.5}})
+
+Log calls in hot paths should pass %-style args instead of formatting the
+message, so nothing is formatted when the level is disabled; loops that only
+log go behind logger.isEnabledFor().
+"""
+
+import datetime
+import json
+import logging
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        data = {
+            "ts": datetime.datetime.fromtimestamp(
+                record.created, tz=datetime.timezone.utc
+            ).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "line": record.lineno,
+            "message": record.getMessage(),
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id is not None:
+            data["request_id"] = request_id
+        data.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            data["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(data, default=str)
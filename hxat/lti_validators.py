@@ -1,14 +1,105 @@
-"""oauth validators for lti."""
-
+"""oauth validators for lti.
+
+Replay protection: oauthlib already rejects launches with a timestamp more
+than `timestamp_lifetime` secs away from now; within that window, a nonce
+(per client key and timestamp) is accepted once. Seen nonces are kept in the
+django cache, shared by all workers, until their timestamp is out of the
+window; an in-process lru in front of it rejects replays to the same worker
+without a cache round-trip.
+"""
+
+import collections
+import functools
+import hashlib
 import logging
+import threading
+import time
 from uuid import uuid4
 
 from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from hxat import metrics
 from oauthlib.common import to_unicode
 from oauthlib.oauth1 import RequestValidator
 
 log = logging.getLogger(__name__)
 
+NONCE_STORE_DEFAULTS = {
+    "enabled": True,
+    "timestamp_lifetime": 600,  # secs a launch timestamp is valid, before/after now
+    "lru_size": 10000,  # nonces remembered in-process
+    "cache_alias": "default",
+}
+NONCE_CACHE_PREFIX = "hxat:lti_nonce:"
+
+_nonce_lock = threading.Lock()
+_recent_nonces = collections.OrderedDict()  # lru: key -> expires_at
+
+
+def nonce_store_config():
+    config = dict(NONCE_STORE_DEFAULTS)
+    config.update(getattr(settings, "LTI_NONCE_STORE", {}))
+    return config
+
+
+def _nonce_ttl(timestamp, lifetime, now):
+    # keep the nonce while its timestamp is in the window; at most 2 windows
+    try:
+        ttl = int(timestamp) + lifetime - now
+    except (TypeError, ValueError):
+        ttl = lifetime
+    return max(1, min(int(ttl), 2 * lifetime))
+
+
+def seen_nonce(client_key, timestamp, nonce):
+    """True if nonce was seen for this client key and timestamp; records it if not."""
+    config = nonce_store_config()
+    digest = hashlib.sha1(
+        "{}\n{}\n{}".format(client_key, timestamp, nonce).encode("utf-8")
+    ).hexdigest()
+    key = NONCE_CACHE_PREFIX + digest
+    now = time.time()
+
+    with _nonce_lock:
+        expires_at = _recent_nonces.get(key)
+        if expires_at is not None and expires_at > now:
+            return True
+
+    ttl = _nonce_ttl(timestamp, config["timestamp_lifetime"], now)
+    added = caches[config["cache_alias"]].add(key, 1, timeout=ttl)
+    with _nonce_lock:
+        _recent_nonces[key] = now + ttl
+        _recent_nonces.move_to_end(key)
+        while len(_recent_nonces) > config["lru_size"]:
+            _recent_nonces.popitem(last=False)
+    return not added
+
+
+def clear_nonces():
+    """forgets nonces seen in-process; meant for tests."""
+    with _nonce_lock:
+        _recent_nonces.clear()
+
+
+@functools.lru_cache(maxsize=1024)
+def _lti_secret(client_key, context_id):
+    # secret for client key and context, or None if not configured
+    if context_id in settings.LTI_SECRET_DICT:
+        return to_unicode(settings.LTI_SECRET_DICT[context_id])
+    if client_key == settings.CONSUMER_KEY:
+        return to_unicode(settings.LTI_SECRET)
+    return None
+
+
+@receiver(setting_changed)
+def _reset_on_setting_changed(sender, setting, **kwargs):
+    if setting in ("LTI_SECRET_DICT", "LTI_SECRET", "CONSUMER_KEY"):
+        _lti_secret.cache_clear()
+    elif setting == "LTI_NONCE_STORE":
+        clear_nonces()
+
 
 class LTIRequestValidator(RequestValidator):
     @property
@@ -25,6 +116,10 @@ class LTIRequestValidator(RequestValidator):
         secret = LTIRequestValidator.make_dummy_secret()
         return secret
 
+    @property
+    def timestamp_lifetime(self):
+        return nonce_store_config()["timestamp_lifetime"]
+
     def check_client_key(self, key):
         # redefine: any non-empty string is OK as a client key
         return len(key) > 0
@@ -53,6 +148,16 @@ class LTIRequestValidator(RequestValidator):
         request_token=None,
         access_token=None,
     ):
+        if not nonce_store_config()["enabled"]:
+            return True
+        if seen_nonce(client_key, timestamp, nonce):
+            log.warning(
+                "replayed lti request: client_key({}) timestamp({}) nonce({})".format(
+                    client_key, timestamp, nonce
+                )
+            )
+            metrics.incr("lti_nonce_replays")
+            return False
         return True
 
     def get_client_secret(self, client_key, request):
@@ -72,19 +177,11 @@ class LTIRequestValidator(RequestValidator):
             log.error('missing lti-param "context_id"; dummy.')
             return cls.make_dummy_secret()
 
-        try:
-            secret = to_unicode(settings.LTI_SECRET_DICT[context_id])
-        except KeyError:  # context_id not in LTI_SECRET_DICT
-            if client_key == settings.CONSUMER_KEY:
-                log.debug("----------------- lti consumer key FALLBACK")
-                return to_unicode(settings.LTI_SECRET)
-            else:  # oauth_consumer_key not a known value
-                log.error(
-                    "unknown client-key({}) in lti-params; dummy.".format(client_key)
-                )
-                return cls.make_dummy_secret()
-        else:  # all went well
-            return secret
+        secret = _lti_secret(client_key, context_id)
+        if secret is None:  # oauth_consumer_key not a known value
+            log.error("unknown client-key({}) in lti-params; dummy.".format(client_key))
+            return cls.make_dummy_secret()
+        return secret
 
 
 # TODO: for another example on how to use pylti, check validators in
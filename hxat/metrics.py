@@ -0,0 +1,137 @@
+"""
+process-local counters for hxat internals.
+
+Counters live in the memory of each worker process (gunicorn/daphne), so they
+are cheap to update from request code: a dict and a lock. Each counter is
+identified by a name and an optional set of labels, e.g.
+
+    metrics.incr("annostore_pool_hits", annostore="https://catchpy.org/annos")
+
+``snapshot()`` returns a json-friendly copy of all counters. Histograms
+(``observe()``) keep, per name and labels, the count of values in each
+bucket, plus their count and sum; ``prometheus()`` writes counters and
+histograms in the prometheus text format.
+"""
+
+import bisect
+import threading
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}  # key -> [bucket counts..., count, sum]
+
+# upper bounds, in secs, of histogram buckets; +Inf is implied
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _key(name, labels):
+    return (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+
+
+def incr(name, value=1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def get(name, **labels):
+    """value of counter `name` for the given labels; 0 if never incremented."""
+    with _lock:
+        return _counters.get(_key(name, labels), 0)
+
+
+def total(name):
+    """sum of counter `name` across all labels."""
+    with _lock:
+        return sum(v for (n, _), v in _counters.items() if n == name)
+
+
+def snapshot(prefix=""):
+    """returns {name: [{"labels": {...}, "value": n}, ...]} for counters in `prefix`."""
+    result = {}
+    with _lock:
+        items = list(_counters.items())
+    for (name, labels), value in sorted(items):
+        if name.startswith(prefix):
+            result.setdefault(name, []).append({"labels": dict(labels), "value": value})
+    return result
+
+
+def observe(name, value, **labels):
+    """adds `value` to histogram `name` for the given labels."""
+    key = _key(name, labels)
+    index = bisect.bisect_left(DEFAULT_BUCKETS, value)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [0] * (len(DEFAULT_BUCKETS) + 3)
+        histogram[index] += 1  # index len(DEFAULT_BUCKETS) is +Inf
+        histogram[-2] += 1
+        histogram[-1] += value
+
+
+def histograms(prefix=""):
+    """returns {name: [{"labels": {...}, "buckets": {le: n}, "count", "sum"}, ...]}."""
+    result = {}
+    with _lock:
+        items = [(k, list(v)) for k, v in _histograms.items()]
+    for (name, labels), histogram in sorted(items):
+        if not name.startswith(prefix):
+            continue
+        cumulative = 0
+        buckets = {}
+        for le, n in zip(DEFAULT_BUCKETS + ("+Inf",), histogram[:-2]):
+            cumulative += n
+            buckets[str(le)] = cumulative
+        result.setdefault(name, []).append(
+            {
+                "labels": dict(labels),
+                "buckets": buckets,
+                "count": histogram[-2],
+                "sum": histogram[-1],
+            }
+        )
+    return result
+
+
+def _prometheus_labels(labels, **more):
+    labels = dict(labels, **more)
+    if not labels:
+        return ""
+    return "{{{}}}".format(
+        ",".join(
+            '{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"'))
+            for k, v in sorted(labels.items())
+        )
+    )
+
+
+def prometheus():
+    """counters and histograms in the prometheus text exposition format."""
+    lines = []
+    for name, values in snapshot().items():
+        lines.append("# TYPE hxat_{} counter".format(name))
+        for v in values:
+            lines.append(
+                "hxat_{}{} {}".format(name, _prometheus_labels(v["labels"]), v["value"])
+            )
+    for name, values in histograms().items():
+        lines.append("# TYPE hxat_{} histogram".format(name))
+        for v in values:
+            for le, n in v["buckets"].items():
+                lines.append(
+                    "hxat_{}_bucket{} {}".format(
+                        name, _prometheus_labels(v["labels"], le=le), n
+                    )
+                )
+            labels = _prometheus_labels(v["labels"])
+            lines.append("hxat_{}_count{} {}".format(name, labels, v["count"]))
+            lines.append("hxat_{}_sum{} {}".format(name, labels, v["sum"]))
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    """clears all counters and histograms; meant for tests."""
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
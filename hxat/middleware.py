@@ -12,16 +12,20 @@ that particular URL.
 Note: Chrome, Safari, and IE ignore Allow-From, though they should still
 load the iframe.
 """
+
 import collections
+import functools
 import importlib
-import json
 import logging
+import time
 
 from django.conf import settings
-from django.core.exceptions import PermissionDenied
+from django.core.exceptions import MiddlewareNotUsed, PermissionDenied
+from django.db import connection
 from django.http import HttpResponse, HttpResponseBadRequest
 from django.shortcuts import render
 from hx_lti_initializer.views import PlatformError
+from hxat import metrics, timing
 from lti.contrib.django import DjangoToolProvider
 
 from .lti_validators import LTIRequestValidator
@@ -47,6 +51,46 @@ def ip_address(request):
     )
 
 
+# launch params read after the launch: by launch_lti, access_annotation_target,
+# annostore grade passback (_get_tool_provider, grade_queue) and the image store
+# backend. The params named by settings.LTI_* labels are kept as well.
+LTI_LAUNCH_PARAMS = (
+    "resource_link_id",
+    "user_id",
+    "roles",
+    "context_id",
+    "context_title",
+    "context_label",
+    "lis_person_sourcedid",
+    "lis_person_name_full",
+    "lis_outcome_service_url",
+    "lis_result_sourcedid",
+    "lis_course_offering_sourcedid",
+    "tool_consumer_instance_guid",
+    "oauth_consumer_key",
+    "custom_canvas_course_id",
+    "custom_hide_sidebar_instance",
+)
+
+
+def launch_params_whitelist():
+    """returns the launch params kept in the LTI session, or None to keep all."""
+    if not getattr(settings, "LTI_LAUNCH_PARAMS_PRUNE", True):
+        return None
+    return frozenset(
+        LTI_LAUNCH_PARAMS
+        + (
+            settings.LTI_USER_ID,
+            settings.LTI_COURSE_ID,
+            settings.LTI_COLLECTION_ID,
+            settings.LTI_OBJECT_ID,
+            settings.LTI_ROLES,
+            settings.LTI_UNIQUE_RESOURCE_ID,
+        )
+        + tuple(getattr(settings, "LTI_LAUNCH_PARAMS_EXTRA", []))
+    )
+
+
 class LTILaunchError(Exception):
     pass
 
@@ -104,7 +148,10 @@ class LTILaunchSession(object):
 
     def __setitem__(self, key, value):
         self.assert_valid()
-        self.session["LTI_LAUNCH"][self.resource_link_id][key] = value
+        launch = self.session["LTI_LAUNCH"][self.resource_link_id]
+        if key in launch and launch[key] == value:
+            return  # unchanged; don't write the session
+        launch[key] = value
         self.session.modified = True
 
     def __delitem__(self, key):
@@ -132,7 +179,69 @@ class LTILaunchSession(object):
         return repr(self.session["LTI_LAUNCH"][self.resource_link_id])
 
 
-class ContentSecurityPolicyMiddleware:
+@functools.lru_cache(maxsize=None)
+def lazy_session_store(SessionStore):
+    """returns a subclass of `SessionStore` that only hits the session backend when used.
+
+    - no exists() check: a missing session is found when it's loaded
+    - a new session is only created when its session_key is asked for, e.g. to
+      put it in a url as utm_source, or when it is saved
+    - `on_load`, if set, is called with the session data once it's loaded
+    """
+
+    class LazySessionStore(SessionStore):
+        def __init__(self, session_key=None):
+            super().__init__(session_key)
+            self.on_load = None
+            self.loads = 0
+
+        def load(self):
+            with timing.span("session"):
+                data = super().load()
+            self.loads += 1
+            if self.on_load is not None:
+                self.on_load(data)
+            return data
+
+        def save(self, must_create=False):
+            with timing.span("session_save"):
+                super().save(must_create)
+
+        def _get_session(self, no_load=False):
+            # same as base, but does not create a session key to check if loaded
+            self.accessed = True
+            try:
+                return self._session_cache
+            except AttributeError:
+                if self._session_key is None or no_load:
+                    self._session_cache = {}
+                else:
+                    self._session_cache = self.load()
+            return self._session_cache
+
+        _session = property(_get_session)
+
+        @property
+        def session_key(self):
+            self._get_session()  # drops the key, if session not found
+            if self._session_key is None:
+                self.create()
+            return self._session_key
+
+        def delete(self, session_key=None):
+            if session_key is None:
+                if self._session_key is None:
+                    return  # never created, nothing to delete
+                session_key = self._session_key
+            super().delete(session_key)
+
+    # session data is signed with the class qualname as salt; keep it, so other
+    # SessionStore instances (e.g. ws consumers) can read these sessions
+    LazySessionStore.__qualname__ = SessionStore.__qualname__
+    return LazySessionStore
+
+
+class ContentSecurityPolicyMiddleware(MiddlewareMixin):
     """
     Sets the Content-Security-Policy header to restrict webpages from being
     embedded on other domains. This is better supported and more flexible than X-Frame-Options.
@@ -141,26 +250,21 @@ class ContentSecurityPolicyMiddleware:
     """
 
     def __init__(self, get_response):
-        self.get_response = get_response
+        super().__init__(get_response)  # MiddlewareMixin also handles async views
         self.logger = logging.getLogger(__name__)
 
-    def __call__(self, request):
-        response = self.get_response(request)
+    def process_response(self, request, response):
         if "content-type" in response and response["content-type"].startswith(
             "text/html"
         ):
             self.logger.info(
-                "Inside {}s process_response: {}".format(
-                    self.__class__.__name__, request.path
-                )
+                "Inside %s process_response: %s", self.__class__.__name__, request.path
             )
             domain = getattr(settings, "CONTENT_SECURITY_POLICY_DOMAIN", None)
             if domain:
                 policy = "frame-ancestors 'self' {domain}".format(domain=domain)
                 response["Content-Security-Policy"] = policy
-                self.logger.info(
-                    "Content-Security-Policy header set to: {}".format(policy)
-                )
+                self.logger.info("Content-Security-Policy header set to: %s", policy)
             else:
                 self.logger.warning("Content-Security-Policy header not set")
         return response
@@ -172,18 +276,23 @@ class CookielessSessionMiddleware(MiddlewareMixin):
     from  cookies (preferred, if available) or the request URL.
 
     This must be added to INSTALLED_APPS prior to other middleware that uses the session.
+
+    The session is not read, nor created, until used (see lazy_session_store()), so
+    requests that don't use the session don't hit the session backend. Session
+    loads and writes per view are counted in metrics "session_loads",
+    "session_writes" and "session_requests".
     """
 
     def __init__(self, get_response):
-        self.get_response = get_response
+        super().__init__(get_response)
         self.logger = logging.getLogger(__name__)
-        self.logger.debug("Starting session engine %s" % settings.SESSION_ENGINE)
+        self.logger.debug("Starting session engine %s", settings.SESSION_ENGINE)
         engine = importlib.import_module(settings.SESSION_ENGINE)
-        self.SessionStore = engine.SessionStore
+        self.SessionStore = lazy_session_store(engine.SessionStore)
 
     def process_request(self, request):
         self.logger.info(
-            "Inside %s process_request: %s" % (self.__class__.__name__, request.path)
+            "Inside %s process_request: %s", self.__class__.__name__, request.path
         )
 
         check_ip = False
@@ -191,34 +300,44 @@ class CookielessSessionMiddleware(MiddlewareMixin):
         session_key = request.COOKIES.get(settings.SESSION_COOKIE_NAME)
         if session_key is not None:
             self.logger.info(
-                "Session cookie '%s' returned key: %s"
-                % (settings.SESSION_COOKIE_NAME, session_key)
+                "Session cookie '%s' returned key: %s",
+                settings.SESSION_COOKIE_NAME,
+                session_key,
             )
         else:
             self.logger.info(
-                "Session cookie '%s' not found!" % settings.SESSION_COOKIE_NAME
+                "Session cookie '%s' not found!", settings.SESSION_COOKIE_NAME
             )
             session_key = request.GET.get("utm_source", None)
-            self.logger.info("Session get param returned key: %s" % session_key)
+            self.logger.info("Session get param returned key: %s", session_key)
             check_ip = True
 
         request.session = self.SessionStore(session_key)
-        if request.session.exists(session_key):
-            self.logger.info("Session exists")
-            self.logger.debug("Session data: %s" % dict(request.session.items()))
-        else:
-            self.logger.info("Session does not exist. Creating new session.")
-            request.session.create()
-            self.logger.info("Created new session: %s" % request.session.session_key)
+        if check_ip:
+            request.session.on_load = functools.partial(self._check_ip, request)
+
+    def process_response(self, request, response):
+        session = getattr(request, "session", None)
+        if isinstance(session, self.SessionStore):
+            match = getattr(request, "resolver_match", None)
+            view = match.view_name if match is not None else "-"
+            metrics.incr("session_requests", view=view)
+            if session.loads:
+                metrics.incr("session_loads", session.loads, view=view)
+            if session.modified:
+                metrics.incr("session_writes", view=view)
+        return response
 
-        logged_ip = request.session.get("LOGGED_IP", None)
-        if check_ip and logged_ip is not None:
+    def _check_ip(self, request, session_data):
+        logged_ip = session_data.get("LOGGED_IP", None)
+        if logged_ip is not None:
             self.logger.info("Checking IP address against session")
             request_ip = ip_address(request)
             if request_ip != logged_ip:
                 self.logger.warning(
-                    "IP address does not match IP logged in session: %s != %s. "
-                    % (request_ip, logged_ip)
+                    "IP address does not match IP logged in session: %s != %s. ",
+                    request_ip,
+                    logged_ip,
                 )
                 # NOTE: commenting these next few lines out because of confirmed reports from students
                 #       that their session was being invalidated, which was traced back to this. -abarrett 3/9/18
@@ -239,8 +358,9 @@ class MultiLTILaunchMiddleware(MiddlewareMixin):
     """
 
     def __init__(self, get_response):
-        self.get_response = get_response
+        super().__init__(get_response)
         self.logger = logging.getLogger(__name__)
+        self.validator = LTIRequestValidator()  # reads settings when validating
 
     def process_exception(self, request, exception):
         if isinstance(exception, LTILaunchError):
@@ -282,7 +402,7 @@ class MultiLTILaunchMiddleware(MiddlewareMixin):
 
     def process_request(self, request):
         self.logger.info(
-            "Inside %s process_request: %s" % (self.__class__.__name__, request.path)
+            "Inside %s process_request: %s", self.__class__.__name__, request.path
         )
         is_basic_lti_launch = (
             request.method == "POST"
@@ -302,12 +422,13 @@ class MultiLTILaunchMiddleware(MiddlewareMixin):
                     request, resource_link_id=request.POST.get("resource_link_id")
                 )
             except LTILaunchError as e:
-                self.logger.debug("LTILaunchError: {}".format(e))
-                for k, v in vars(request.session).items():
-                    self.logger.debug("*-*-*-*- SESSION[{}]: {}".format(k, v))
+                self.logger.debug("LTILaunchError: %s", e)
+                if self.logger.isEnabledFor(logging.DEBUG):
+                    for k, v in vars(request.session).items():
+                        self.logger.debug("*-*-*-*- SESSION[%s]: %s", k, v)
                 return HttpResponseBadRequest()
             except PlatformError as e:
-                self.logger.error("Platform Error - %s" % e)
+                self.logger.error("Platform Error - %s", e)
                 return render(
                     request,
                     "main/platform_error.html",
@@ -322,7 +443,7 @@ class MultiLTILaunchMiddleware(MiddlewareMixin):
                     status=403,
                 )
             except Exception as e:
-                self.logger.debug("Exception: {}".format(e))
+                self.logger.debug("Exception: %s", e)
                 # this potentially returns a 500:
                 raise
         elif is_lti_content_item_message:
@@ -334,22 +455,23 @@ class MultiLTILaunchMiddleware(MiddlewareMixin):
                 request, resource_link_id=request.GET.get("resource_link_id")
             )
 
-        return self.get_response(request)
+        # MiddlewareMixin calls get_response(), sync or async
+        return None
 
     def _validate_request(self, request):
         """
         Validates an LTI launch request.
         """
-        validator = LTIRequestValidator()
+        validator = self.validator
         tool_provider = DjangoToolProvider.from_django_request(request=request)
 
-        postparams = request.POST.dict()
-        self.logger.debug("request is secure: %s" % request.is_secure())
-        for key in postparams:
-            self.logger.debug("POST %s: %s" % (key, postparams.get(key)))
-        self.logger.debug("request abs url is %s" % request.build_absolute_uri())
-        for key in request.META:
-            self.logger.debug("META %s: %s" % (key, request.META.get(key)))
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("request is secure: %s", request.is_secure())
+            for key, value in request.POST.items():
+                self.logger.debug("POST %s: %s", key, value)
+            self.logger.debug("request abs url is %s", request.build_absolute_uri())
+            for key, value in request.META.items():
+                self.logger.debug("META %s: %s", key, value)
 
         self.logger.debug("about to check the signature")
         # NOTE: before validating the request, temporarily remove the
@@ -368,10 +490,11 @@ class MultiLTILaunchMiddleware(MiddlewareMixin):
         # oauthlib/oauth1/rfc5849/signature:base_string_uri()
         # -- could not force a query string in unit tests using django.test.Client
         qs = request.META.pop("QUERY_STRING", "")
-        self.logger.debug("removed query string temporarily: %s" % qs)
-        request_is_valid = tool_provider.is_valid_request(validator)
+        self.logger.debug("removed query string temporarily: %s", qs)
+        with timing.span("lti_validate"):
+            request_is_valid = tool_provider.is_valid_request(validator)
         request.META["QUERY_STRING"] = qs  # restore the query string
-        self.logger.debug("restored query string: %s" % request.META["QUERY_STRING"])
+        self.logger.debug("restored query string: %s", request.META["QUERY_STRING"])
 
         if not request_is_valid:
             self.logger.error("signature check failed")
@@ -394,7 +517,8 @@ class MultiLTILaunchMiddleware(MiddlewareMixin):
     def _update_session(self, request):
         """
         Updates the session with the current LTI launch request. There may be multiple LTI launches associated with a
-        single session. Each LTI launch is mapped to its POST parameters using the resource_link_id as the key.
+        single session. Each LTI launch is mapped to its POST parameters using the resource_link_id as the key;
+        only the POST parameters in launch_params_whitelist() are kept.
 
         Example:
 
@@ -411,7 +535,16 @@ class MultiLTILaunchMiddleware(MiddlewareMixin):
         """
         resource_link_id = request.POST.get("resource_link_id", None)
         postparams = request.POST.dict()
-        lti_params = dict(postparams)
+        whitelist = launch_params_whitelist()
+        if whitelist is None:
+            lti_params = dict(postparams)
+        else:
+            lti_params = {k: v for k, v in postparams.items() if k in whitelist}
+            if self.logger.isEnabledFor(logging.DEBUG):
+                self.logger.debug(
+                    "LTI launch params not kept in session: %s",
+                    sorted(set(postparams) - whitelist),
+                )
         lti_params.update(
             {
                 "roles": [
@@ -427,16 +560,23 @@ class MultiLTILaunchMiddleware(MiddlewareMixin):
             lti_launches = collections.OrderedDict()
             request.session["LTI_LAUNCH"] = lti_launches
 
+        launch = lti_launches.get(resource_link_id)
+        if launch is not None and launch.get("launch_params") == lti_params:
+            # same launch again; keep it, and what was saved with it, as is
+            self.logger.info(
+                "LTI launch session unchanged: resource_link_id=%s", resource_link_id
+            )
+            return
+
         max_launches = getattr(settings, "LTI_MAX_LAUNCHES", 10)
         self.logger.info(
-            "LTI launch sessions: %s [max=%s]" % (lti_launches.keys(), max_launches)
+            "LTI launch sessions: %s [max=%s]", list(lti_launches), max_launches
         )
-        if len(lti_launches.keys()) >= max_launches:
+        if launch is None and len(lti_launches.keys()) >= max_launches:
             self.logger.info("Invalidating oldest LTI launch (FIFO)")
-            invalidated_launch = lti_launches.popitem(last=False)
-            self.logger.info(
-                "LTI launch invalidated: %s", json.dumps(invalidated_launch, indent=4)
-            )
+            invalidated_id, invalidated_launch = lti_launches.popitem(last=False)
+            self.logger.info("LTI launch invalidated: %s", invalidated_id)
+            self.logger.debug("LTI launch invalidated: %s", invalidated_launch)
 
         lti_launches[resource_link_id] = {
             "launch_params": lti_params,
@@ -445,9 +585,9 @@ class MultiLTILaunchMiddleware(MiddlewareMixin):
         request.session.modified = True
         user_id = lti_params.get("user_id", None)
         self.logger.info(
-            "LTI launch session saved: resource_link_id={resource_link_id} user_id={user_id}".format(
-                user_id=user_id, resource_link_id=resource_link_id
-            )
+            "LTI launch session saved: resource_link_id=%s user_id=%s",
+            resource_link_id,
+            user_id,
         )
 
     def _log_ip_address(self, request):
@@ -455,8 +595,10 @@ class MultiLTILaunchMiddleware(MiddlewareMixin):
         Logs the IP address in the session.
         """
         logged_ip = ip_address(request)
+        if request.session.get("LOGGED_IP") == logged_ip:
+            return
         request.session["LOGGED_IP"] = logged_ip
-        self.logger.info("LTI launch IP address logged: %s" % logged_ip)
+        self.logger.info("LTI launch IP address logged: %s", logged_ip)
 
     def _set_current_session(self, request, resource_link_id=None):
         """
@@ -474,3 +616,84 @@ class ExceptionLoggingMiddleware(MiddlewareMixin):
             "Exception logged for request: %s message: %s"
             % (request.path, str(exception))
         )
+
+
+class RequestLogMiddleware(MiddlewareMixin):
+    """
+    Logs one record per request to logger "hxat.middleware.request", with the
+    view, status, duration, session loads/writes and, with TimingMiddleware, the
+    timing of each phase as structured fields (see
+    hxat.logutils.JsonFormatter). Enabled with settings.LOG_REQUESTS; put it
+    right after RequestIDMiddleware so the duration covers the other middleware.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, "LOG_REQUESTS", False):
+            raise MiddlewareNotUsed()
+        super().__init__(get_response)
+        self.logger = logging.getLogger("hxat.middleware.request")
+
+    def process_request(self, request):
+        request._log_started_at = time.perf_counter()
+
+    def process_response(self, request, response):
+        started_at = getattr(request, "_log_started_at", None)
+        if started_at is None or not self.logger.isEnabledFor(logging.INFO):
+            return response
+        duration_ms = (time.perf_counter() - started_at) * 1000
+        match = getattr(request, "resolver_match", None)
+        session = getattr(request, "session", None)
+        fields = {
+            "method": request.method,
+            "path": request.path,
+            "view": match.view_name if match is not None else "-",
+            "status": response.status_code,
+            "duration_ms": round(duration_ms, 2),
+            "session_loads": getattr(session, "loads", 0),
+            "session_modified": bool(getattr(session, "modified", False)),
+        }
+        timings = getattr(request, "timings", None)
+        if timings is not None:
+            fields["timings"] = timings.as_dict()
+        self.logger.info(
+            "%s %s %s %.2fms",
+            request.method,
+            request.path,
+            response.status_code,
+            duration_ms,
+            extra={"fields": fields},
+        )
+        return response
+
+
+class TimingMiddleware(MiddlewareMixin):
+    """
+    Collects the timing of request phases (session, lti_validate, db, catchpy,
+    passback, notify...), see hxat.timing. Put it right after
+    RequestLogMiddleware, before the session middleware, so session saves count.
+    Disabled with settings.REQUEST_TIMING["enabled"].
+    """
+
+    def __init__(self, get_response):
+        if not timing.timing_config()["enabled"]:
+            raise MiddlewareNotUsed()
+        super().__init__(get_response)
+        # connections made from now on get it from the connection_created signal
+        timing.install_db_wrapper(connection)
+
+    def process_request(self, request):
+        request.timings = timing.start()
+
+    def process_response(self, request, response):
+        timings = getattr(request, "timings", None)
+        if timings is None:
+            return response
+        match = getattr(request, "resolver_match", None)
+        view = match.view_name if match is not None else "-"
+        metrics.observe("request_seconds", timings.elapsed(), view=view)
+        for name, (count, secs) in timings.spans.items():
+            metrics.observe("request_phase_seconds", secs, view=view, phase=name)
+        if timing.timing_config()["header"]:
+            response["Server-Timing"] = timings.server_timing()
+        timing.stop()
+        return response
@@ -1,6 +1,8 @@
 import json
 from collections import OrderedDict
 
+import msgpack
+
 
 class JsonOrderedDictSerializer(object):
     """
@@ -12,3 +14,132 @@ class JsonOrderedDictSerializer(object):
 
     def loads(self, data):
         return json.loads(data.decode("latin-1"), object_pairs_hook=OrderedDict)
+
+
+# 0xc1 is never used by msgpack, and json sessions start with "{"
+COMPACT_MAGIC = b"\xc1"
+COMPACT_VERSION = 1
+
+# keys replaced by their index in the encoded session; per version, append only!
+# an lti launch repeats these for each resource_link_id in LTI_LAUNCH.
+INTERNED_KEYS = {
+    1: (
+        "LTI_LAUNCH",
+        "LOGGED_IP",
+        "launch_params",
+        "resource_link_id",
+        "hx_user_id",
+        "hx_user_name",
+        "hx_user_scope",
+        "hx_context_id",
+        "hx_lti_course_id",
+        "course_name",
+        "hx_collection_id",
+        "hx_object_id",
+        "hx_object_uri",
+        "hx_roles",
+        "is_staff",
+        "is_instructor",
+        "lti_message_type",
+        "lti_version",
+        "user_id",
+        "roles",
+        "context_id",
+        "context_title",
+        "context_label",
+        "lis_person_sourcedid",
+        "lis_person_name_full",
+        "lis_person_name_given",
+        "lis_person_name_family",
+        "lis_person_contact_email_primary",
+        "lis_outcome_service_url",
+        "lis_result_sourcedid",
+        "lis_course_offering_sourcedid",
+        "lis_course_section_sourcedid",
+        "resource_link_title",
+        "resource_link_description",
+        "tool_consumer_instance_guid",
+        "tool_consumer_instance_name",
+        "tool_consumer_info_product_family_code",
+        "tool_consumer_info_version",
+        "launch_presentation_return_url",
+        "launch_presentation_document_target",
+        "launch_presentation_locale",
+        "custom_canvas_course_id",
+        "custom_canvas_user_id",
+        "custom_collection_id",
+        "custom_object_id",
+        "custom_target_object_id",
+        "oauth_consumer_key",
+        "oauth_nonce",
+        "oauth_timestamp",
+        "oauth_version",
+        "oauth_signature_method",
+        "oauth_signature",
+        "oauth_callback",
+        "ext_roles",
+        "_auth_user_id",
+        "_auth_user_backend",
+        "_auth_user_hash",
+        "_csrftoken",
+    ),
+}
+_KEY_IDS = {
+    version: {key: i for i, key in enumerate(keys)}
+    for version, keys in INTERNED_KEYS.items()
+}
+
+
+def _json_key(key):
+    return next(iter(json.loads(json.dumps({key: None}))))
+
+
+class CompactSessionSerializer(object):
+    """
+    Session serializer that packs sessions with msgpack.
+
+    Well-known keys (lti launch params and hxat session keys) are encoded as small
+    ints, see INTERNED_KEYS; dicts are decoded as ordered dicts, like
+    JsonOrderedDictSerializer. Data starts with COMPACT_MAGIC and a version byte;
+    any other data is decoded as a JSON session, so existing sessions are still
+    read, and written back in the compact format.
+
+    Django compresses session data already (signing.dumps(compress=True)).
+    """
+
+    def dumps(self, obj):
+        key_ids = _KEY_IDS[COMPACT_VERSION]
+
+        def intern(obj):
+            # keys are made strings, as json does, so int keys are interned keys
+            if isinstance(obj, dict):
+                return {
+                    (key_ids.get(k, k) if type(k) is str else _json_key(k)): (
+                        intern(v) if isinstance(v, (dict, list, tuple)) else v
+                    )
+                    for k, v in obj.items()
+                }
+            return [intern(v) if isinstance(v, (dict, list, tuple)) else v for v in obj]
+
+        payload = msgpack.packb(intern(obj), use_bin_type=True)
+        return COMPACT_MAGIC + bytes([COMPACT_VERSION]) + payload
+
+    def loads(self, data):
+        if not data.startswith(COMPACT_MAGIC):
+            return JsonOrderedDictSerializer().loads(data)
+        version = data[1]
+        if version not in INTERNED_KEYS:
+            raise ValueError("unknown session format version({})".format(version))
+        keys = INTERNED_KEYS[version]
+
+        def ordered(pairs):
+            return OrderedDict(
+                [(keys[k] if type(k) is int else k, v) for k, v in pairs]
+            )
+
+        return msgpack.unpackb(
+            data[2:],
+            object_pairs_hook=ordered,
+            strict_map_key=False,
+            raw=False,
+        )
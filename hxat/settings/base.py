@@ -60,13 +60,16 @@ CSRF_FAILURE_VIEW = "hx_lti_initializer.views.csrf_failure"
 
 MIDDLEWARE = (
     "log_request_id.middleware.RequestIDMiddleware",
+    "hxat.middleware.RequestLogMiddleware",  # only if LOG_REQUESTS
+    "hxat.middleware.TimingMiddleware",
+    # static files are served before any session or csrf work
+    "whitenoise.middleware.WhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "hxat.middleware.CookielessSessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
-    "whitenoise.middleware.WhiteNoiseMiddleware",
     "hxat.middleware.ContentSecurityPolicyMiddleware",
     "hxat.middleware.MultiLTILaunchMiddleware",
     "hxat.middleware.ExceptionLoggingMiddleware",
@@ -143,6 +146,10 @@ _DEFAULT_LOG_LEVEL = os.environ.get("LOG_LEVEL", "DEBUG")
 _LOG_QUERIES = os.environ.get("LOG_QUERIES", False)
 _LOG_ROOT = os.environ.get("LOG_ROOT", "")
 _LOG_FILENAME = os.environ.get("LOG_FILENAME", "app.log")
+# "json" writes one json object per log record, see hxat.logutils
+_LOG_FORMAT = os.environ.get("LOG_FORMAT", "text").lower()
+# one log record per request, with timings, see hxat.middleware.RequestLogMiddleware
+LOG_REQUESTS = os.environ.get("LOG_REQUESTS", "false").lower() == "true"
 
 LOGGING = {
     "version": 1,
@@ -160,12 +167,15 @@ LOGGING = {
         "simple": {
             "format": "[%(request_id)s]:%(levelname)s\t%(name)s:%(lineno)s\t%(message)s",
         },
+        "json": {
+            "()": "hxat.logutils.JsonFormatter",
+        },
     },
     "handlers": {
         "console": {
             "class": "logging.StreamHandler",
             "filters": ["request_id"],
-            "formatter": "simple",
+            "formatter": "json" if _LOG_FORMAT == "json" else "simple",
             "level": "DEBUG",
             "stream": "ext://sys.stdout",
         },
@@ -174,7 +184,7 @@ LOGGING = {
             "level": _DEFAULT_LOG_LEVEL,
             "filename": os.path.join(_LOG_ROOT, _LOG_FILENAME),
             "filters": ["request_id"],
-            "formatter": "verbose",
+            "formatter": "json" if _LOG_FORMAT == "json" else "verbose",
         },
     },
     # This is the default logger for any apps or libraries that use the logger
@@ -260,6 +270,20 @@ LTI_ADMIN_ROLES = json.loads(
 )
 
 LTI_UNIQUE_RESOURCE_ID = "resource_link_id"
+# only the launch params hxat reads later are kept in the LTI session, see
+# hxat.middleware.LTI_LAUNCH_PARAMS; LTI_LAUNCH_PARAMS_EXTRA adds params to keep,
+# and LTI_LAUNCH_PARAMS_PRUNE=false keeps all of them.
+LTI_LAUNCH_PARAMS_PRUNE = (
+    os.environ.get("LTI_LAUNCH_PARAMS_PRUNE", "true").lower() == "true"
+)
+LTI_LAUNCH_PARAMS_EXTRA = json.loads(os.environ.get("LTI_LAUNCH_PARAMS_EXTRA", "[]"))
+
+# lti launch replay protection, see hxat.lti_validators
+LTI_NONCE_STORE = {
+    "enabled": os.environ.get("LTI_NONCE_CHECK", "true").lower() == "true",
+    "timestamp_lifetime": int(os.environ.get("LTI_TIMESTAMP_LIFETIME", 600)),
+}
+
 CONTENT_SECURITY_POLICY_DOMAIN = os.environ.get(
     "CONTENT_SECURITY_POLICY_DOMAIN",
     None,
@@ -314,6 +338,62 @@ ANNOTATION_PAGINATION_LIMIT_DEFAULT = os.environ.get("ANNOTATION_LIMIT_DEFAULT",
 ANNOTATION_TRANSCRIPT_LINK_DEFAULT = os.environ.get(
     "ANNOTATION_TRANSCRIPT_DEFAULT", None
 )
+# pooled keep-alive http sessions to annostores; see annostore/pool.py
+ANNOSTORE_HTTP_POOL = {
+    "pool_maxsize": int(os.environ.get("ANNOSTORE_POOL_MAXSIZE", 10)),
+    "pool_block": os.environ.get("ANNOSTORE_POOL_BLOCK", "false").lower() == "true",
+    "keep_alive": os.environ.get("ANNOSTORE_KEEP_ALIVE", "true").lower() == "true",
+    "max_retries": int(os.environ.get("ANNOSTORE_MAX_RETRIES", 2)),
+}
+# timeouts in seconds per annostore operation; "default" for those not listed
+ANNOSTORE_TIMEOUTS = {
+    "default": float(os.environ.get("ANNOSTORE_TIMEOUT", 5.0)),
+    "search": float(os.environ.get("ANNOSTORE_SEARCH_TIMEOUT", 10.0)),
+}
+# stream search results from annostore as is, instead of parse and re-encode
+ANNOSTORE_PASSTHROUGH = (
+    os.environ.get("ANNOSTORE_PASSTHROUGH", "false").lower() == "true"
+)
+# serve annostore api with the async view; only pays off when running under asgi
+ANNOSTORE_ASYNC = os.environ.get("ANNOSTORE_ASYNC", "false").lower() == "true"
+# seconds to cache annostore search results; 0 disables, see annostore/search_cache.py
+ANNOSTORE_SEARCH_CACHE_TTL = int(os.environ.get("ANNOSTORE_SEARCH_CACHE_TTL", 0))
+ANNOSTORE_SEARCH_CACHE_ALIAS = "default"
+# secs to keep searches to serve when annostore is unavailable; 0 disables
+ANNOSTORE_SEARCH_CACHE_STALE_TTL = int(
+    os.environ.get("ANNOSTORE_SEARCH_CACHE_STALE_TTL", 3600)
+)
+# circuit breaker per annostore; see annostore/breaker.py
+ANNOSTORE_BREAKER = {
+    "enabled": os.environ.get("ANNOSTORE_BREAKER", "false").lower() == "true",
+    "error_rate": float(os.environ.get("ANNOSTORE_BREAKER_ERROR_RATE", 0.5)),
+    "open_secs": int(os.environ.get("ANNOSTORE_BREAKER_OPEN_SECS", 30)),
+    "adaptive_timeout": (
+        os.environ.get("ANNOSTORE_ADAPTIVE_TIMEOUT", "true").lower() == "true"
+    ),
+}
+# cache of annostore config per assignment, in secs; see annostore/asconfig.py
+ANNOSTORE_ASCONFIG_CACHE = {
+    "local_ttl": int(os.environ.get("ANNOSTORE_ASCONFIG_LOCAL_TTL", 10)),
+    "shared_ttl": int(os.environ.get("ANNOSTORE_ASCONFIG_SHARED_TTL", 300)),
+}
+# send lti grades from a background queue; see annostore/grade_queue.py
+GRADE_PASSBACK_QUEUE = {
+    "enabled": os.environ.get("GRADE_PASSBACK_QUEUE", "false").lower() == "true",
+    "concurrency": int(os.environ.get("GRADE_PASSBACK_CONCURRENCY", 4)),
+    "max_attempts": int(os.environ.get("GRADE_PASSBACK_MAX_ATTEMPTS", 5)),
+}
+# bulk annotation writes; see Annostore.bulk()
+ANNOSTORE_BULK = {
+    "max_items": int(os.environ.get("ANNOSTORE_BULK_MAX_ITEMS", 100)),
+    "concurrency": int(os.environ.get("ANNOSTORE_BULK_CONCURRENCY", 4)),
+}
+# skip grade passback if lms already accepted it; see annostore/grade_ledger.py
+GRADE_PASSBACK_LEDGER = (
+    os.environ.get("GRADE_PASSBACK_LEDGER", "true").lower() == "true"
+)
+# max number of jwt tokens to annostore kept for reuse; 0 disables
+RETRIEVE_TOKEN_CACHE_SIZE = int(os.environ.get("RETRIEVE_TOKEN_CACHE_SIZE", 1024))
 ANNOTATION_HTTPS_ONLY = os.environ.get("HTTPS_ONLY", "False").lower() == "true"
 ANNOTATION_LOGGER_URL = os.environ.get("ANNOTATION_LOGGER_URL", "")
 ACCESSIBILITY = os.environ.get("ACCESSIBILITY", "True").lower() == "true"
@@ -342,7 +422,12 @@ if ANNOTATION_HTTPS_ONLY:
 # Instead of using the default JSON serializer, we need to modify it slightly so that
 # session dicts stored in JSON are de-serialized with their order preserved. This functionality
 # is used in particular by the MultiLTILaunchMiddleware.
-SESSION_SERIALIZER = "hxat.serializers.JsonOrderedDictSerializer"
+# CompactSessionSerializer packs sessions with msgpack, still reading JSON sessions;
+# set SESSION_SERIALIZER_COMPACT=false to write JSON sessions.
+if os.environ.get("SESSION_SERIALIZER_COMPACT", "true").lower() == "true":
+    SESSION_SERIALIZER = "hxat.serializers.CompactSessionSerializer"
+else:
+    SESSION_SERIALIZER = "hxat.serializers.JsonOrderedDictSerializer"
 
 # Organization-specific configuration
 # Try to minimize this as much as possible in favor of configuration
@@ -363,6 +448,31 @@ CHANNEL_LAYERS = {
         },
     }
 }
+# django cache; set CACHE_REDIS_URL to share it across workers
+CACHE_REDIS_URL = os.environ.get("CACHE_REDIS_URL", None)
+if CACHE_REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": CACHE_REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+# request phase timing, see hxat.timing; the Server-Timing header is opt-in
+REQUEST_TIMING = {
+    "enabled": os.environ.get("REQUEST_TIMING", "true").lower() == "true",
+    "header": os.environ.get("REQUEST_TIMING_HEADER", "false").lower() == "true",
+}
+
+# token to read ops endpoints (/ops/...) without a staff login
+HXAT_OPS_TOKEN = os.environ.get("HXAT_OPS_TOKEN", None)
+
 HXAT_NOTIFY_ERRORLOG = os.environ.get("HXAT_NOTIFY_ERRORLOG", "false").lower() == "true"
 
 # time-to-live for ws auth
@@ -0,0 +1,128 @@
+"""
+request-scoped phase timing.
+
+TimingMiddleware binds a Timings collector to the request being served (a
+contextvar, so it follows the request into sync_to_async and async views);
+code in between adds named spans to it:
+
+    with timing.span("catchpy"):
+        response = session.request(...)
+
+Spans with the same name add up, e.g. "db" is the count and time of all
+queries of the request (see db_wrapper). Outside of a request, span() does
+nothing. At the end of the request, spans go to:
+
+    - the Server-Timing header, if settings.REQUEST_TIMING["header"]
+    - the request log record, see hxat.middleware.RequestLogMiddleware
+    - histograms "request_seconds" and "request_phase_seconds", per view
+      (hxat.metrics), served in prometheus format by /ops/metrics
+"""
+
+import collections
+import contextlib
+import contextvars
+import time
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+TIMING_DEFAULTS = {
+    "enabled": True,
+    "header": False,  # Server-Timing header shows internals to browsers
+}
+
+_current = contextvars.ContextVar("hxat_timings", default=None)
+
+
+def timing_config():
+    config = dict(TIMING_DEFAULTS)
+    config.update(getattr(settings, "REQUEST_TIMING", {}))
+    return config
+
+
+class Timings(object):
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans = collections.OrderedDict()  # name -> [count, secs]
+
+    def add(self, name, secs, count=1):
+        span = self.spans.get(name)
+        if span is None:
+            self.spans[name] = [count, secs]
+        else:
+            span[0] += count
+            span[1] += secs
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def as_dict(self):
+        """{name: {"count": n, "ms": total}} per span, plus "total" ms."""
+        result = {
+            name: {"count": count, "ms": round(secs * 1000, 2)}
+            for name, (count, secs) in self.spans.items()
+        }
+        result["total"] = {"count": 1, "ms": round(self.elapsed() * 1000, 2)}
+        return result
+
+    def server_timing(self):
+        """value for the Server-Timing header."""
+        metrics = [
+            '{};desc="{}";dur={:.2f}'.format(name, count, secs * 1000)
+            for name, (count, secs) in self.spans.items()
+        ]
+        metrics.append("total;dur={:.2f}".format(self.elapsed() * 1000))
+        return ", ".join(metrics)
+
+
+def current():
+    """Timings of the request being served, or None."""
+    return _current.get()
+
+
+def start():
+    """binds a new Timings to the current context and returns it."""
+    timings = Timings()
+    _current.set(timings)
+    return timings
+
+
+def stop():
+    # not a token reset: async middleware may run start() in another context
+    _current.set(None)
+
+
+@contextlib.contextmanager
+def span(name):
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - started)
+
+
+def db_wrapper(execute, sql, params, many, context):
+    """connection.execute_wrapper that counts queries as span "db"."""
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.add("db", time.perf_counter() - started)
+
+
+def install_db_wrapper(connection):
+    if db_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(db_wrapper)
+
+
+@receiver(connection_created)
+def _install_on_connection_created(sender, connection, **kwargs):
+    install_db_wrapper(connection)
@@ -2,6 +2,7 @@ from django.contrib import admin
 from django.urls import include, path
 from django.views.generic import TemplateView
 from hx_lti_initializer.views import tool_config
+from hxat.views import ops_metrics, ops_stats
 
 admin.autodiscover()
 
@@ -43,4 +44,6 @@ urlpatterns = [
     ),
     path("lti/config", tool_config, name="tool_config"),
     path("notification/", include("notification.urls")),
+    path("ops/stats", ops_stats, name="ops_stats"),
+    path("ops/metrics", ops_metrics, name="ops_metrics"),
 ]
@@ -0,0 +1,56 @@
+"""
+ops endpoints: process-local stats for monitoring.
+
+Counters are per worker process, so each call reports on the process that
+happened to serve it. Access requires a staff login or the
+settings.HXAT_OPS_TOKEN in the authorization header, as "token <ops_token>".
+"""
+
+import functools
+import hmac
+
+from annostore import breaker, grade_ledger, pool, search_cache
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+from django.views.decorators.http import require_http_methods
+from hxat import metrics
+
+
+def ops_access_required(view_func):
+    @functools.wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        ops_token = getattr(settings, "HXAT_OPS_TOKEN", None)
+        auth = request.META.get("HTTP_AUTHORIZATION", "")
+        has_token = bool(ops_token) and hmac.compare_digest(
+            auth.encode("utf-8"), "token {}".format(ops_token).encode("utf-8")
+        )
+        user = getattr(request, "user", None)
+        if has_token or (user is not None and user.is_staff):
+            return view_func(request, *args, **kwargs)
+        return JsonResponse({"error": "forbidden"}, status=403)
+
+    return wrapper
+
+
+@require_http_methods(["GET"])
+@ops_access_required
+def ops_stats(request):
+    return JsonResponse(
+        {
+            "annostore_pool": pool.stats(),
+            "annostore_breakers": breaker.stats(),
+            "annostore_search_cache": search_cache.stats(),
+            "grade_ledger": grade_ledger.stats(),
+            "metrics": metrics.snapshot(),
+            "histograms": metrics.histograms(),
+        }
+    )
+
+
+@require_http_methods(["GET"])
+@ops_access_required
+def ops_metrics(request):
+    """counters and histograms in the prometheus text format."""
+    return HttpResponse(
+        metrics.prometheus(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
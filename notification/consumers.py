@@ -9,6 +9,8 @@ from channels.exceptions import DenyConnection
 from channels.generic.websocket import WebsocketConsumer
 from django.conf import settings
 
+logger = logging.getLogger(__name__)
+
 
 class NotificationSyncConsumer(WebsocketConsumer):
 
@@ -18,12 +20,10 @@ class NotificationSyncConsumer(WebsocketConsumer):
         if parsed_query:
             session_id = parsed_query.get(b"utm_source", [b""])[0].decode()
             resource_link_id = parsed_query.get(b"resource_link_id", [b""])[0].decode()
-            logging.getLogger(__name__).info(
-                "CONSUMER: rid({}) sid({})".format(resource_link_id, session_id)
-            )
+            logger.info("CONSUMER: rid(%s) sid(%s)", resource_link_id, session_id)
             return (session_id, resource_link_id)
         else:
-            logging.getLogger(__name__).error("CONSUMER: missing querystring")
+            logger.error("CONSUMER: missing querystring")
             return (None, None)
 
     def lti_launch_valid(self, lti_launch, context, collection, target):
@@ -38,32 +38,30 @@ class NotificationSyncConsumer(WebsocketConsumer):
             clean_collection_id = pat.sub("-", lti_launch["hx_collection_id"])
             clean_target_id = str(lti_launch["hx_object_id"])
         except ValueError as e:
-            logging.getLogger(__name__).error(
-                "CONSUMER: missing from lti_launch: {}".format(e)
-            )
+            logger.error("CONSUMER: missing from lti_launch: {}".format(e))
         else:
             if clean_context_id == context:
                 if clean_collection_id == collection:
                     if clean_target_id == target:
                         # AUTHENTICATED!
-                        logging.getLogger(__name__).info(
+                        logger.info(
                             "CONSUMER AUTHENTICATED AUTHENTICATED AUTHENTICATED AUTHENTICATED"
                         )
                         return True
                     else:
-                        logging.getLogger(__name__).error(
+                        logger.error(
                             "CONSUMER: unknown target-object-id({}|{})".format(
                                 target, clean_target_id
                             )
                         )
                 else:
-                    logging.getLogger(__name__).error(
+                    logger.error(
                         "CONSUMER: unknown collection-id({}|{})".format(
                             collection, clean_collection_id
                         )
                     )
             else:
-                logging.getLogger(__name__).error(
+                logger.error(
                     "CONSUMER: unknown context-id({}|{})".format(
                         context, clean_context_id
                     )
@@ -72,10 +70,9 @@ class NotificationSyncConsumer(WebsocketConsumer):
         return False
 
     def connect(self):
-        for key in self.scope.keys():
-            logging.getLogger(__name__).debug(
-                "CONSUMER SCOPE[{}] = {}".format(key, self.scope[key])
-            )
+        if logger.isEnabledFor(logging.DEBUG):
+            for key in self.scope.keys():
+                logger.debug("CONSUMER SCOPE[%s] = %s", key, self.scope[key])
 
         context_id = self.scope["url_route"]["kwargs"]["contextid"]
         collection_id = self.scope["url_route"]["kwargs"]["collectionid"]
@@ -94,7 +91,7 @@ class NotificationSyncConsumer(WebsocketConsumer):
         )
         session_id = sessionid_cookie if sessionid_cookie else sessionid_qs
         if not session_id:
-            logging.getLogger(__name__).error("CONSUMER 403: missing session_id")
+            logger.error("CONSUMER 403: missing session_id")
             # disconnect
             raise DenyConnection()
 
@@ -105,13 +102,11 @@ class NotificationSyncConsumer(WebsocketConsumer):
         if exists:
             multi_launch = SessionStore(session_id).get("LTI_LAUNCH", {})
             if not multi_launch:
-                logging.getLogger(__name__).warning("CONSUMER 403: lti_launch empty")
+                logger.warning("CONSUMER 403: lti_launch empty")
                 # disconnect
                 raise DenyConnection()
         else:
-            logging.getLogger(__name__).error(
-                "CONSUMER 403: session({}) not found".format(session_id)
-            )
+            logger.error("CONSUMER 403: session({}) not found".format(session_id))
             # disconnect
             raise DenyConnection()
 
@@ -119,7 +114,7 @@ class NotificationSyncConsumer(WebsocketConsumer):
         if multi_launch and resource_link_id:
             lti_launch = multi_launch.get(resource_link_id, {})
             if not lti_launch:
-                logging.getLogger(__name__).error(
+                logger.error(
                     "CONSUMER 403: resource_link_id({}) not found".format(
                         resource_link_id
                     )
@@ -127,10 +122,11 @@ class NotificationSyncConsumer(WebsocketConsumer):
                 # disconnect
                 raise DenyConnection()
             else:
-                for key in lti_launch:
-                    logging.getLogger(__name__).debug(
-                        "CONSUMER LTI_LAUNCH[{}]: {}".format(key, lti_launch[key])
-                    )
+                if logger.isEnabledFor(logging.DEBUG):
+                    for key in lti_launch:
+                        logger.debug(
+                            "CONSUMER LTI_LAUNCH[%s]: %s", key, lti_launch[key]
+                        )
                 self.scope["hx_user_id"] = lti_launch.get("hx_user_id", "anonymous")
 
                 if self.lti_launch_valid(
@@ -143,48 +139,37 @@ class NotificationSyncConsumer(WebsocketConsumer):
                         self.group_name, self.scope["hx_user_id"]
                     )
 
-                    logging.getLogger(__name__).debug(
-                        "{}|channel_name({}), context({}), collection({}), object({}), user({})".format(
-                            self.wsid,
-                            self.channel_name,
-                            context_id,
-                            collection_id,
-                            target_id,
-                            self.scope["hx_user_id"],
-                        )
+                    logger.debug(
+                        "%s|channel_name(%s), context(%s), collection(%s), object(%s), user(%s)",
+                        self.wsid,
+                        self.channel_name,
+                        context_id,
+                        collection_id,
+                        target_id,
+                        self.scope["hx_user_id"],
                     )
 
                     # join room group
                     async_to_sync(self.channel_layer.group_add)(
                         self.group_name, self.channel_name
                     )
-                    logging.getLogger(__name__).info(
-                        "{}|added group to channel({})".format(
-                            self.wsid, self.channel_name
-                        )
+                    logger.info(
+                        "%s|added group to channel(%s)", self.wsid, self.channel_name
                     )
 
                     self.accept()
 
-                    logging.getLogger(__name__).info(
-                        "{}|CONNECTION ACCEPTED".format(self.wsid)
-                    )
+                    logger.info("%s|CONNECTION ACCEPTED", self.wsid)
                 else:
-                    logging.getLogger(__name__).error(
-                        "CONSUMER 403: LTI_LAUNCH not valid"
-                    )
+                    logger.error("CONSUMER 403: LTI_LAUNCH not valid")
                     # disconnect
                     raise DenyConnection()
 
         else:  # no lti_launch or resource_link_id
             if not resource_link_id:
-                logging.getLogger(__name__).error(
-                    "CONSUMER 403: missing resource_link_id in querystring"
-                )
+                logger.error("CONSUMER 403: missing resource_link_id in querystring")
             elif not multi_launch:
-                logging.getLogger(__name__).error(
-                    "CONSUMER 403: multi_launch not found in session"
-                )
+                logger.error("CONSUMER 403: multi_launch not found in session")
             # disconnect, return 403
             raise DenyConnection()
 
@@ -192,9 +177,7 @@ class NotificationSyncConsumer(WebsocketConsumer):
         text_data_json = json.loads(text_data)
         message = text_data_json["message"]
 
-        logging.getLogger(__name__).debug(
-            "{}|WSRECEIVE[{}]".format(self.wsid, text_data_json.keys())
-        )
+        logger.debug("%s|WSRECEIVE[%s]", self.wsid, text_data_json.keys())
 
         # send message to room group
         # async_to_sync(self.channel_layer.group_send)(
@@ -207,9 +190,7 @@ class NotificationSyncConsumer(WebsocketConsumer):
 
     def disconnect(self, close_code):
         # leave room group
-        logging.getLogger(__name__).debug(
-            "{}|DISCONNECT[{}]".format(self.wsid, close_code)
-        )
+        logger.debug("%s|DISCONNECT[%s]", self.wsid, close_code)
         async_to_sync(self.channel_layer.group_discard)(
             self.group_name, self.channel_name
         )
@@ -223,3 +204,8 @@ class NotificationSyncConsumer(WebsocketConsumer):
         self.send(
             text_data=json.dumps({"type": action, "message": "{}".format(message)})
         )
+
+    def annotation_notification_batch(self, event):
+        """receives all msgs from a bulk write, in one group msg."""
+        for msg in event["messages"]:
+            self.annotation_notification(msg)
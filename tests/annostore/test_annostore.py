@@ -594,7 +594,8 @@ def test_api_grade_me(
         )
     )
     assert response.status_code == 200
-    assert len(responses.calls) == 3  # 2 grade_passback, 1 search
+    # search sends the grade; grade_me finds it in the ledger and skips it
+    assert len(responses.calls) == 2  # 1 grade_passback, 1 search
     resp_content = json.loads(response.content)
     assert resp_content["grade_request_sent"] is True
 
@@ -0,0 +1,169 @@
+import asyncio
+import json
+
+import annostore.views as annostore_views
+import httpx
+import pytest
+import responses
+from annostore import pool
+from annostore.store_backend import AsyncCatchpyBackend
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.test import Client, RequestFactory
+from django.urls import reverse
+from hx_lti_initializer.models import LTIResourceLinkConfig
+from hxat.middleware import CookielessSessionMiddleware, MultiLTILaunchMiddleware
+
+
+@pytest.fixture
+def catchpy_mock(monkeypatch):
+    """async clients to annostore served by a mock transport."""
+    calls = []
+    answers = {}
+
+    def handler(request):
+        calls.append(request)
+        return answers[request.method]
+
+    def make_client(base_url):
+        return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    pool.close_all()
+    monkeypatch.setattr(pool, "_make_async_client", make_client)
+    yield calls, answers
+    pool.close_all()
+
+
+def launch(client, launch_params, assignment_target):
+    resource_link_id = launch_params["resource_link_id"]
+    LTIResourceLinkConfig.objects.create(
+        resource_link_id=resource_link_id,
+        assignment_target=assignment_target,
+    )
+    response = client.post(reverse("hx_lti_initializer:launch_lti"), data=launch_params)
+    assert response.status_code == 302
+    response = client.get(response.url)
+    assert response.status_code == 200
+
+
+def through_middleware(request):
+    for mware in [
+        SessionMiddleware,
+        CookielessSessionMiddleware,
+        AuthenticationMiddleware,
+        MultiLTILaunchMiddleware,
+    ]:
+        m = mware(get_response=lambda request: request)
+        m.process_request(request)
+    return request
+
+
+@responses.activate
+@pytest.mark.django_db
+def test_async_search_with_grade(
+    catchpy_mock,
+    course_user_lti_launch_params_with_grade,
+    assignment_target_factory,
+    webannotation_annotation_factory,
+    catchpy_search_result_shell,
+    make_lti_replaceResultResponse,
+):
+    calls, answers = catchpy_mock
+    course, user, launch_params = course_user_lti_launch_params_with_grade
+    assignment_target = assignment_target_factory(course)
+    client = Client(enforce_csrf_checks=False)
+    launch(client, launch_params, assignment_target)
+
+    search_result = catchpy_search_result_shell
+    search_result["total"] = 1
+    search_result["size"] = 1
+    search_result["rows"].append(webannotation_annotation_factory(user))
+    answers["GET"] = httpx.Response(200, json=search_result)
+    responses.add(
+        responses.POST,
+        launch_params["lis_outcome_service_url"],
+        body=make_lti_replaceResultResponse,
+        content_type="application/xml",
+        status=200,
+    )
+
+    request = through_middleware(
+        RequestFactory().get(
+            reverse("annotation_store:api_root_search"),
+            data={
+                "context_id": course.course_id,
+                "userid": user.anon_id,
+                "resource_link_id": launch_params["resource_link_id"],
+                "utm_source": client.session.session_key,
+            },
+        )
+    )
+    response = async_to_sync(annostore_views.api_root_async)(request)
+
+    assert response.status_code == 200
+    assert json.loads(response.content) == search_result
+    assert len(calls) == 1
+    assert calls[0].url.params["context_id"] == course.course_id
+    assert calls[0].headers["authorization"].startswith("token ")
+    assert len(responses.calls) == 1  # grade passback
+
+
+@pytest.mark.django_db
+def test_async_create_notifies(
+    catchpy_mock,
+    course_user_lti_launch_params,
+    assignment_target_factory,
+    webannotation_annotation_factory,
+):
+    calls, answers = catchpy_mock
+    course, user, launch_params = course_user_lti_launch_params
+    assignment_target = assignment_target_factory(course)
+    assignment = assignment_target.assignment
+    client = Client(enforce_csrf_checks=False)
+    launch(client, launch_params, assignment_target)
+
+    webann = webannotation_annotation_factory(user)
+    webann["creator"]["id"] = user.anon_id
+    webann["platform"]["collection_id"] = str(assignment.assignment_id)
+    webann["platform"]["context_id"] = str(course.course_id)
+    answers["POST"] = httpx.Response(200, json=webann)
+
+    request = through_middleware(
+        RequestFactory().post(
+            "{}?resource_link_id={}&utm_source={}".format(
+                reverse("annotation_store:api_root", args=[webann["id"]]),
+                launch_params["resource_link_id"],
+                client.session.session_key,
+            ),
+            data=webann,
+            content_type="application/json",
+        )
+    )
+
+    async def create_and_listen():
+        annostore = await annostore_views.AnnostoreFactory.aget_instance(request)
+        assert isinstance(annostore, AsyncCatchpyBackend)
+        channel_layer = get_channel_layer()
+        channel = await channel_layer.new_channel()
+        await channel_layer.group_add(annostore._notification_group(), channel)
+
+        response = await annostore_views.api_root_async(
+            request, annotation_id=webann["id"]
+        )
+        message = await asyncio.wait_for(channel_layer.receive(channel), timeout=1)
+        return response, message
+
+    response, message = async_to_sync(create_and_listen)()
+    assert response.status_code == 200
+    assert json.loads(response.content) == webann
+    assert calls[0].content == request.body
+    assert message["action"] == "annotation_created"
+    assert message["message"]["id"] == webann["id"]
+
+
+def test_async_method_not_allowed():
+    request = RequestFactory().patch(reverse("annotation_store:api_root_search"))
+    response = async_to_sync(annostore_views.api_root_async)(request)
+    assert response.status_code == 405
@@ -0,0 +1,135 @@
+import asyncio
+import json
+import re
+
+import pytest
+import responses
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.test import Client
+from django.urls import reverse
+from hx_lti_initializer.models import LTIResourceLinkConfig
+
+
+@responses.activate
+@pytest.mark.django_db
+def test_api_bulk(
+    lti_path,
+    course_user_lti_launch_params_with_grade,
+    assignment_target_factory,
+    webannotation_annotation_factory,
+    make_lti_replaceResultResponse,
+):
+    course, user, launch_params = course_user_lti_launch_params_with_grade
+    assignment_target = assignment_target_factory(course)
+    assignment = assignment_target.assignment
+    target_object = assignment_target.target_object
+    resource_link_id = launch_params["resource_link_id"]
+    LTIResourceLinkConfig.objects.create(
+        resource_link_id=resource_link_id,
+        assignment_target=assignment_target,
+    )
+    client = Client(enforce_csrf_checks=False)
+    response = client.post(lti_path, data=launch_params)
+    assert response.status_code == 302
+    response = client.get(response.url)
+    assert response.status_code == 200
+
+    items = []
+    for action in ["create", "create", "update", "create"]:
+        webann = webannotation_annotation_factory(user)
+        webann["creator"]["id"] = user.anon_id
+        webann["platform"]["collection_id"] = str(assignment.assignment_id)
+        webann["platform"]["context_id"] = str(course.course_id)
+        webann["platform"]["target_source_id"] = str(target_object.pk)
+        items.append({"action": action, "id": webann["id"], "annotation": webann})
+        responses.add(
+            responses.PUT if action == "update" else responses.POST,
+            "{}/{}".format(assignment.annotation_database_url, webann["id"]),
+            json=webann,
+            status=200,
+        )
+    items[-1]["annotation"]["platform"]["context_id"] = "another-course"
+    items.append({"action": "delete", "id": items[0]["id"]})
+    responses.add(
+        responses.DELETE,
+        "{}/{}".format(assignment.annotation_database_url, items[0]["id"]),
+        json={"status": 404, "payload": ["not found"]},
+        status=404,
+    )
+    items.append({"action": "transfer", "id": items[0]["id"]})
+    responses.add(
+        responses.POST,
+        launch_params["lis_outcome_service_url"],
+        body=make_lti_replaceResultResponse,
+        content_type="application/xml",
+        status=200,
+    )
+
+    channel_layer = get_channel_layer()
+    channel = async_to_sync(channel_layer.new_channel)()
+    group = "{}--{}--{}".format(
+        re.sub("[^a-zA-Z0-9-.]", "-", course.course_id),
+        assignment.assignment_id,
+        target_object.pk,
+    )
+    async_to_sync(channel_layer.group_add)(group, channel)
+
+    response = client.post(
+        "{}?resource_link_id={}".format(
+            reverse("annotation_store:api_bulk"), resource_link_id
+        ),
+        data=items,
+        content_type="application/json",
+    )
+    assert response.status_code == 200
+    result = json.loads(response.content)
+    assert result["total"] == 6
+    assert result["succeeded"] == 3
+    assert [r["status"] for r in result["results"]] == [200, 200, 200, 400, 404, 400]
+    assert [r["index"] for r in result["results"]] == list(range(6))
+    assert result["results"][0]["annotation"]["id"] == items[0]["id"]
+
+    # 4 requests to annostore, 1 grade passback for all creates
+    assert len(responses.calls) == 5
+
+    # one notification for all annotations written
+    message = async_to_sync(asyncio.wait_for)(
+        channel_layer.receive(channel), timeout=1
+    )
+    assert message["type"] == "annotation_notification_batch"
+    assert [m["action"] for m in message["messages"]] == [
+        "annotation_created",
+        "annotation_created",
+        "annotation_updated",
+    ]
+
+
+@pytest.mark.django_db
+def test_api_bulk_over_max_items(
+    settings,
+    lti_path,
+    course_user_lti_launch_params,
+    assignment_target_factory,
+):
+    settings.ANNOSTORE_BULK = {"max_items": 1}
+    course, user, launch_params = course_user_lti_launch_params
+    assignment_target = assignment_target_factory(course)
+    resource_link_id = launch_params["resource_link_id"]
+    LTIResourceLinkConfig.objects.create(
+        resource_link_id=resource_link_id,
+        assignment_target=assignment_target,
+    )
+    client = Client(enforce_csrf_checks=False)
+    response = client.post(lti_path, data=launch_params)
+    response = client.get(response.url)
+    assert response.status_code == 200
+
+    response = client.post(
+        "{}?resource_link_id={}".format(
+            reverse("annotation_store:api_bulk"), resource_link_id
+        ),
+        data=[{"action": "delete", "id": "a"}, {"action": "delete", "id": "b"}],
+        content_type="application/json",
+    )
+    assert response.status_code == 400
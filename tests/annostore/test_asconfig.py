@@ -0,0 +1,94 @@
+import pytest
+from annostore import asconfig
+from django.core.cache import caches
+from hx_lti_assignment.models import Assignment
+
+
+@pytest.fixture(autouse=True)
+def clear_asconfig():
+    asconfig.clear_local()
+    caches["default"].clear()
+    yield
+    asconfig.clear_local()
+    caches["default"].clear()
+
+
+@pytest.mark.django_db
+def test_asconfig_cached(
+    course_instructor_factory, assignment_target_factory, django_assert_num_queries
+):
+    course, instructor = course_instructor_factory()
+    assignment = assignment_target_factory(course).assignment
+
+    with django_assert_num_queries(1):
+        config = asconfig.get_assignment_config(assignment.assignment_id)
+    assert config == (
+        assignment.annotation_database_url,
+        assignment.annotation_database_apikey,
+        assignment.annotation_database_secret_token,
+        course.course_id,
+        assignment.is_published,
+    )
+    with django_assert_num_queries(0):
+        assert asconfig.get_assignment_config(assignment.assignment_id) == config
+
+    # shared tier, as if from another process
+    asconfig.clear_local()
+    with django_assert_num_queries(0):
+        assert asconfig.get_assignment_config(assignment.assignment_id) == config
+
+
+@pytest.mark.django_db
+def test_asconfig_not_found():
+    assert asconfig.get_assignment_config("not-an-assignment") is None
+    assert "not-an-assignment" not in asconfig._local
+
+
+@pytest.mark.django_db
+def test_asconfig_invalidated_on_assignment_save(
+    course_instructor_factory,
+    assignment_target_factory,
+    django_capture_on_commit_callbacks,
+):
+    course, instructor = course_instructor_factory()
+    assignment = assignment_target_factory(course).assignment
+    asconfig.get_assignment_config(assignment.assignment_id)
+
+    assignment.annotation_database_url = "http://other.annostore.org/annos"
+    with django_capture_on_commit_callbacks() as callbacks:
+        assignment.save()
+    # not invalidated until commit
+    config = asconfig.get_assignment_config(assignment.assignment_id)
+    assert config.annostore_url != "http://other.annostore.org/annos"
+
+    for callback in callbacks:
+        callback()
+    config = asconfig.get_assignment_config(assignment.assignment_id)
+    assert config.annostore_url == "http://other.annostore.org/annos"
+
+    with django_capture_on_commit_callbacks(execute=True):
+        Assignment.objects.get(pk=assignment.pk).delete()
+    assert asconfig.get_assignment_config(assignment.assignment_id) is None
+
+
+@pytest.mark.django_db
+def test_asconfig_invalidated_on_course_change(
+    course_instructor_factory,
+    assignment_target_factory,
+    django_capture_on_commit_callbacks,
+):
+    course, instructor = course_instructor_factory()
+    assignment = assignment_target_factory(course).assignment
+    assert asconfig.get_assignment_config(assignment.assignment_id).course_id == (
+        course.course_id
+    )
+
+    course.course_id = "harvardX+renamed"
+    with django_capture_on_commit_callbacks(execute=True):
+        course.save()
+    config = asconfig.get_assignment_config(assignment.assignment_id)
+    assert config.course_id == "harvardX+renamed"
+
+    with django_capture_on_commit_callbacks(execute=True):
+        course.delete()
+    assert asconfig.get_assignment_config(assignment.assignment_id).course_id is None
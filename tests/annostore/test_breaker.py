@@ -0,0 +1,179 @@
+import json
+from urllib.parse import quote
+
+import pytest
+import responses
+from annostore import breaker, search_cache
+from django.core.cache import caches
+from django.test import Client
+from django.urls import reverse
+from hx_lti_initializer.models import LTIResourceLinkConfig
+from hxat import metrics
+
+annostore_url = "http://annostore.breaker.org/annos"
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(breaker, "_now", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def breaker_on(settings):
+    settings.ANNOSTORE_BREAKER = {
+        "enabled": True,
+        "min_calls": 4,
+        "error_rate": 0.5,
+        "open_secs": 30,
+    }
+    metrics.reset()
+    yield
+    breaker.reset()
+
+
+def test_breaker_opens_and_recovers(breaker_on, clock):
+    b = breaker.get_breaker(annostore_url)
+    for ok in [True, True, False]:
+        assert b.allow()
+        b.record("search", 0.1, ok)
+    assert b.state == breaker.CLOSED  # not enough calls yet
+
+    b.record("search", 0.1, False)
+    assert b.state == breaker.OPEN
+    assert not b.allow()
+    assert metrics.get("annostore_breaker_rejected", annostore=annostore_url) == 1
+
+    clock[0] += 30
+    assert b.allow()  # probe
+    assert b.state == breaker.HALF_OPEN
+    assert not b.allow()  # one probe at a time
+    b.record("search", 0.1, False)
+    assert b.state == breaker.OPEN
+
+    clock[0] += 30
+    assert b.allow()
+    b.record("search", 0.1, True)
+    assert b.state == breaker.CLOSED
+    assert b.allow()
+
+
+def test_breaker_window(breaker_on, clock):
+    b = breaker.get_breaker(annostore_url)
+    for i in range(3):
+        b.record("create", 0.1, False)
+    clock[0] += 61  # old errors leave the window
+    b.record("create", 0.1, False)
+    assert b.state == breaker.CLOSED
+    assert b.stats()["calls"] == 1
+
+
+def test_adaptive_timeout(breaker_on, settings, clock):
+    settings.ANNOSTORE_TIMEOUTS = {"default": 5.0, "search": 10.0}
+    b = breaker.get_breaker(annostore_url)
+    assert b.timeout("search") == 10.0  # no data yet
+
+    for i in range(4):
+        b.record("search", 0.5, True)
+    assert b.timeout("search") == 1.5  # p99 * 3
+    assert b.timeout("create") == 5.0  # other ops keep their own
+
+    for i in range(4):
+        b.record("create", 0.1, True)
+    assert b.timeout("create") == 1.0  # min_timeout
+
+    for i in range(4):
+        b.record("search", 9.0, True)
+    assert b.timeout("search") == 10.0  # never over settings
+
+
+def test_breaker_disabled(settings):
+    settings.ANNOSTORE_BREAKER = {"enabled": False}
+    settings.ANNOSTORE_TIMEOUTS = {"default": 5.0}
+    b = breaker.get_breaker(annostore_url)
+    for i in range(30):
+        b.record("read", 0.1, True)
+    assert b.timeout("read") == 5.0
+
+
+@responses.activate
+@pytest.mark.django_db
+def test_search_fails_fast_when_open(
+    breaker_on,
+    settings,
+    lti_path,
+    course_user_lti_launch_params,
+    assignment_target_factory,
+    catchpy_search_result_shell,
+):
+    settings.ANNOSTORE_SEARCH_CACHE_TTL = 30
+    settings.ANNOSTORE_SEARCH_CACHE_STALE_TTL = 300
+    caches["default"].clear()
+    course, user, launch_params = course_user_lti_launch_params
+    assignment_target = assignment_target_factory(course)
+    assignment = assignment_target.assignment
+    resource_link_id = launch_params["resource_link_id"]
+    LTIResourceLinkConfig.objects.create(
+        resource_link_id=resource_link_id,
+        assignment_target=assignment_target,
+    )
+    client = Client(enforce_csrf_checks=False)
+    response = client.post(lti_path, data=launch_params)
+    response = client.get(response.url)
+    assert response.status_code == 200
+
+    def search_url(source_id):
+        return (
+            "{}?context_id={}&collection_id={}&source_id={}&resource_link_id={}".format(
+                reverse("annotation_store:api_root_search"),
+                quote(course.course_id),
+                assignment.assignment_id,
+                source_id,
+                resource_link_id,
+            )
+        )
+
+    # a good search, also kept as stale copy
+    responses.add(
+        responses.GET,
+        "{}/".format(assignment.annotation_database_url),
+        json=catchpy_search_result_shell,
+        status=200,
+    )
+    assert client.get(search_url(1)).status_code == 200
+    responses.replace(
+        responses.GET,
+        "{}/".format(assignment.annotation_database_url),
+        json={"error": "oops"},
+        status=500,
+    )
+    for source_id in [2, 3, 4]:
+        assert client.get(search_url(source_id)).status_code == 500
+    annostore_breaker = breaker.get_breaker(assignment.annotation_database_url)
+    assert annostore_breaker.state == breaker.OPEN
+    calls = len(responses.calls)
+
+    # fails fast, without request to annostore
+    response = client.get(search_url(5))
+    assert response.status_code == 503
+    assert json.loads(response.content)["rows"] == []
+    assert len(responses.calls) == calls
+
+    # stale copy of a previous search, even if invalidated
+    search_cache.invalidate(course.course_id, str(assignment.assignment_id), ["1"])
+    response = client.get(search_url(1))
+    assert response.status_code == 200
+    assert response["X-Hxat-Stale"] == "true"
+    assert json.loads(response.content) == catchpy_search_result_shell
+    assert len(responses.calls) == calls
+
+
+@pytest.mark.django_db
+def test_ops_stats_breakers(breaker_on, admin_client):
+    breaker.get_breaker(annostore_url).record("search", 0.1, True)
+    response = admin_client.get(reverse("ops_stats"))
+    assert response.status_code == 200
+    stats = json.loads(response.content)["annostore_breakers"]
+    assert stats[annostore_url]["state"] == breaker.CLOSED
+    assert stats[annostore_url]["calls"] == 1
@@ -0,0 +1,80 @@
+import json
+from io import StringIO
+
+import pytest
+import responses
+from annostore import grade_ledger, grade_queue
+from annostore.models import GradePassbackLedger
+from django.conf import settings
+from django.core.management import call_command
+from hxat import metrics
+
+lis_outcome_service_url = "https://lms.example.org/grade_passback"
+launch_params = {
+    "oauth_consumer_key": settings.CONSUMER_KEY,
+    "lis_outcome_service_url": lis_outcome_service_url,
+    "lis_result_sourcedid": "sourcedid-1",
+    "resource_link_id": "link-1",
+}
+
+
+@pytest.fixture(autouse=True)
+def ledger_on(settings):
+    settings.GRADE_PASSBACK_LEDGER = True
+    metrics.reset()
+
+
+@pytest.mark.django_db
+def test_already_sent():
+    assert not grade_ledger.already_sent("link-1", "user1", "sourcedid-1", 1)
+    grade_ledger.record("link-1", "user1", "sourcedid-1", 1)
+    grade_ledger.record("link-1", "user1", "sourcedid-1", 1.0)  # no dupes
+    assert GradePassbackLedger.objects.count() == 1
+
+    assert grade_ledger.already_sent("link-1", "user1", "sourcedid-1", 1.0)
+    assert not grade_ledger.already_sent("link-2", "user1", "sourcedid-1", 1.0)
+    assert not grade_ledger.already_sent("link-1", "user1", "sourcedid-2", 1.0)
+    assert not grade_ledger.already_sent("link-1", "user1", "sourcedid-1", 0.5)
+    assert grade_ledger.stats() == {"hits": 1, "misses": 4}
+
+
+@pytest.mark.django_db
+def test_disabled(settings):
+    settings.GRADE_PASSBACK_LEDGER = False
+    grade_ledger.record("link-1", "user1", "sourcedid-1", 1.0)
+    assert GradePassbackLedger.objects.count() == 0
+    assert not grade_ledger.already_sent("link-1", "user1", "sourcedid-1", 1.0)
+
+
+@responses.activate
+@pytest.mark.django_db
+def test_queue_records_ledger(settings, make_lti_replaceResultResponse):
+    settings.GRADE_PASSBACK_QUEUE = {"enabled": True}
+    responses.add(
+        responses.POST,
+        lis_outcome_service_url,
+        body=make_lti_replaceResultResponse,
+        content_type="application/xml",
+        status=200,
+    )
+    grade_queue.enqueue("user1", "assign1", 1.0, settings.TEST_COURSE, launch_params)
+    assert grade_queue.drain() == 1
+    assert grade_ledger.already_sent("link-1", "user1", "sourcedid-1", 1.0)
+
+    out = StringIO()
+    call_command(
+        "grade_passback", "clear-ledger", "--resource-link-id=link-2", stdout=out
+    )
+    assert json.loads(out.getvalue()) == {"deleted": 0, "dequeued": 0}
+    out = StringIO()
+    call_command("grade_passback", "clear-ledger", stdout=out)
+    assert json.loads(out.getvalue()) == {"deleted": 1, "dequeued": 1}
+    assert not grade_ledger.already_sent("link-1", "user1", "sourcedid-1", 1.0)
+
+    # cleared grades are sent again
+    job, created = grade_queue.enqueue(
+        "user1", "assign1", 1.0, settings.TEST_COURSE, launch_params
+    )
+    assert created
+    assert grade_queue.drain() == 1
+    assert len(responses.calls) == 2
@@ -0,0 +1,194 @@
+import json
+from datetime import timedelta
+from io import StringIO
+
+import pytest
+import responses
+from annostore import grade_queue
+from annostore.models import GradePassback
+from django.conf import settings
+from django.core.management import call_command
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+from hx_lti_initializer.models import LTIResourceLinkConfig
+
+lis_outcome_service_url = "https://lms.example.org/grade_passback"
+launch_params = {
+    "oauth_consumer_key": settings.CONSUMER_KEY,
+    "lis_outcome_service_url": lis_outcome_service_url,
+    "lis_result_sourcedid": "sourcedid-1",
+}
+
+
+@pytest.fixture
+def queue_on(settings):
+    settings.GRADE_PASSBACK_QUEUE = {"enabled": True, "max_attempts": 2}
+
+
+def add_lms_response(replace_result_response, status=200):
+    responses.add(
+        responses.POST,
+        lis_outcome_service_url,
+        body=replace_result_response,
+        content_type="application/xml",
+        status=status,
+    )
+
+
+@pytest.mark.django_db
+def test_enqueue_dedupe(queue_on):
+    job, created = grade_queue.enqueue(
+        "user1", "assign1", 1.0, settings.TEST_COURSE, launch_params
+    )
+    assert created
+    assert job.status == GradePassback.PENDING
+
+    job2, created = grade_queue.enqueue(
+        "user1", "assign1", 1.0, settings.TEST_COURSE, launch_params
+    )
+    assert not created
+    assert job2.pk == job.pk
+    assert GradePassback.objects.count() == 1
+
+    # failed for good, queue it again
+    GradePassback.objects.filter(pk=job.pk).update(
+        status=GradePassback.FAILED, attempts=2
+    )
+    job3, created = grade_queue.enqueue(
+        "user1", "assign1", 1.0, settings.TEST_COURSE, launch_params
+    )
+    assert created
+    assert job3.status == GradePassback.PENDING
+    assert job3.attempts == 0
+
+
+@pytest.mark.django_db
+def test_enqueue_per_placement(queue_on):
+    # same assignment in two lms placements: each has its own sourcedid
+    job, created = grade_queue.enqueue(
+        "user1", "assign1", 1.0, settings.TEST_COURSE, launch_params
+    )
+    assert created
+    other_placement = dict(launch_params, lis_result_sourcedid="sourcedid-2")
+    job2, created = grade_queue.enqueue(
+        "user1", "assign1", 1.0, settings.TEST_COURSE, other_placement
+    )
+    assert created
+    assert job2.pk != job.pk
+    assert job2.lis_result_sourcedid == "sourcedid-2"
+
+
+@responses.activate
+@pytest.mark.django_db
+def test_drain(queue_on, make_lti_replaceResultResponse):
+    add_lms_response(make_lti_replaceResultResponse)
+    for user_id in ["user1", "user2", "user3"]:
+        grade_queue.enqueue(
+            user_id, "assign1", 1.0, settings.TEST_COURSE, launch_params
+        )
+
+    out = StringIO()
+    call_command("grade_passback", "drain", "--concurrency=2", stdout=out)
+    assert json.loads(out.getvalue()) == {"processed": 3}
+    assert len(responses.calls) == 3
+    assert grade_queue.counts()[GradePassback.DONE] == 3
+
+    # nothing else due
+    assert grade_queue.drain() == 0
+
+
+@responses.activate
+@pytest.mark.django_db
+def test_drain_retry_with_backoff(queue_on):
+    add_lms_response("oops", status=500)
+    job, _ = grade_queue.enqueue(
+        "user1", "assign1", 1.0, settings.TEST_COURSE, launch_params
+    )
+
+    assert grade_queue.drain() == 1
+    job.refresh_from_db()
+    assert job.status == GradePassback.PENDING
+    assert job.attempts == 1
+    assert job.next_attempt_at > timezone.now()
+    assert grade_queue.drain() == 0  # not due yet
+
+    GradePassback.objects.filter(pk=job.pk).update(
+        next_attempt_at=timezone.now() - timedelta(seconds=1)
+    )
+    assert grade_queue.drain() == 1
+    job.refresh_from_db()
+    assert job.status == GradePassback.FAILED  # max_attempts
+    assert job.last_error
+
+    out = StringIO()
+    call_command("grade_passback", "inspect", stdout=out)
+    result = json.loads(out.getvalue())
+    assert result["counts"][GradePassback.FAILED] == 1
+    assert result["failed"][0]["user_id"] == "user1"
+
+
+@pytest.mark.django_db
+def test_claim_abandoned(queue_on):
+    job, _ = grade_queue.enqueue(
+        "user1", "assign1", 1.0, settings.TEST_COURSE, launch_params
+    )
+    assert [j.pk for j in grade_queue.claim(10, worker="w1")] == [job.pk]
+    assert grade_queue.claim(10, worker="w2") == []
+
+    GradePassback.objects.filter(pk=job.pk).update(
+        locked_at=timezone.now() - timedelta(hours=1)
+    )
+    claimed = grade_queue.claim(10, worker="w2")
+    assert [j.locked_by for j in claimed] == ["w2"]
+
+
+@responses.activate
+@pytest.mark.django_db
+def test_create_queues_grade(
+    queue_on,
+    lti_path,
+    course_user_lti_launch_params_with_grade,
+    assignment_target_factory,
+    webannotation_annotation_factory,
+):
+    course, user, launch_params = course_user_lti_launch_params_with_grade
+    assignment_target = assignment_target_factory(course)
+    assignment = assignment_target.assignment
+    resource_link_id = launch_params["resource_link_id"]
+    LTIResourceLinkConfig.objects.create(
+        resource_link_id=resource_link_id,
+        assignment_target=assignment_target,
+    )
+    client = Client(enforce_csrf_checks=False)
+    response = client.post(lti_path, data=launch_params)
+    assert response.status_code == 302
+    response = client.get(response.url)
+    assert response.status_code == 200
+
+    for i in range(2):
+        webann = webannotation_annotation_factory(user)
+        webann["creator"]["id"] = user.anon_id
+        webann["platform"]["collection_id"] = str(assignment.assignment_id)
+        webann["platform"]["context_id"] = str(course.course_id)
+        responses.add(
+            responses.POST,
+            "{}/{}".format(assignment.annotation_database_url, webann["id"]),
+            json=webann,
+            status=200,
+        )
+        response = client.post(
+            "{}{}?resource_link_id={}".format(
+                reverse("annotation_store:api_root"), webann["id"], resource_link_id
+            ),
+            data=webann,
+            content_type="application/json",
+        )
+        assert response.status_code == 200
+
+    assert len(responses.calls) == 2  # no grade passback while in request
+    job = GradePassback.objects.get()
+    assert job.user_id == str(user.anon_id)
+    assert job.assignment_id == str(assignment.assignment_id)
+    assert job.lis_outcome_service_url == launch_params["lis_outcome_service_url"]
+    assert job.status == GradePassback.PENDING
@@ -0,0 +1,119 @@
+import json
+from urllib.parse import quote
+
+import pytest
+import responses
+from annostore.passthrough import TotalScanner
+from django.test import Client
+from django.urls import reverse
+from hx_lti_initializer.models import LTIResourceLinkConfig
+
+
+def scan(body, chunk_size):
+    scanner = TotalScanner()
+    for i in range(0, len(body), chunk_size):
+        total = scanner.feed(body[i : i + chunk_size])
+        if total is not None:
+            return total, i + chunk_size
+    return None, len(body)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 7, 1024])
+@pytest.mark.parametrize("total_first", [True, False])
+def test_total_scanner(chunk_size, total_first):
+    rows = [
+        {
+            "id": str(i),
+            "total": "not this one",
+            "body": {"value": 'quote" bracket{[ escape\\ "total": 9'},
+        }
+        for i in range(20)
+    ]
+    search_result = {"total": 42, "rows": rows, "size": 20}
+    if not total_first:
+        search_result = {"rows": rows, "size": 20, "total": 42}
+    body = json.dumps(search_result).encode()
+
+    total, consumed = scan(body, chunk_size)
+    assert total == 42
+    if total_first:  # rows never scanned
+        assert consumed < max(32, chunk_size + 1)
+
+
+def test_total_scanner_needs_more():
+    scanner = TotalScanner()
+    assert scanner.feed(b'{"rows": [], "tot') is None
+    assert scanner.feed(b'al": 1') is None  # could be 1 or 10, ...
+    assert scanner.feed(b"0}") == 10
+
+
+@responses.activate
+@pytest.mark.django_db
+def test_search_passthrough_with_grade(
+    settings,
+    lti_path,
+    course_user_lti_launch_params_with_grade,
+    assignment_target_factory,
+    webannotation_annotation_factory,
+    catchpy_search_result_shell,
+    make_lti_replaceResultResponse,
+):
+    settings.ANNOSTORE_PASSTHROUGH = True
+
+    course, user, launch_params = course_user_lti_launch_params_with_grade
+    assignment_target = assignment_target_factory(course)
+    assignment = assignment_target.assignment
+    resource_link_id = launch_params["resource_link_id"]
+    LTIResourceLinkConfig.objects.create(
+        resource_link_id=resource_link_id,
+        assignment_target=assignment_target,
+    )
+    client = Client(enforce_csrf_checks=False)
+    response = client.post(lti_path, data=launch_params)
+    assert response.status_code == 302
+    response = client.get(response.url)
+    assert response.status_code == 200
+
+    webann = webannotation_annotation_factory(user)
+    search_result = catchpy_search_result_shell
+    search_result["rows"].append(webann)
+    search_result["size"] = 1
+    search_result.pop("total", None)
+    search_result["total"] = 1  # after the rows
+    # not the same as json.dumps() from hxat would produce
+    upstream_body = json.dumps(search_result, indent=1).encode()
+
+    responses.add(
+        responses.GET,
+        "{}/?context_id={}&resource_link_id={}&userid={}".format(
+            assignment.annotation_database_url,
+            quote(course.course_id),
+            resource_link_id,
+            user.anon_id,
+        ),
+        body=upstream_body,
+        content_type="application/json",
+        headers={"content-length": str(len(upstream_body))},
+        status=200,
+    )
+    responses.add(
+        responses.POST,
+        launch_params["lis_outcome_service_url"],
+        body=make_lti_replaceResultResponse,
+        content_type="application/xml",
+        status=200,
+    )
+
+    response = client.get(
+        "{}?context_id={}&resource_link_id={}&userid={}".format(
+            reverse("annotation_store:api_root_search"),
+            quote(course.course_id),
+            resource_link_id,
+            user.anon_id,
+        ),
+    )
+    assert response.status_code == 200
+    assert response.streaming
+    assert response["Content-Length"] == str(len(upstream_body))
+    assert b"".join(response.streaming_content) == upstream_body
+    assert len(responses.calls) == 2  # search, grade passback
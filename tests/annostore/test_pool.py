@@ -0,0 +1,75 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from annostore import pool
+from hxat import metrics
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def do_GET(self):
+        body = b'{"total": 0, "rows": []}'
+        self.send_response(200)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def annostore_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), KeepAliveHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield "http://127.0.0.1:{}/annotation".format(server.server_address[1])
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def fresh_pool():
+    pool.close_all()
+    metrics.reset()
+    yield
+    pool.close_all()
+
+
+def test_session_per_base_url():
+    s1 = pool.get_session("http://annostore.one.org/annos")
+    s2 = pool.get_session("http://annostore.two.org/annos")
+    assert s1 is not s2
+    assert pool.get_session("http://annostore.one.org/annos") is s1
+
+
+def test_session_reuses_connection(annostore_server):
+    session = pool.get_session(annostore_server)
+    for i in range(3):
+        response = session.get(annostore_server + "/", timeout=2)
+        assert response.status_code == 200
+
+    assert metrics.get("annostore_pool_misses", annostore=annostore_server) == 1
+    assert metrics.get("annostore_pool_hits", annostore=annostore_server) == 2
+    assert metrics.get("annostore_pool_waits", annostore=annostore_server) == 0
+    assert "annostore_pool_hits" in pool.stats()
+
+
+def test_pool_settings(settings):
+    settings.ANNOSTORE_HTTP_POOL = {"pool_maxsize": 3, "keep_alive": False}
+    session = pool.get_session("http://annostore.three.org/annos")
+    adapter = session.get_adapter("http://annostore.three.org/annos")
+    assert adapter._pool_maxsize == 3
+    assert adapter.max_retries.total == pool.POOL_DEFAULTS["max_retries"]
+    assert "POST" not in adapter.max_retries.allowed_methods
+    assert "DELETE" not in adapter.max_retries.allowed_methods
+    assert session.headers["Connection"] == "close"
+
+
+def test_timeouts(settings):
+    settings.ANNOSTORE_TIMEOUTS = {"default": 3.0, "search": 7.0}
+    assert pool.get_timeout("search") == 7.0
+    assert pool.get_timeout("create") == 3.0
@@ -0,0 +1,153 @@
+import json
+from urllib.parse import quote
+
+import pytest
+import responses
+from annostore import search_cache
+from django.core.cache import caches
+from django.http import QueryDict
+from django.test import Client
+from django.urls import reverse
+from hx_lti_initializer.models import LTIResourceLinkConfig
+from hxat import metrics
+
+student = {"is_staff": False, "hx_user_id": "student-1"}
+other_student = {"is_staff": False, "hx_user_id": "student-2"}
+staff = {"is_staff": True, "hx_user_id": "instructor-1"}
+
+
+@pytest.fixture
+def search_cache_on(settings):
+    settings.ANNOSTORE_SEARCH_CACHE_TTL = 30
+    caches["default"].clear()
+    metrics.reset()
+    yield
+    caches["default"].clear()
+
+
+def key(lti, querystring):
+    return search_cache.SearchCache(lti, QueryDict(querystring)).key
+
+
+def test_search_cache_off_by_default():
+    assert key(student, "context_id=c1&collection_id=a1") is None
+
+
+def test_search_cache_key(search_cache_on):
+    k = key(student, "context_id=c1&collection_id=a1&source_id=1&limit=10")
+    assert k is not None
+    # params order and session id do not matter
+    assert k == key(
+        student, "limit=10&source_id=1&collection_id=a1&context_id=c1&utm_source=s"
+    )
+    assert k != key(student, "context_id=c1&collection_id=a1&source_id=1&limit=20")
+    assert k != key(
+        other_student, "context_id=c1&collection_id=a1&source_id=1&limit=10"
+    )
+    assert k != key(staff, "context_id=c1&collection_id=a1&source_id=1&limit=10")
+    # staff share the admin token
+    assert key(staff, "context_id=c1") == key(
+        {"is_staff": True, "hx_user_id": "instructor-2"}, "context_id=c1"
+    )
+    # no context, no cache
+    assert key(student, "collection_id=a1") is None
+
+
+def test_search_cache_invalidate(search_cache_on):
+    qs = {
+        "target": "context_id=c1&collection_id=a1&source_id=1",
+        "other_target": "context_id=c1&collection_id=a1&source_id=2",
+        "collection": "context_id=c1&collection_id=a1",
+        "other_collection": "context_id=c1&collection_id=a2",
+        "context": "context_id=c1",
+    }
+    before = {name: key(student, q) for name, q in qs.items()}
+
+    search_cache.invalidate("c1", "a1", ["1"])
+    after = {name: key(student, q) for name, q in qs.items()}
+
+    assert after["target"] != before["target"]
+    assert after["collection"] != before["collection"]
+    assert after["context"] != before["context"]
+    assert after["other_target"] == before["other_target"]
+    assert after["other_collection"] == before["other_collection"]
+    assert search_cache.stats()["invalidations"] == 1
+
+
+@responses.activate
+@pytest.mark.django_db
+def test_search_cache_hit_and_invalidate(
+    search_cache_on,
+    lti_path,
+    course_user_lti_launch_params,
+    assignment_target_factory,
+    webannotation_annotation_factory,
+    catchpy_search_result_shell,
+):
+    course, user, launch_params = course_user_lti_launch_params
+    assignment_target = assignment_target_factory(course)
+    assignment = assignment_target.assignment
+    target_object = assignment_target.target_object
+    resource_link_id = launch_params["resource_link_id"]
+    LTIResourceLinkConfig.objects.create(
+        resource_link_id=resource_link_id,
+        assignment_target=assignment_target,
+    )
+    client = Client(enforce_csrf_checks=False)
+    response = client.post(lti_path, data=launch_params)
+    assert response.status_code == 302
+    response = client.get(response.url)
+    assert response.status_code == 200
+
+    webann = webannotation_annotation_factory(user)
+    webann["creator"]["id"] = user.anon_id
+    webann["platform"]["context_id"] = course.course_id
+    webann["platform"]["collection_id"] = str(assignment.assignment_id)
+    webann["platform"]["target_source_id"] = str(target_object.pk)
+    search_result = catchpy_search_result_shell
+
+    search_qs = (
+        "context_id={}&collection_id={}&source_id={}&resource_link_id={}".format(
+            quote(course.course_id),
+            assignment.assignment_id,
+            target_object.pk,
+            resource_link_id,
+        )
+    )
+    responses.add(
+        responses.GET,
+        "{}/?{}".format(assignment.annotation_database_url, search_qs),
+        json=search_result,
+        status=200,
+    )
+    responses.add(
+        responses.POST,
+        "{}/{}".format(assignment.annotation_database_url, webann["id"]),
+        json=webann,
+        status=200,
+    )
+    search_path = "{}?{}".format(reverse("annotation_store:api_root_search"), search_qs)
+
+    for i in range(3):
+        response = client.get(search_path)
+        assert response.status_code == 200
+        assert json.loads(response.content) == search_result
+    assert len(responses.calls) == 1
+    assert search_cache.stats()["hits"] == 2
+    assert search_cache.stats()["misses"] == 1
+
+    # new annotation in target
+    response = client.post(
+        "{}{}?resource_link_id={}".format(
+            reverse("annotation_store:api_root"), webann["id"], resource_link_id
+        ),
+        data=webann,
+        content_type="application/json",
+    )
+    assert response.status_code == 200
+    assert len(responses.calls) == 2
+
+    response = client.get(search_path)
+    assert response.status_code == 200
+    assert len(responses.calls) == 3  # search went to annostore
+    assert search_cache.stats()["invalidations"] == 1
@@ -1,10 +1,20 @@
+import time
 from unittest.mock import patch
 from uuid import uuid4
 
+import jwt
 import pytest
 import requests
 import requests_mock
-from hx_lti_initializer.utils import DashboardAnnotations, _fetch_annotations_by_course
+from django.contrib.sessions.backends.signed_cookies import SessionStore
+from django.test import RequestFactory
+from hx_lti_initializer import utils
+from hx_lti_initializer.utils import (
+    DashboardAnnotations,
+    _fetch_annotations_by_course,
+    retrieve_token,
+)
+from hxat import metrics
 from requests.sessions import session
 from testing_data import build_json
 
@@ -118,3 +128,67 @@ def test_dashboard_annotations_success_image_capital_letter_uri():
 #     with patch.object(DashboardAnnotations, '__init__', __init__):
 #         da = DashboardAnnotations("", {})
 #         assert da.get_target_id('image', 'https://digital.library.villanova.edu/Item/vudl:92879/Canvas/p0') == "some_id"
+
+
+@pytest.fixture
+def token_cache(settings):
+    settings.RETRIEVE_TOKEN_CACHE_SIZE = 2
+    utils.clear_token_cache()
+    yield
+    utils.clear_token_cache()
+
+
+def test_retrieve_token_cached(token_cache):
+    token = retrieve_token("user1", "apikey", "secret", ttl=120)
+    assert retrieve_token("user1", "apikey", "secret", ttl=120) == token
+    assert retrieve_token("user2", "apikey", "secret", ttl=120) != token
+    assert retrieve_token("user1", "apikey", "other", ttl=120) != token
+    assert (
+        retrieve_token("user1", "apikey", "secret", ttl=120, override=["CAN_COPY"])
+        != token
+    )
+    payload = jwt.decode(token, "secret", algorithms=["HS256"])
+    assert payload["userId"] == "user1"
+    assert payload["ttl"] == 120
+    assert "override" not in payload
+
+
+def test_retrieve_token_near_expiry(token_cache):
+    metrics.reset()
+    retrieve_token("user1", "apikey", "secret", ttl=120)
+    retrieve_token("user1", "apikey", "secret", ttl=120)
+    later = time.time() + 100  # less than half of ttl left
+    with patch("hx_lti_initializer.utils.time.time", return_value=later):
+        retrieve_token("user1", "apikey", "secret", ttl=120)
+    assert metrics.total("jwt_token_cache_hits") == 1
+    assert metrics.total("jwt_token_cache_misses") == 2
+
+
+def test_retrieve_token_evicts_lru(token_cache):
+    token1 = retrieve_token("user1", "apikey", "secret", ttl=120)
+    retrieve_token("user2", "apikey", "secret", ttl=120)
+    retrieve_token("user1", "apikey", "secret", ttl=120)  # user1 most recent
+    retrieve_token("user3", "apikey", "secret", ttl=120)  # evicts user2
+    assert [k[0] for k in utils._token_cache] == ["user1", "user3"]
+    assert retrieve_token("user1", "apikey", "secret", ttl=120) == token1
+
+
+def test_retrieve_token_cache_disabled(settings):
+    settings.RETRIEVE_TOKEN_CACHE_SIZE = 0
+    utils.clear_token_cache()
+    retrieve_token("user1", "apikey", "secret", ttl=120)
+    assert len(utils._token_cache) == 0
+
+
+def test_save_session_only_writes_changes():
+    request = RequestFactory().get("/")
+    request.session = SessionStore()
+    request.session["LTI_LAUNCH"] = {"rid": {"hx_user_id": "u1", "hx_roles": ["a"]}}
+    request.session.modified = False
+
+    utils.save_session(request, "rid", user_id="u1", roles=["a"])
+    assert not request.session.modified
+
+    utils.save_session(request, "rid", user_id="u1", is_staff=False)
+    assert request.session.modified
+    assert request.session["LTI_LAUNCH"]["rid"]["is_staff"] is False
@@ -1,7 +1,9 @@
+import time
+
 from django.conf import settings
 from django.test import RequestFactory
 from django.urls import reverse
-from hxat.lti_validators import LTIRequestValidator
+from hxat.lti_validators import LTIRequestValidator, clear_nonces
 from lti import ToolConsumer
 from lti.contrib.django import DjangoToolProvider
 
@@ -169,3 +171,67 @@ def test_lti_validation_ltidict_wrong_secret():
     request_is_valid = tool_provider.is_valid_request(validator)
 
     assert not request_is_valid
+
+
+def default_key_launch():
+    consumer = ToolConsumer(
+        consumer_key=settings.CONSUMER_KEY,
+        consumer_secret=settings.LTI_SECRET,
+        launch_url="http://testserver/some_path",
+        params={
+            "lti_message_type": "basic-lti-launch-request",
+            "lti_version": "LTI-1p0",
+            "resource_link_id": "some_string_to_be_the_fake_resource_link_id",
+            "lis_person_sourcedid": "instructor_1",
+            "user_id": "instructor_1-anon",
+            "roles": ["Instructor"],
+            "context_id": "fake_course",
+        },
+    )
+    return consumer.generate_launch_data()
+
+
+def is_valid(params):
+    request = RequestFactory().post("/some_path", data=params)
+    tool_provider = DjangoToolProvider.from_django_request(request=request)
+    return tool_provider.is_valid_request(LTIRequestValidator())
+
+
+def test_lti_validation_replay_fail():
+    params = default_key_launch()
+    assert is_valid(params)
+    assert not is_valid(params)
+    assert is_valid(default_key_launch())  # new nonce
+
+
+def test_lti_validation_replay_seen_by_other_worker(settings):
+    params = default_key_launch()
+    assert is_valid(params)
+    clear_nonces()  # in-process lru is gone, the shared cache remembers
+    assert not is_valid(params)
+
+
+def test_lti_validation_replay_check_disabled(settings):
+    settings.LTI_NONCE_STORE = {"enabled": False}
+    params = default_key_launch()
+    assert is_valid(params)
+    assert is_valid(params)
+
+
+def test_lti_validation_stale_timestamp_fail(settings, monkeypatch):
+    settings.LTI_NONCE_STORE = {"timestamp_lifetime": 60}
+    params = default_key_launch()
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 120)
+    assert not is_valid(params)
+
+
+def test_fetch_lti_secret_memoized(settings):
+    assert LTIRequestValidator.fetch_lti_secret(
+        settings.CONSUMER_KEY, "fake_course"
+    ) == (settings.LTI_SECRET)
+    settings.LTI_SECRET_DICT = {"fake_course": "course_secret"}
+    assert (
+        LTIRequestValidator.fetch_lti_secret(settings.CONSUMER_KEY, "fake_course")
+        == "course_secret"
+    )
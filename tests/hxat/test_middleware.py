@@ -1,7 +1,20 @@
+import json
+import logging
+
 import pytest
 from django.contrib.sessions.backends.db import SessionStore
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
 from django.test import RequestFactory
-from hxat.middleware import LTILaunchSession, MultiLTILaunchMiddleware
+from hxat import metrics
+from hxat.logutils import JsonFormatter
+from hxat.middleware import (
+    CookielessSessionMiddleware,
+    LTILaunchSession,
+    MultiLTILaunchMiddleware,
+    RequestLogMiddleware,
+    launch_params_whitelist,
+)
 
 
 @pytest.mark.django_db
@@ -35,6 +48,81 @@ def test_MultiLTILaunchMiddleware_is_basic_lti_launch(
     assert request.LTI.resource_link_id == resource_link_id
 
 
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "prune,extra", [(True, []), (True, ["lti_version"]), (False, [])]
+)
+def test_MultiLTILaunchMiddleware_prunes_launch_params(
+    settings, lti_path, lti_launch_url, lti_launch_params_factory, prune, extra
+):
+    settings.LTI_LAUNCH_PARAMS_PRUNE = prune
+    settings.LTI_LAUNCH_PARAMS_EXTRA = extra
+    resource_link_id = "resource_link_id_1234567"
+    params = lti_launch_params_factory(
+        course_id="fake_context_id",
+        user_name="fake_user_name",
+        user_id="fake_user_id",
+        user_roles=["Learner"],
+        resource_link_id=resource_link_id,
+        launch_url=lti_launch_url,
+    )
+
+    request = RequestFactory().post(lti_path, data=params)
+    request.session = SessionStore()
+    middleware = MultiLTILaunchMiddleware(get_response=lambda request: None)
+    middleware.process_request(request)
+
+    launch_params = request.LTI["launch_params"]
+    if prune:
+        assert set(launch_params) == set(params) & launch_params_whitelist()
+        assert "oauth_signature" not in launch_params
+        assert "oauth_nonce" not in launch_params
+        assert ("lti_version" in launch_params) == bool(extra)
+    else:
+        assert set(launch_params) == set(params)
+    for key in ("resource_link_id", "context_id", "user_id", "oauth_consumer_key"):
+        assert launch_params[key] == params[key]
+    assert launch_params["roles"] == ["Learner"]
+
+
+@pytest.mark.django_db
+def test_MultiLTILaunchMiddleware_same_launch_not_written(
+    lti_path, lti_launch_url, lti_launch_params_factory
+):
+    def params():  # same launch, new oauth nonce
+        return lti_launch_params_factory(
+            course_id="fake_context_id",
+            user_name="fake_user_name",
+            user_id="fake_user_id",
+            user_roles=["Learner"],
+            resource_link_id="resource_link_id_1234567",
+            launch_url=lti_launch_url,
+        )
+
+    middleware = MultiLTILaunchMiddleware(get_response=lambda request: None)
+    session = SessionStore()
+
+    request = RequestFactory().post(lti_path, data=params())
+    request.session = session
+    middleware.process_request(request)
+    assert session.modified
+    request.LTI["hx_user_id"] = "fake_user_id"
+
+    session.modified = False
+    request = RequestFactory().post(lti_path, data=params())
+    request.session = session
+    middleware.process_request(request)
+    request.LTI["hx_user_id"] = "fake_user_id"
+    assert not session.modified  # same launch, ip and values
+    assert request.LTI["hx_user_id"] == "fake_user_id"
+
+    request = RequestFactory().post(lti_path, data=params(), REMOTE_ADDR="10.0.0.2")
+    request.session = session
+    middleware.process_request(request)
+    assert session.modified
+    assert session["LOGGED_IP"] == "10.0.0.2"
+
+
 @pytest.mark.django_db
 def test_MultiLTILaunchMiddleware_is_lti_content_item_message(
     embed_lti_path, embed_lti_launch_url, lti_content_item_request_factory
@@ -59,3 +147,124 @@ def test_MultiLTILaunchMiddleware_is_lti_content_item_message(
         pytest.fail(f"Unexpected exception: {e}")
 
     assert not hasattr(request, "LTI")
+
+
+def cookieless_session(request, view=lambda request: HttpResponse("ok")):
+    middleware = CookielessSessionMiddleware(get_response=view)
+    response = middleware(request)
+    return request.session, response
+
+
+def test_CookielessSessionMiddleware_lazy_when_unused():
+    metrics.reset()
+    request = RequestFactory().get("/lti_init/tool_config/")
+    session, response = cookieless_session(request)
+
+    assert response.status_code == 200
+    assert session.loads == 0
+    assert not session.accessed
+    assert not session.modified
+    assert session.is_empty()  # no session created
+    assert metrics.total("session_requests") == 1
+    assert metrics.total("session_loads") == 0
+    assert metrics.total("session_writes") == 0
+
+
+def test_CookielessSessionMiddleware_lazy_load(monkeypatch):
+    metrics.reset()
+    warnings = []
+    monkeypatch.setattr(
+        logging.getLogger("hxat.middleware"),
+        "warning",
+        lambda msg, *args: warnings.append(msg % args),
+    )
+    existing = CookielessSessionMiddleware(get_response=HttpResponse).SessionStore()
+    existing["LOGGED_IP"] = "10.0.0.1"
+    existing.save()
+
+    def view(request):
+        assert request.session.loads == 0
+        assert request.session["LOGGED_IP"] == "10.0.0.1"
+        return HttpResponse("ok")
+
+    request = RequestFactory().get(
+        "/lti_init/tool_config/", {"utm_source": existing.session_key}
+    )
+    session, response = cookieless_session(request, view)
+    assert session.loads == 1
+    assert session.session_key == existing.session_key
+    assert "IP address does not match" in warnings[0]  # checked on load
+    assert metrics.total("session_loads") == 1
+    existing.delete()
+
+
+def test_CookielessSessionMiddleware_creates_session_on_demand():
+    metrics.reset()
+
+    def view(request):
+        request.session["LTI_LAUNCH"] = {}
+        assert request.session.session_key is not None  # e.g. for utm_source
+        return HttpResponse("ok")
+
+    request = RequestFactory().get(
+        "/lti_init/tool_config/", {"utm_source": "not-a-session-key"}
+    )
+    session, response = cookieless_session(request, view)
+    key = session.session_key
+    assert key != "not-a-session-key"
+    assert metrics.get("session_writes", view="-") == 1
+    assert session.exists(key)
+    session.delete()
+
+
+def test_RequestLogMiddleware_disabled_by_default(settings):
+    settings.LOG_REQUESTS = False
+    with pytest.raises(MiddlewareNotUsed):
+        RequestLogMiddleware(get_response=HttpResponse)
+
+
+def test_RequestLogMiddleware_logs_request(settings, monkeypatch):
+    settings.LOG_REQUESTS = True
+    records = []
+    logger = logging.getLogger("hxat.middleware.request")
+    monkeypatch.setattr(logger, "handle", records.append)
+    monkeypatch.setattr(logger, "isEnabledFor", lambda level: level >= logging.INFO)
+
+    middleware = RequestLogMiddleware(get_response=lambda r: HttpResponse(status=204))
+    middleware(RequestFactory().get("/lti_init/tool_config/"))
+
+    assert len(records) == 1
+    fields = records[0].fields
+    assert fields["path"] == "/lti_init/tool_config/"
+    assert fields["status"] == 204
+    assert fields["duration_ms"] >= 0
+    data = json.loads(JsonFormatter().format(records[0]))
+    assert data["status"] == 204
+    assert data["message"].startswith("GET /lti_init/tool_config/ 204")
+
+
+@pytest.mark.django_db
+def test_MultiLTILaunchMiddleware_no_debug_formatting(
+    monkeypatch, lti_path, lti_launch_url, lti_launch_params_factory
+):
+    logger = logging.getLogger("hxat.middleware")
+    monkeypatch.setattr(logger, "isEnabledFor", lambda level: level >= logging.INFO)
+    debug_calls = []
+    monkeypatch.setattr(
+        logger, "debug", lambda msg, *args, **kwargs: debug_calls.append(msg)
+    )
+    params = lti_launch_params_factory(
+        course_id="fake_context_id",
+        user_name="fake_user_name",
+        user_id="fake_user_id",
+        user_roles=["Learner"],
+        resource_link_id="resource_link_id_1234567",
+        launch_url=lti_launch_url,
+    )
+    request = RequestFactory().post(lti_path, data=params)
+    request.session = SessionStore()
+    MultiLTILaunchMiddleware(get_response=lambda request: None).process_request(request)
+
+    assert request.LTI.valid()
+    # per-param and per-header debug logs are skipped when debug is disabled
+    assert not [m for m in debug_calls if m.startswith(("POST ", "META "))]
@@ -0,0 +1,81 @@
+import json
+from collections import OrderedDict
+from io import StringIO
+
+import pytest
+from django.contrib.sessions.backends.signed_cookies import SessionStore
+from django.core.management import call_command
+from hxat.serializers import (
+    COMPACT_MAGIC,
+    CompactSessionSerializer,
+    JsonOrderedDictSerializer,
+)
+from utils.management.commands.bench_session_serializer import sample_session
+
+
+def test_compact_roundtrip_keeps_order():
+    session = sample_session(3)
+    session["LTI_LAUNCH"].move_to_end("resource-link-0000")
+    session["not_interned"] = {"b": 1, "a": [1, "x", None, 2.5]}
+
+    data = CompactSessionSerializer().dumps(session)
+    assert data.startswith(COMPACT_MAGIC)
+
+    loaded = CompactSessionSerializer().loads(data)
+    assert loaded == session
+    assert isinstance(loaded["LTI_LAUNCH"], OrderedDict)
+    assert list(loaded["LTI_LAUNCH"]) == list(session["LTI_LAUNCH"])
+    assert list(loaded["not_interned"]) == ["b", "a"]
+
+
+def test_compact_reads_json_session():
+    session = sample_session(2)
+    data = JsonOrderedDictSerializer().dumps(session)
+
+    loaded = CompactSessionSerializer().loads(data)
+    assert loaded == session
+    assert list(loaded["LTI_LAUNCH"]) == list(session["LTI_LAUNCH"])
+
+
+def test_compact_keys_as_json():
+    data = CompactSessionSerializer().dumps({1: "a", None: "b", "user_id": "c"})
+    loaded = CompactSessionSerializer().loads(data)
+    assert loaded == json.loads(json.dumps({1: "a", None: "b", "user_id": "c"}))
+
+
+def test_compact_unknown_version():
+    data = CompactSessionSerializer().dumps({"user_id": "c"})
+    with pytest.raises(ValueError):
+        CompactSessionSerializer().loads(COMPACT_MAGIC + b"\xff" + data[2:])
+
+
+def test_compact_smaller_than_json():
+    session = sample_session(10)
+    compact = CompactSessionSerializer().dumps(session)
+    assert len(compact) < len(JsonOrderedDictSerializer().dumps(session))
+
+
+def test_session_store_migrates_json_session(settings):
+    settings.SESSION_SERIALIZER = "hxat.serializers.JsonOrderedDictSerializer"
+    store = SessionStore()
+    store["LTI_LAUNCH"] = sample_session(1)["LTI_LAUNCH"]
+    store.save()
+    json_key = store.session_key
+
+    settings.SESSION_SERIALIZER = "hxat.serializers.CompactSessionSerializer"
+    store = SessionStore(session_key=json_key)
+    assert list(store["LTI_LAUNCH"]) == ["resource-link-0000"]
+    store.modified = True
+    store.save()
+    assert store.session_key != json_key
+    assert SessionStore(session_key=store.session_key)["LTI_LAUNCH"] == (
+        sample_session(1)["LTI_LAUNCH"]
+    )
+
+
+def test_bench_session_serializer():
+    out = StringIO()
+    call_command("bench_session_serializer", launches=[2], number=2, stdout=out)
+    results = json.loads(out.getvalue())
+    assert [r["serializer"] for r in results] == ["json", "compact"]
+    assert results[1]["bytes"] < results[0]["bytes"]
@@ -0,0 +1,117 @@
+from urllib.parse import quote
+
+import pytest
+import responses
+from django.test import Client
+from django.urls import reverse
+from hx_lti_initializer.models import LTIResourceLinkConfig
+from hxat import metrics, timing
+
+
+def test_span_outside_request():
+    assert timing.current() is None
+    with timing.span("catchpy"):
+        pass
+    assert timing.current() is None
+
+
+def test_spans_add_up():
+    timings = timing.start()
+    try:
+        for i in range(3):
+            with timing.span("db"):
+                pass
+        with timing.span("catchpy"):
+            pass
+    finally:
+        timing.stop()
+    assert timing.current() is None
+
+    assert timings.spans["db"][0] == 3
+    assert timings.spans["catchpy"][0] == 1
+    header = timings.server_timing()
+    assert header.startswith('db;desc="3";dur=')
+    assert ', catchpy;desc="1";dur=' in header
+    assert ", total;dur=" in header
+    assert set(timings.as_dict()) == {"db", "catchpy", "total"}
+
+
+def test_histogram_buckets():
+    metrics.reset()
+    metrics.observe("request_seconds", 0.003, view="v")
+    metrics.observe("request_seconds", 0.2, view="v")
+    metrics.observe("request_seconds", 60, view="v")
+
+    (histogram,) = metrics.histograms()["request_seconds"]
+    assert histogram["labels"] == {"view": "v"}
+    assert histogram["count"] == 3
+    assert histogram["buckets"]["0.005"] == 1
+    assert histogram["buckets"]["0.25"] == 2
+    assert histogram["buckets"]["10.0"] == 2
+    assert histogram["buckets"]["+Inf"] == 3
+    text = metrics.prometheus()
+    assert 'hxat_request_seconds_bucket{le="+Inf",view="v"} 3' in text
+    assert 'hxat_request_seconds_count{view="v"} 3' in text
+
+
+@pytest.mark.django_db
+def test_server_timing_header(settings, admin_client):
+    settings.REQUEST_TIMING = {"enabled": True, "header": True}
+    metrics.reset()
+    response = admin_client.get(reverse("ops_stats"))
+    assert response.status_code == 200
+    assert "db;desc=" in response["Server-Timing"]
+    assert "total;dur=" in response["Server-Timing"]
+
+    response = admin_client.get(reverse("ops_metrics"))
+    assert response.status_code == 200
+    assert response["content-type"].startswith("text/plain")
+    text = response.content.decode()
+    assert "# TYPE hxat_request_seconds histogram" in text
+    assert 'phase="db",view="ops_stats"' in text
+
+
+@pytest.mark.django_db
+def test_server_timing_header_off_by_default(admin_client):
+    response = admin_client.get(reverse("ops_stats"))
+    assert "Server-Timing" not in response
+
+
+@responses.activate
+@pytest.mark.django_db
+def test_annostore_search_phases(
+    settings,
+    lti_path,
+    course_user_lti_launch_params,
+    assignment_target_factory,
+    catchpy_search_result_shell,
+):
+    settings.REQUEST_TIMING = {"enabled": True, "header": True}
+    course, user, launch_params = course_user_lti_launch_params
+    assignment_target = assignment_target_factory(course)
+    assignment = assignment_target.assignment
+    resource_link_id = launch_params["resource_link_id"]
+    LTIResourceLinkConfig.objects.create(
+        resource_link_id=resource_link_id,
+        assignment_target=assignment_target,
+    )
+    client = Client(enforce_csrf_checks=False)
+    response = client.post(lti_path, data=launch_params)
+    assert "lti_validate;" in response["Server-Timing"]
+
+    search_qs = "context_id={}&collection_id={}&resource_link_id={}".format(
+        quote(course.course_id), assignment.assignment_id, resource_link_id
+    )
+    responses.add(
+        responses.GET,
+        "{}/?{}".format(assignment.annotation_database_url, search_qs),
+        json=catchpy_search_result_shell,
+        status=200,
+    )
+    response = client.get(
+        "{}?{}".format(reverse("annotation_store:api_root_search"), search_qs)
+    )
+    assert response.status_code == 200
+    header = response["Server-Timing"]
+    for phase in ("session;", "db;", "catchpy;", "total;"):
+        assert phase in header
@@ -0,0 +1,31 @@
+import json
+
+import pytest
+from django.test import Client
+from django.urls import reverse
+from hxat import metrics
+
+
+@pytest.mark.django_db
+def test_ops_stats_forbidden(settings):
+    settings.HXAT_OPS_TOKEN = "secret-ops-token"
+    client = Client()
+    response = client.get(reverse("ops_stats"))
+    assert response.status_code == 403
+    response = client.get(reverse("ops_stats"), HTTP_AUTHORIZATION="token wrong")
+    assert response.status_code == 403
+
+
+@pytest.mark.django_db
+def test_ops_stats_with_token(settings):
+    settings.HXAT_OPS_TOKEN = "secret-ops-token"
+    metrics.reset()
+    metrics.incr("annostore_search_cache_hits")
+    client = Client()
+    response = client.get(
+        reverse("ops_stats"), HTTP_AUTHORIZATION="token secret-ops-token"
+    )
+    assert response.status_code == 200
+    content = json.loads(response.content)
+    assert content["annostore_search_cache"]["hits"] == 1
+    assert content["annostore_search_cache"]["hit_ratio"] == 1.0
@@ -156,4 +156,20 @@ async def test_sync_wsconn_ok(ltilaunch_setup, webannotation_annotation_factory)
     assert msg["platform"]["context_id"] == webann["platform"]["context_id"]
     assert msg["platform"]["collection_id"] == webann["platform"]["collection_id"]
 
+    # bulk writes send all notifications in one group msg
+    await channel_layer.group_send(
+        room_name,
+        {
+            "type": "annotation_notification_batch",
+            "messages": [
+                {"message": json.dumps(webann), "action": "annotation_created"},
+                {"message": json.dumps(webann), "action": "annotation_deleted"},
+            ],
+        },
+    )
+    response = await communicator.receive_json_from()
+    assert response["type"] == "annotation_created"
+    response = await communicator.receive_json_from()
+    assert response["type"] == "annotation_deleted"
+
     await communicator.disconnect()
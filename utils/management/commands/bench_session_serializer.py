@@ -0,0 +1,109 @@
+import json
+import timeit
+from collections import OrderedDict
+
+from django.core import signing
+from django.core.management.base import BaseCommand
+from hxat.serializers import CompactSessionSerializer, JsonOrderedDictSerializer
+
+SERIALIZERS = OrderedDict(
+    [("json", JsonOrderedDictSerializer), ("compact", CompactSessionSerializer)]
+)
+
+
+def sample_session(launches):
+    """session as left by `launches` lti launches in the same browser."""
+    session = OrderedDict(LTI_LAUNCH=OrderedDict())
+    for i in range(launches):
+        resource_link_id = "resource-link-{:04d}".format(i)
+        session["LTI_LAUNCH"][resource_link_id] = OrderedDict(
+            [
+                (
+                    "launch_params",
+                    OrderedDict(
+                        [
+                            ("lti_message_type", "basic-lti-launch-request"),
+                            ("lti_version", "LTI-1p0"),
+                            ("resource_link_id", resource_link_id),
+                            ("resource_link_title", "Reading {}".format(i)),
+                            ("user_id", "a1b2c3d4e5f6a7b8c9d0"),
+                            ("roles", "Learner"),
+                            ("context_id", "course-v1:HarvardX+HxAT+2026"),
+                            ("context_title", "Annotation Tool Sandbox"),
+                            ("lis_person_sourcedid", "student01"),
+                            ("lis_person_name_full", "Student One"),
+                            ("lis_person_contact_email_primary", "s1@example.edu"),
+                            (
+                                "lis_outcome_service_url",
+                                "https://lms.example.edu/grade/outcome",
+                            ),
+                            (
+                                "lis_result_sourcedid",
+                                "course-v1:HarvardX+HxAT+2026:{}:a1b2c3".format(
+                                    resource_link_id
+                                ),
+                            ),
+                            ("tool_consumer_instance_guid", "lms.example.edu"),
+                            ("custom_collection_id", "collection-{}".format(i)),
+                            ("custom_object_id", str(i)),
+                            ("oauth_consumer_key", "hxat_consumer"),
+                            ("oauth_nonce", "{:032d}".format(i)),
+                            ("oauth_timestamp", "1760000000"),
+                        ]
+                    ),
+                ),
+                ("hx_user_id", "a1b2c3d4e5f6a7b8c9d0"),
+                ("hx_user_name", "Student One"),
+                ("hx_context_id", "course-v1:HarvardX+HxAT+2026"),
+                ("hx_collection_id", "collection-{}".format(i)),
+                ("hx_object_id", str(i)),
+                ("hx_roles", ["Learner"]),
+                ("is_staff", False),
+                ("is_instructor", False),
+            ]
+        )
+    session["LOGGED_IP"] = "10.0.0.1"
+    return session
+
+
+class Command(BaseCommand):
+    help = "Compares session size and encode/decode time per session serializer."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--launches",
+            type=int,
+            nargs="+",
+            default=[1, 10, 50],
+            help="number of lti launches in the session",
+        )
+        parser.add_argument("--number", type=int, default=200)
+
+    def handle(self, *args, **options):
+        results = []
+        for launches in options["launches"]:
+            session = sample_session(launches)
+            for name, serializer in SERIALIZERS.items():
+                raw = serializer().dumps(session)
+                stored = signing.dumps(
+                    session,
+                    salt="bench_session_serializer",
+                    serializer=serializer,
+                    compress=True,
+                )
+                number = options["number"]
+                encode = timeit.timeit(
+                    lambda: serializer().dumps(session), number=number
+                )
+                decode = timeit.timeit(lambda: serializer().loads(raw), number=number)
+                results.append(
+                    {
+                        "launches": launches,
+                        "serializer": name,
+                        "bytes": len(raw),
+                        "stored_bytes": len(stored),
+                        "encode_us": round(encode / number * 1e6, 1),
+                        "decode_us": round(decode / number * 1e6, 1),
+                    }
+                )
+        self.stdout.write(json.dumps(results, indent=4))